@@ -1,16 +1,20 @@
 from flask import Flask, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from flask_migrate import Migrate
 import os
 
 db = SQLAlchemy()
 login_manager = LoginManager()
+migrate = Migrate()
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__, instance_relative_config=True)
 
     # Load configuration
     app.config.from_object('config.Config')
+    if config_overrides:
+        app.config.update(config_overrides)
     
     # Ensure instance folder exists
     try:
@@ -18,7 +22,21 @@ def create_app():
     except OSError:
         pass
 
+    from .database import engine_options, sqlite_pragmas, install_sqlite_pragmas, is_sqlite
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     db.init_app(app)
+    with app.app_context():
+        if is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+            install_sqlite_pragmas(db.engine, sqlite_pragmas(app.config))
+        if app.config['METRICS_ENABLED']:
+            from .metrics import install_metrics
+            install_metrics(app, db.engine)
+    from .services import user_cache, principal_cache, response_cache
+    user_cache.init_app(app)
+    principal_cache.init_app(app)
+    response_cache.init_app(app)
+    # Batch mode lets Alembic alter SQLite tables by copying them
+    migrate.init_app(app, db, render_as_batch=True)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'  # Blueprints will be auth.login
 
@@ -35,21 +53,15 @@ def create_app():
     # app.register_blueprint(transactions_bp, url_prefix='/admin/transactions')
     # app.register_blueprint(profit_distribution_bp, url_prefix='/admin/profit')
 
+    from .cli import register_commands
+    register_commands(app)
+
     @app.route('/')
     def index():
         return redirect(url_for('admin.dashboard'))
 
-    with app.app_context():
-        from . import models # Import models here to avoid circular imports
-        db.create_all()  # Create database tables if they don't exist
-
-        # Create a default admin user if one doesn't exist
-        if not models.Admin.query.first():
-            hashed_password = models.Admin.set_password('adminpassword') # You should change this
-            admin_user = models.Admin(username='admin', password_hash=hashed_password)
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Default admin user created with username 'admin' and password 'adminpassword'")
-
+    # Schema creation and the default admin live in `flask schema init`
+    # (or init_db.py), so booting a worker never touches the database
+    from . import models  # Import models here to avoid circular imports
 
     return app 
\ No newline at end of file
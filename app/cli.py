@@ -0,0 +1,199 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .services import system_totals, statement_run, query_plans, bootstrap, balance_history, archival, idempotency, ledger_integrity
+from datetime import datetime, timedelta
+import os
+
+totals_cli = AppGroup('totals', help='Maintain the system balance aggregate.')
+
+
+@totals_cli.command('reconcile')
+@click.option('--fix', is_flag=True, help='Reset the aggregate to the actual sum when they differ.')
+def reconcile_totals(fix):
+    """Verify the stored system balance against SUM(user.balance)"""
+    result = system_totals.reconcile(fix=fix)
+    stored = 'missing' if result.stored is None else f'{result.stored:.2f}'
+    click.echo(f'Stored total: {stored}')
+    click.echo(f'Actual total: {result.actual:.2f}')
+    if result.difference == 0:
+        # A missing row is seeded on first use, so with no balances there is nothing to drift
+        click.echo('System totals are consistent.')
+        return
+    if fix:
+        click.echo(f'System totals reset to {result.actual:.2f}.')
+    elif result.stored is None:
+        click.echo('The system totals row is missing; rerun with --fix to create it from the actual total.')
+        raise SystemExit(1)
+    else:
+        click.echo(f'Mismatch of {result.difference:.2f}; rerun with --fix to reset.')
+        raise SystemExit(1)
+
+
+statements_cli = AppGroup('statements', help='Bulk statement generation.')
+
+
+@statements_cli.command('generate')
+@click.option('--period', required=True, help='Statement month as YYYY-MM.')
+@click.option('--workers', type=int, default=None, help='Rendering processes (defaults to the CPU count).')
+@click.option('--output', default=None, help='Output directory, or zip file with --zip (defaults to instance/statements/<period>).')
+@click.option('--zip', 'as_zip', is_flag=True, help='Write all statements into a single zip file.')
+def generate_statements(period, workers, output, as_zip):
+    """Render a statement for every user for one month.
+
+    Statements already present in the output are skipped, so an
+    interrupted run can simply be started again. With --zip they are
+    rendered into <zip>.parts first and zipped once all are there.
+    """
+    if output is None:
+        output = os.path.join(current_app.instance_path, 'statements', f'{period}.zip' if as_zip else period)
+
+    def progress(state):
+        rate = state.rendered / state.elapsed if state.elapsed > 0 else 0
+        click.echo(f'{state.rendered + state.skipped}/{state.total} statements '
+                   f'({state.skipped} already rendered), {rate:.1f}/sec')
+
+    try:
+        result = statement_run.generate_period_statements(period, output, workers=workers, as_zip=as_zip, progress=progress)
+    except statement_run.StatementRunError as e:
+        raise click.BadParameter(str(e), param_hint='--period')
+    click.echo(f'Rendered {result.rendered} statements in {result.elapsed:.1f}s '
+               f'({result.statements_per_second:.1f}/sec), skipped {result.skipped}; output in {output}')
+
+
+snapshots_cli = AppGroup('snapshots', help='Daily balance snapshots.')
+
+
+@snapshots_cli.command('take')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Day to snapshot as YYYY-MM-DD (defaults to yesterday, UTC).')
+def take_snapshots(day):
+    """Record every account's closing balance for one day.
+
+    Run daily after midnight UTC; running it again for the same day
+    replaces that day's snapshots.
+    """
+    day = day.date() if day else datetime.utcnow().date() - timedelta(days=1)
+    try:
+        result = balance_history.take_snapshots(day)
+    except balance_history.BalanceHistoryError as e:
+        raise click.BadParameter(str(e), param_hint='--date')
+    click.echo(f'Snapshotted {result.accounts} accounts for {result.snapshot_date} in {result.elapsed:.1f}s')
+
+
+@snapshots_cli.command('prune')
+@click.option('--keep-days', type=int, default=90, show_default=True,
+              help='Daily snapshots newer than this are kept.')
+def prune_snapshots(keep_days):
+    """Drop old daily snapshots; month-end snapshots are always kept"""
+    days = balance_history.prune_snapshots(keep_days)
+    click.echo(f'Removed snapshots for {len(days)} days.')
+
+
+archive_cli = AppGroup('archive', help='Archival of deleted accounts.')
+
+
+@archive_cli.command('resume')
+@click.option('--chunk-size', type=int, default=None, help='Transactions per commit (defaults to ARCHIVE_CHUNK_SIZE).')
+def resume_archival(chunk_size):
+    """Finish deletion jobs left pending or interrupted, e.g. by a restart.
+
+    Do not run this while a web worker may still be working on the same
+    jobs; each chunk is atomic, but the two would race for the rows.
+    """
+    jobs = archival.resume_jobs(chunk_size=chunk_size)
+    for job in jobs:
+        click.echo(f'{job.cnic} ({job.name}): {job.status}, {job.archived_rows} transactions archived'
+                   + (f' - {job.error}' if job.error else ''))
+    click.echo(f'Ran {len(jobs)} archival jobs.')
+    if any(job.status == 'failed' for job in jobs):
+        raise SystemExit(1)
+
+
+idempotency_cli = AppGroup('idempotency', help='Idempotency keys of postings.')
+
+
+@idempotency_cli.command('sweep')
+@click.option('--chunk-size', type=int, default=idempotency.SWEEP_CHUNK_SIZE, show_default=True,
+              help='Keys deleted per commit.')
+def sweep_idempotency_keys(chunk_size):
+    """Delete idempotency keys past IDEMPOTENCY_KEY_TTL; schedule hourly or daily"""
+    deleted = idempotency.sweep(chunk_size)
+    click.echo(f'Deleted {deleted} expired idempotency keys.')
+
+
+ledger_cli = AppGroup('ledger', help='Integrity of the transaction ledger.')
+
+
+@ledger_cli.command('verify')
+@click.option('--full', is_flag=True, help='Check every transaction, not only those past the last checkpoint.')
+@click.option('--chunk-size', type=int, default=ledger_integrity.CHECK_CHUNK_SIZE, show_default=True,
+              help='Transactions read per query.')
+@click.option('--settle-seconds', type=int, default=None,
+              help='Leave transactions younger than this for the next run (defaults to LEDGER_CHECK_SETTLE_SECONDS).')
+def verify_ledger(full, chunk_size, settle_seconds):
+    """Check running balances and sequence numbers of transactions added since the last run"""
+    result = ledger_integrity.verify(full=full, chunk_size=chunk_size, settle_seconds=settle_seconds)
+    for problem in result.problems:
+        where = f'Transaction {problem.transaction_id} of account' if problem.transaction_id else 'Account'
+        click.echo(f'{where} {problem.user_id}: {problem.message}')
+    if result.problem_count > len(result.problems):
+        click.echo(f'... and {result.problem_count - len(result.problems)} more.')
+    click.echo(f'Checked {result.rows_checked} transactions of {result.accounts_checked} accounts '
+               f'after transaction {result.start_id} in {result.elapsed:.1f}s; '
+               f'checkpoint at transaction {result.last_transaction_id}.')
+    if result.problem_count:
+        click.echo(f'{result.problem_count} problems found.')
+        raise SystemExit(1)
+    click.echo('Ledger is consistent.')
+
+
+schema_cli = AppGroup('schema', help='Schema checks and setup.')
+
+
+@schema_cli.command('init')
+@click.option('--admin-username', default=bootstrap.DEFAULT_ADMIN_USERNAME, show_default=True,
+              help='Username of the first admin account.')
+@click.option('--admin-password', default=bootstrap.DEFAULT_ADMIN_PASSWORD,
+              help='Password of the first admin account.')
+def init_schema(admin_username, admin_password):
+    """Create missing tables and the first admin account.
+
+    Safe to run repeatedly: existing tables are kept and no admin is
+    added once one exists.
+    """
+    bootstrap.create_schema()
+    click.echo('Database tables created.')
+    if bootstrap.seed_default_admin(admin_username, admin_password):
+        click.echo(f"Admin user '{admin_username}' created; change its password before going live.")
+    else:
+        click.echo('An admin user already exists; none created.')
+
+
+@schema_cli.command('check-plans')
+@click.option('--verbose', is_flag=True, help='Print the full plan of every query.')
+def check_plans(verbose):
+    """Fail if any hot query would fall back to a full table scan"""
+    try:
+        results = query_plans.check_query_plans()
+    except query_plans.QueryPlanError as e:
+        raise click.UsageError(str(e))
+    for result in results:
+        click.echo(f"{'ok  ' if result.uses_index else 'FAIL'}  {result.name}")
+        if verbose or not result.uses_index:
+            for line in result.plan:
+                click.echo(f'        {line}')
+    failed = [result.name for result in results if not result.uses_index]
+    if failed:
+        click.echo(f'{len(failed)} hot queries are not using an index; run flask db upgrade.')
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    app.cli.add_command(totals_cli)
+    app.cli.add_command(statements_cli)
+    app.cli.add_command(snapshots_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(ledger_cli)
+    app.cli.add_command(schema_cli)
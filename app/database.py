@@ -0,0 +1,76 @@
+from sqlalchemy import event, Boolean
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+# Applied to every new SQLite connection under the 'tuned' profile:
+# WAL lets readers proceed while a writer commits, NORMAL sync is safe with
+# WAL, and the busy timeout makes writers queue instead of failing at once
+TUNED_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -65536,  # Negative values are KiB, so 64 MiB
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured DB_ENGINE_PROFILE"""
+    if config['DB_ENGINE_PROFILE'] != 'tuned' or is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return {}
+    # Server databases: size the pool per worker and drop dead connections
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas(config):
+    if config['DB_ENGINE_PROFILE'] != 'tuned':
+        return {}
+    pragmas = dict(TUNED_SQLITE_PRAGMAS)
+    pragmas.update(config.get('SQLITE_PRAGMAS') or {})
+    return pragmas
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMAs on every connection the engine opens"""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+class likely(FunctionElement):
+    """A condition most rows pass, so SQLite's planner does not pick an index for it.
+
+    Renders as SQLite's likelihood(condition, 0.9) and as the bare
+    condition everywhere else.
+    """
+    type = Boolean()
+    name = 'likely'
+    inherit_cache = True
+
+
+@compiles(likely)
+def _compile_likely(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(likely, 'sqlite')
+def _compile_likely_sqlite(element, compiler, **kw):
+    return f'likelihood({compiler.process(element.clauses, **kw)}, 0.9)'
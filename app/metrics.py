@@ -0,0 +1,160 @@
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from bisect import bisect_left
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Per-endpoint histogram in the Prometheus text format"""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                # One count per bucket plus +Inf, then the running sum
+                series = self._series[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {endpoint: list(series) for endpoint, series in self._series.items()}
+        for endpoint, series in sorted(snapshot.items()):
+            label = f'endpoint="{_escape(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Per-endpoint monotonically increasing count"""
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, endpoint, amount=1):
+        with self._lock:
+            self._values[endpoint] = self._values.get(endpoint, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            snapshot = dict(self._values)
+        for endpoint, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{{endpoint="{_escape(endpoint)}"}} {value}')
+        return lines
+
+
+class RequestMetrics:
+    """The metrics recorded for every request served by one process"""
+
+    def __init__(self):
+        self.duration = Histogram('samad_request_duration_seconds',
+                                  'Time from request start to response, by endpoint.', LATENCY_BUCKETS)
+        self.sql_time = Histogram('samad_request_sql_seconds',
+                                  'Time spent executing SQL per request, by endpoint.', LATENCY_BUCKETS)
+        self.render_time = Histogram('samad_request_render_seconds',
+                                     'Time spent rendering templates per request, by endpoint.', LATENCY_BUCKETS)
+        self.queries = Histogram('samad_request_queries',
+                                 'SQL statements executed per request, by endpoint.', QUERY_COUNT_BUCKETS)
+        self.slow_queries = Counter('samad_slow_queries_total',
+                                    'SQL statements slower than SLOW_QUERY_THRESHOLD_MS, by endpoint.')
+        # Callables returning extra exposition lines, such as cache statistics
+        self.collectors = []
+
+    def render(self):
+        lines = []
+        for metric in (self.duration, self.sql_time, self.render_time, self.queries, self.slow_queries):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def install_metrics(app, engine):
+    """Time every request, its SQL and its template rendering.
+
+    Metrics are kept in memory per process and exposed by /admin/metrics.
+    SQL statements slower than SLOW_QUERY_THRESHOLD_MS, when it is set,
+    are logged as warnings whether or not they run inside a request.
+    Streamed responses are measured up to the point the response starts.
+    """
+    metrics = app.extensions['metrics'] = RequestMetrics()
+    threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    logger = app.logger
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _query_finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        in_request = has_request_context()
+        if in_request:
+            g.metrics_queries = g.get('metrics_queries', 0) + 1
+            g.metrics_sql_time = g.get('metrics_sql_time', 0.0) + elapsed
+        if threshold_ms and elapsed * 1000 >= threshold_ms:
+            endpoint = _endpoint() if in_request else '-'
+            if in_request:
+                metrics.slow_queries.inc(endpoint)
+            logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, endpoint, ' '.join(statement.split()))
+
+    def _render_started(sender, template, context, **extra):
+        g.metrics_render_start = time.perf_counter()
+
+    def _render_finished(sender, template, context, **extra):
+        started = g.pop('metrics_render_start', None)
+        if started is not None:
+            g.metrics_render_time = g.get('metrics_render_time', 0.0) + time.perf_counter() - started
+
+    # Held by the app so the weak signal references stay alive
+    app.extensions['metrics_receivers'] = (_render_started, _render_finished)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.before_request
+    def _request_started():
+        g.metrics_request_start = time.perf_counter()
+
+    @app.after_request
+    def _request_finished(response):
+        started = g.get('metrics_request_start')
+        if started is not None:
+            endpoint = _endpoint()
+            metrics.duration.observe(endpoint, time.perf_counter() - started)
+            metrics.sql_time.observe(endpoint, g.get('metrics_sql_time', 0.0))
+            metrics.render_time.observe(endpoint, g.get('metrics_render_time', 0.0))
+            metrics.queries.observe(endpoint, g.get('metrics_queries', 0))
+        return response
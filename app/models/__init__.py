@@ -1,5 +1,10 @@
 from .admin import Admin
 from .user import User
 from .transaction import Transaction
+from .system_totals import SystemTotals
+from .balance_snapshot import BalanceSnapshot
+from .archive import ArchivalJob, TransactionArchive
+from .idempotency_key import IdempotencyKey
+from .ledger_checkpoint import LedgerCheckpoint
  
-__all__ = ['Admin', 'User', 'Transaction'] 
\ No newline at end of file
+__all__ = ['Admin', 'User', 'Transaction', 'SystemTotals', 'BalanceSnapshot', 'ArchivalJob', 'TransactionArchive', 'IdempotencyKey', 'LedgerCheckpoint']
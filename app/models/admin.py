@@ -1,11 +1,33 @@
 from .. import db
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, has_app_context
 from flask_login import UserMixin
+from functools import lru_cache
 from .. import login_manager
 
+# Werkzeug's own defaults, used outside an app context
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt'
+DEFAULT_PASSWORD_SALT_LENGTH = 16
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Admin.query.get(int(user_id))
+    # Served from the principal cache, so most requests skip the admin table
+    from ..services import principal_cache
+    return principal_cache.load(int(user_id))
+
+
+def _hash_settings():
+    if not has_app_context():
+        return DEFAULT_PASSWORD_HASH_METHOD, DEFAULT_PASSWORD_SALT_LENGTH
+    return (current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_PASSWORD_HASH_METHOD),
+            current_app.config.get('PASSWORD_SALT_LENGTH', DEFAULT_PASSWORD_SALT_LENGTH))
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    """The method and cost parameters Werkzeug writes at the start of a hash, e.g. 'scrypt:32768:8:1'"""
+    return generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+
 
 class Admin(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,10 +36,16 @@ class Admin(UserMixin, db.Model):
 
     @staticmethod
     def set_password(password):
-        return generate_password_hash(password)
+        method, salt_length = _hash_settings()
+        return generate_password_hash(password, method, salt_length)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def needs_rehash(self):
+        """Whether the stored hash was made with other settings than PASSWORD_HASH_METHOD"""
+        method, _ = _hash_settings()
+        return self.password_hash.split('$', 1)[0] != _hash_prefix(method)
+
     def __repr__(self):
-        return f'<Admin {self.username}>' 
\ No newline at end of file
+        return f'<Admin {self.username}>'
@@ -0,0 +1,54 @@
+from .. import db
+from .money import Money
+from datetime import datetime
+from decimal import Decimal
+
+class ArchivalJob(db.Model):
+    """Deletion of one account, moving its transactions into the archive in chunks"""
+    __tablename__ = 'archival_job'
+    __table_args__ = (
+        # Finding the job, and so the archived history, of an account
+        db.Index('ix_archival_job_user_id', 'user_id'),
+        # Resuming unfinished jobs
+        db.Index('ix_archival_job_status', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: the account row is gone once the job is done
+    user_id = db.Column(db.Integer, nullable=False)
+    cnic = db.Column(db.String(15), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    final_balance = db.Column(Money, nullable=False, default=Decimal('0.00'))
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done or failed
+    total_rows = db.Column(db.Integer, nullable=False, default=0)
+    archived_rows = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ArchivalJob {self.id} - User {self.user_id} - {self.status} {self.archived_rows}/{self.total_rows}>'
+
+
+class TransactionArchive(db.Model):
+    """One zlib-compressed chunk of an account's archived transactions"""
+    __tablename__ = 'transaction_archive'
+    __table_args__ = (
+        # An account's archived history in transaction id order
+        db.Index('ix_transaction_archive_user_first', 'user_id', 'first_transaction_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('archival_job.id'), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    first_transaction_id = db.Column(db.Integer, nullable=False)
+    last_transaction_id = db.Column(db.Integer, nullable=False)
+    first_timestamp = db.Column(db.DateTime, nullable=True)
+    last_timestamp = db.Column(db.DateTime, nullable=True)
+    row_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TransactionArchive {self.id} - User {self.user_id} - {self.row_count} rows>'
@@ -0,0 +1,23 @@
+from .. import db
+from .money import Money
+from datetime import datetime
+from decimal import Decimal
+
+class BalanceSnapshot(db.Model):
+    """An account's closing balance at the end of one UTC day"""
+    __tablename__ = 'balance_snapshot'
+    __table_args__ = (
+        # Nearest snapshot on or before a date for an account, and one row per account per day
+        db.Index('ix_balance_snapshot_user_date', 'user_id', 'snapshot_date', unique=True),
+        # Loading or pruning every account's snapshot for one day
+        db.Index('ix_balance_snapshot_date', 'snapshot_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    balance = db.Column(Money, nullable=False, default=Decimal('0.00'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BalanceSnapshot user {self.user_id} on {self.snapshot_date}: {self.balance}>'
@@ -0,0 +1,24 @@
+from .. import db
+from datetime import datetime
+
+class IdempotencyKey(db.Model):
+    """The outcome of a posting, kept so a retry with the same key is answered without posting again"""
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        # One outcome per key; concurrent retries collide here instead of posting twice
+        db.Index('ix_idempotency_key_key', 'key', unique=True),
+        # Sweeping expired keys
+        db.Index('ix_idempotency_key_expires_at', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False)
+    # SHA-256 of the operations, so a key reused for a different request is refused
+    request_hash = db.Column(db.String(64), nullable=False)
+    applied = db.Column(db.Boolean, nullable=False)
+    results = db.Column(db.Text, nullable=False)  # JSON list of [index, status, message]
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} - applied {self.applied}>'
@@ -0,0 +1,16 @@
+from .. import db
+from datetime import datetime
+
+class LedgerCheckpoint(db.Model):
+    """One run of the ledger integrity check; the newest row is where the next run starts"""
+    __tablename__ = 'ledger_checkpoint'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Every transaction up to this id has been verified
+    last_transaction_id = db.Column(db.Integer, nullable=False)
+    rows_checked = db.Column(db.Integer, nullable=False, default=0)
+    problems = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LedgerCheckpoint {self.last_transaction_id} - {self.problems} problems>'
@@ -0,0 +1,52 @@
+from sqlalchemy import BigInteger, type_coerce
+from sqlalchemy.types import TypeDecorator
+from decimal import Decimal
+
+PAISA = Decimal('0.01')
+
+
+def to_paisa(amount):
+    """Convert an amount to an exact integer number of paisa.
+
+    Raises ValueError for amounts with a fraction of a paisa, which are
+    never rounded silently, and for infinities and NaN.
+    """
+    paisa = Decimal(amount).scaleb(2)
+    if not paisa.is_finite() or paisa != paisa.to_integral_value():
+        raise ValueError(f'Amount {amount} is not a whole number of paisa.')
+    return int(paisa)
+
+
+def from_paisa(paisa):
+    """Convert an integer number of paisa back to a Decimal amount"""
+    return Decimal(int(paisa)).scaleb(-2)
+
+
+def paisa(expression):
+    """A money column or SQL expression read and written as raw integer paisa.
+
+    Sums, comparisons and increments stay exact integer arithmetic in the
+    database, and bulk Python paths skip the Decimal conversion per row.
+    """
+    return type_coerce(expression, BigInteger)
+
+
+class Money(TypeDecorator):
+    """An amount in rupees, stored as a BIGINT number of paisa.
+
+    Python sees Decimals with two places. Values are converted exactly at
+    the edges, so SUM() and arithmetic in SQL never round; literals compared
+    with or added to a Money column are converted the same way.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_paisa(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_paisa(value)
+
+    @property
+    def python_type(self):
+        return Decimal
@@ -0,0 +1,17 @@
+from .. import db
+from .money import Money
+from datetime import datetime
+from decimal import Decimal
+
+class SystemTotals(db.Model):
+    """Single-row running aggregate of figures shown on the admin pages"""
+    __tablename__ = 'system_totals'
+
+    id = db.Column(db.Integer, primary_key=True)  # Always 1
+    total_balance = db.Column(Money, nullable=False, default=Decimal('0.00'))
+    # Advanced by every write to the user table; part of the ledger high-water mark
+    user_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SystemTotals balance={self.total_balance}>'
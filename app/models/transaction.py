@@ -1,15 +1,33 @@
 from .. import db
+from .money import Money
 from datetime import datetime
 from decimal import Decimal
 
 class Transaction(db.Model):
+    __table_args__ = (
+        # Backs keyset pagination of the ledger, newest first
+        db.Index('ix_transaction_timestamp_id', 'timestamp', 'id'),
+        # Statements, per-user ledger filters and the latest transaction per user
+        db.Index('ix_transaction_user_id_timestamp', 'user_id', 'timestamp'),
+        # Deleting a user removes the transfers that point at them
+        db.Index('ix_transaction_related_user_id', 'related_user_id'),
+        # Ledger filtered by type, newest first
+        db.Index('ix_transaction_type_timestamp', 'transaction_type', 'timestamp', 'id'),
+        # Each account's transactions in posting order, and range reads of a statement period
+        db.Index('ix_transaction_user_id_sequence', 'user_id', 'sequence', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     transaction_type = db.Column(db.String(50), nullable=False)  # e.g., 'credit', 'debit', 'profit_distribution', 'transfer_out', 'transfer_in'
-    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     description = db.Column(db.String(255), nullable=True) # Optional description
     related_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # For transfers, to link the other user
+    # 1, 2, 3... per account in posting order, and the account's balance
+    # right after this transaction; both are set by every write path
+    sequence = db.Column(db.Integer, nullable=True)
+    balance_after = db.Column(Money, nullable=True)
 
     related_user = db.relationship('User', foreign_keys=[related_user_id])
 
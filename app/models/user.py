@@ -1,14 +1,27 @@
 from .. import db
+from .money import Money
 from decimal import Decimal
 
 class User(db.Model):
+    __table_args__ = (
+        # Keyset pagination of the user tables sorted by name or balance
+        db.Index('ix_user_name_id', 'name', 'id'),
+        db.Index('ix_user_balance_id', 'balance', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     cnic = db.Column(db.String(15), unique=True, nullable=False) # Assuming CNIC format like XXXXX-XXXXXXX-X
     name = db.Column(db.String(100), nullable=False)
-    balance = db.Column(db.Numeric(15, 2), default=Decimal('0.00'))
+    balance = db.Column(Money, default=Decimal('0.00'))
+    # Sequence number of the account's newest transaction; see Transaction.sequence
+    last_sequence = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     transactions = db.relationship('Transaction', backref='user', lazy=True, foreign_keys='Transaction.user_id')
 
     def __repr__(self):
-        return f'<User {self.cnic} - {self.name}>' 
\ No newline at end of file
+        return f'<User {self.cnic} - {self.name}>' 
+
+
+# Case-insensitive name prefix search for the typeahead pickers
+db.Index('ix_user_name_lower', db.func.lower(User.name))
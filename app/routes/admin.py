@@ -1,15 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, Response
-from flask_login import login_required
-from ..models import User, Transaction
-from .. import db
-from decimal import Decimal
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, Response, current_app, stream_with_context, jsonify, send_file, make_response
+from flask_login import login_required, current_user
+from ..models import User, Transaction, ArchivalJob
+from ..services import profit_distribution, ledger, ledger_export, system_totals, posting, statement_jobs, user_directory, user_cache, archival, idempotency, response_cache
+from .. import db, login_manager
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-import io
+from sqlalchemy import update
+import hmac
+import uuid
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -21,19 +18,43 @@ def about():
 @admin_bp.route('/dashboard')
 @login_required
 def dashboard():
-    users = User.query.all()
-    total_system_balance = sum(user.balance for user in users if user.balance is not None)
-    total_users = len(users)
-    return render_template('admin_dashboard.html', 
-                           total_system_balance=total_system_balance, 
-                           total_users=total_users)
+    def render():
+        total_system_balance = system_totals.get_total_balance()
+        total_users = system_totals.get_total_users()
+        return render_template('admin_dashboard.html', 
+                               total_system_balance=total_system_balance, 
+                               total_users=total_users)
+    return response_cache.conditional_page(render)
+
+def _user_page(endpoint, default_sort='name'):
+    """Template arguments for one page of a user table, or None after flashing bad arguments"""
+    try:
+        listing = user_directory.parse_listing(request.args, default_sort)
+        cursor = user_directory.decode_cursor(request.args.get('cursor'), listing.sort)
+    except user_directory.UserDirectoryError as e:
+        flash(str(e), 'danger')
+        return None
+    page = user_directory.user_page(listing, cursor, per_page=request.args.get('per_page', user_directory.DEFAULT_PAGE_SIZE, type=int))
+    return dict(users=page.users, next_cursor=page.next_cursor, listing=listing,
+                listing_args=user_directory.listing_args(listing), listing_endpoint=endpoint)
 
 @admin_bp.route('/balances')
 @login_required
 def view_balances():
-    users = User.query.order_by(User.name).all()
-    total_system_balance = sum(user.balance for user in users if user.balance is not None)
-    return render_template('view_balances.html', users=users, total_system_balance=total_system_balance)
+    def render():
+        page = _user_page('admin.view_balances')
+        if page is None:
+            return redirect(url_for('admin.view_balances'))
+        total_system_balance = system_totals.get_total_balance()
+        return render_template('view_balances.html', total_system_balance=total_system_balance, **page)
+    return response_cache.conditional_page(render)
+
+@admin_bp.route('/api/ledger/high-water-mark')
+@login_required
+def ledger_high_water_mark():
+    """Cheap poll target: changes whenever a transaction is posted or a user row is written"""
+    mark = system_totals.high_water_mark()
+    return jsonify({'transaction_id': mark.transaction_id, 'user_version': mark.user_version})
 
 @admin_bp.route('/users', methods=['GET', 'POST'])
 @login_required
@@ -47,25 +68,21 @@ def manage_users():
             flash('CNIC, Name, and Initial Amount are required.', 'danger')
             return redirect(url_for('admin.manage_users'))
 
-        existing_user = User.query.filter_by(cnic=cnic).first()
-        if existing_user:
+        if user_cache.lookup(cnic):
             flash(f'User with CNIC {cnic} already exists.', 'danger')
             return redirect(url_for('admin.manage_users'))
         
         try:
-            initial_amount = Decimal(initial_amount_str)
-            if initial_amount < 0:
-                flash('Initial amount cannot be negative.', 'danger')
-                return redirect(url_for('admin.manage_users'))
-        except ValueError:
-            flash('Invalid initial amount format.', 'danger')
+            initial_amount = posting.parse_amount(initial_amount_str, allow_zero=True, field='Initial amount')
+        except posting.PostingError as e:
+            flash(str(e), 'danger')
             return redirect(url_for('admin.manage_users'))
 
         try:
-            # First create and commit the user
-            new_user = User(cnic=cnic, name=name, balance=initial_amount)
+            new_user = User(cnic=cnic, name=name, balance=initial_amount,
+                            last_sequence=1 if initial_amount > 0 else 0)
             db.session.add(new_user)
-            db.session.commit()  # Commit to get the user ID
+            db.session.flush()  # Flush to get the user ID
             
             # Now create the initial deposit transaction if needed
             if initial_amount > 0:
@@ -73,10 +90,17 @@ def manage_users():
                     user_id=new_user.id,  # Now we have the user ID
                     transaction_type='credit',
                     amount=initial_amount,
-                    description='Initial deposit'
+                    description='Initial deposit',
+                    sequence=1,
+                    balance_after=initial_amount
                 )
                 db.session.add(initial_transaction)
-                db.session.commit()  # Commit the transaction
+            # Advances the user version even when nothing was deposited
+            system_totals.adjust_total_balance(initial_amount)
+
+            # User, deposit and system total are committed together
+            db.session.commit()
+            user_cache.invalidate(cnic)
                 
             flash(f'User {name} ({cnic}) registered successfully with initial balance of {initial_amount}!', 'success')
         except Exception as e:
@@ -85,8 +109,10 @@ def manage_users():
         
         return redirect(url_for('admin.manage_users'))
 
-    users = User.query.all()
-    return render_template('manage_users.html', users=users)
+    page = _user_page('admin.manage_users')
+    if page is None:
+        return redirect(url_for('admin.manage_users'))
+    return render_template('manage_users.html', **page)
 
 @admin_bp.route('/user/<int:user_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -103,39 +129,62 @@ def edit_user(user_id):
             return redirect(url_for('admin.edit_user', user_id=user_id))
             
         # Check if CNIC is being changed and if it already exists
-        if cnic != user.cnic and User.query.filter_by(cnic=cnic).first():
+        if cnic != user.cnic and user_cache.lookup(cnic):
             flash(f'User with CNIC {cnic} already exists.', 'danger')
             return redirect(url_for('admin.edit_user', user_id=user_id))
             
         try:
-            new_balance = Decimal(balance_str)
-            if new_balance < 0:
-                flash('Balance cannot be negative.', 'danger')
-                return redirect(url_for('admin.edit_user', user_id=user_id))
-                
+            new_balance = posting.parse_amount(balance_str, allow_zero=True, field='Balance')
+        except posting.PostingError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.edit_user', user_id=user_id))
+
+        try:
             # If balance is changed, create a transaction to record the adjustment
-            if new_balance != user.balance:
-                adjustment = new_balance - user.balance
+            old_balance = user.balance
+            adjustment = new_balance - old_balance
+            if adjustment:
+                # Only overwrite the balance the form was based on; a posting
+                # that landed in between would otherwise be silently lost
+                sequence = db.session.execute(
+                    update(User)
+                    .where(User.id == user.id, User.balance == old_balance)
+                    .values(balance=new_balance, last_sequence=User.last_sequence + 1)
+                    .returning(User.last_sequence)
+                    .execution_options(synchronize_session=False)
+                ).scalar()
+                if sequence is None:
+                    db.session.rollback()
+                    flash('Balance changed while you were editing. Please review it and try again.', 'danger')
+                    return redirect(url_for('admin.edit_user', user_id=user_id))
+
                 transaction_type = 'credit' if adjustment > 0 else 'debit'
                 transaction = Transaction(
                     user_id=user.id,
                     transaction_type=transaction_type,
                     amount=abs(adjustment),
-                    description=f'Balance adjustment during user edit'
+                    description=f'Balance adjustment during user edit',
+                    sequence=sequence,
+                    balance_after=new_balance
                 )
                 db.session.add(transaction)
+                system_totals.adjust_total_balance(adjustment)
                 
+            old_cnic = user.cnic
+            details_changed = (cnic, name) != (user.cnic, user.name)
             user.cnic = cnic
             user.name = name
-            user.balance = new_balance
+            if details_changed and not adjustment:
+                system_totals.record_user_change()
             
             db.session.commit()
+            if details_changed:
+                user_cache.invalidate(old_cnic, cnic)
+                # Balance changes add a transaction and so a new cache key; renames do not
+                statement_jobs.invalidate(user_id)
             flash('User updated successfully!', 'success')
             return redirect(url_for('admin.manage_users'))
             
-        except ValueError:
-            flash('Invalid balance format.', 'danger')
-            return redirect(url_for('admin.edit_user', user_id=user_id))
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating user: {str(e)}', 'danger')
@@ -146,307 +195,336 @@ def edit_user(user_id):
 @admin_bp.route('/user/<int:user_id>/delete', methods=['POST'])
 @login_required
 def delete_user(user_id):
+    """Queue the user for deletion; their transactions are archived in the background first"""
     user = User.query.get_or_404(user_id)
     
-    if user.balance > 0:
-        flash('Cannot delete user with positive balance. Please transfer or withdraw their balance first.', 'danger')
-        return redirect(url_for('admin.manage_users'))
-        
     try:
-        # Delete associated transactions first
-        Transaction.query.filter_by(user_id=user.id).delete()
-        Transaction.query.filter_by(related_user_id=user.id).delete()
-        
-        db.session.delete(user)
-        db.session.commit()
-        flash('User deleted successfully!', 'success')
+        job = archival.start_deletion(user)
+        statement_jobs.invalidate(user_id)
+        archival.submit(job)
+        flash(f'Deleting {job.name}: {job.total_rows} transactions are being archived. Track progress under Archived Accounts.', 'success')
+    except archival.ArchivalError as e:
+        flash(str(e), 'danger')
     except Exception as e:
         db.session.rollback()
         flash(f'Error deleting user: {str(e)}', 'danger')
     
     return redirect(url_for('admin.manage_users'))
 
+@admin_bp.route('/archives')
+@login_required
+def archives():
+    """Deletion jobs, newest first, with their progress and archived statements"""
+    jobs = ArchivalJob.query.order_by(ArchivalJob.id.desc()).limit(200).all()
+    return render_template('archives.html', jobs=jobs, progress=archival.progress)
+
+@admin_bp.route('/archives/<int:job_id>')
+@login_required
+def archive_job_status(job_id):
+    job = ArchivalJob.query.get_or_404(job_id)
+    return jsonify({
+        'job_id': job.id,
+        'user_id': job.user_id,
+        'status': job.status,
+        'archived_rows': job.archived_rows,
+        'total_rows': job.total_rows,
+        'progress': round(archival.progress(job), 4),
+        'error': job.error,
+    })
+
+@admin_bp.route('/archives/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_archive_job(job_id):
+    job = ArchivalJob.query.get_or_404(job_id)
+    try:
+        archival.retry(job)
+        flash(f'Archival of {job.name} restarted.', 'success')
+    except archival.ArchivalError as e:
+        flash(str(e), 'danger')
+    return redirect(url_for('admin.archives'))
+
+@admin_bp.route('/archives/<int:job_id>/statement')
+@login_required
+def download_archived_statement(job_id):
+    """Statement of a deleted account, rendered from its archived transactions by a background job.
+
+    Served from the statement cache like any other statement; until it is
+    rendered the answer is a 202 page that asks again every few seconds.
+    """
+    job = ArchivalJob.query.get_or_404(job_id)
+    if job.status != 'done':
+        abort(404)
+    statement_job_id = statement_jobs.archive_job_id(job.id)
+    path = statement_jobs.cached_statement(statement_job_id)
+    if path:
+        return send_file(path, mimetype='application/pdf', as_attachment=True,
+                         download_name=_statement_filename(job))
+
+    url = url_for('admin.download_archived_statement', job_id=job.id)
+    state, error = statement_jobs.status(statement_job_id)
+    if state == 'failed' and not request.args.get('retry'):
+        return _statement_failed(job, error, url_for('admin.download_archived_statement', job_id=job.id, retry=1))
+    statement_jobs.submit_archived(job)
+    return _statement_pending(job, url)
+
 @admin_bp.route('/transactions')
 @login_required
 def view_transactions():
-    transactions = Transaction.query.order_by(Transaction.timestamp.desc()).all()
-    return render_template('view_transactions.html', transactions=transactions)
+    try:
+        filters = ledger.parse_filters(request.args)
+        cursor = ledger.decode_cursor(request.args.get('cursor'))
+    except ledger.LedgerFilterError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('admin.view_transactions'))
+
+    page = ledger.ledger_page(filters, cursor, per_page=request.args.get('per_page', ledger.DEFAULT_PAGE_SIZE, type=int))
+    return render_template('view_transactions.html',
+                           transactions=page.transactions,
+                           next_cursor=page.next_cursor,
+                           filters=filters,
+                           filter_args=ledger.filter_args(filters),
+                           transaction_types=ledger.TRANSACTION_TYPES)
+
+@admin_bp.route('/transactions/export')
+@login_required
+def export_transactions():
+    """Stream the filtered ledger as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ledger_export.EXPORT_FORMATS:
+        abort(400)
+    try:
+        filters = ledger.parse_filters(request.args)
+    except ledger.LedgerFilterError:
+        abort(400)
+
+    filename = f"transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    # No Content-Length is set, so the rows go out chunked as they are read
+    return Response(
+        stream_with_context(ledger_export.iter_export(filters, export_format)),
+        mimetype=ledger_export.EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"'
+        }
+    )
 
 @admin_bp.route('/profit-distribution', methods=['GET', 'POST'])
 @login_required
 def distribute_profit():
     if request.method == 'POST':
-        total_profit_str = request.form.get('total_profit')
-        distribution_percentage_str = request.form.get('distribution_percentage')
-        
-        if not total_profit_str:
-            flash('Total profit amount is required.', 'danger')
-            return redirect(url_for('admin.distribute_profit'))
-            
-        if not distribution_percentage_str:
-            flash('Distribution percentage is required.', 'danger')
-            return redirect(url_for('admin.distribute_profit'))
-
-        try:
-            total_profit = Decimal(total_profit_str)
-            if total_profit <= 0:
-                flash('Total profit must be a positive amount.', 'danger')
-                return redirect(url_for('admin.distribute_profit'))
-        except ValueError:
-            flash('Invalid total profit amount. Please enter a valid number.', 'danger')
-            return redirect(url_for('admin.distribute_profit'))
-            
         try:
-            distribution_percentage = Decimal(distribution_percentage_str)
-            if distribution_percentage <= 0 or distribution_percentage > 100:
-                flash('Distribution percentage must be between 0 and 100.', 'danger')
-                return redirect(url_for('admin.distribute_profit'))
-        except ValueError:
-            flash('Invalid distribution percentage. Please enter a valid number.', 'danger')
+            distribution = profit_distribution.parse_distribution_request(request.form)
+        except profit_distribution.ProfitDistributionError as e:
+            flash(str(e), 'danger')
             return redirect(url_for('admin.distribute_profit'))
 
-        users = User.query.all()
-        if not users:
-            flash('No users registered to distribute profit to.', 'warning')
-            return redirect(url_for('admin.distribute_profit'))
-
-        total_system_balance = sum(user.balance for user in users if user.balance is not None and user.balance > 0)
-
-        if total_system_balance <= 0:
-            flash('Cannot distribute profit as the total system balance of all users is zero or less.', 'danger')
-            return redirect(url_for('admin.distribute_profit'))
-
-        # Calculate the actual amount to distribute based on percentage
-        amount_to_distribute = (total_profit * distribution_percentage) / 100
-
         try:
-            for user in users:
-                if user.balance is not None and user.balance > 0: # Distribute only to users with positive balance
-                    user_profit_share = (user.balance / total_system_balance) * amount_to_distribute
-                    user.balance += user_profit_share # Balance was already Decimal, direct addition is fine
-                    
-                    profit_transaction = Transaction(
-                        user_id=user.id,
-                        transaction_type='profit_distribution',
-                        amount=user_profit_share,
-                        description=f'Profit share ({user.balance/total_system_balance*100:.2f}%) from {distribution_percentage}% of total profit {total_profit:.2f}'
-                    )
-                    db.session.add(profit_transaction)
-            
-            db.session.commit()
-            flash(f'{distribution_percentage}% of total profit ({amount_to_distribute:.2f}) distributed successfully among eligible users based on their balances.', 'success')
+            if distribution.mode == 'average_balance':
+                result = profit_distribution.distribute_profit_by_average_balance(distribution)
+                basis = f'average daily balances from {distribution.period_start} to {distribution.period_end}'
+            else:
+                result = profit_distribution.distribute_profit(distribution.total_profit, distribution.distribution_percentage)
+                basis = 'balances'
+            current_app.logger.info(
+                'Profit distribution (%s): %d accounts in %.3fs (%.0f rows/sec)',
+                distribution.mode, result.accounts, result.elapsed, result.rows_per_second
+            )
+            flash(f'{distribution.distribution_percentage}% of total profit ({result.amount_distributed:.2f}) distributed successfully among {result.accounts} eligible users based on their {basis} ({result.rows_per_second:.0f} accounts/sec).', 'success')
+        except profit_distribution.ProfitDistributionError as e:
+            flash(str(e), 'danger')
         except Exception as e:
-            db.session.rollback()
             flash(f'Error distributing profit: {str(e)}', 'danger')
 
         return redirect(url_for('admin.distribute_profit'))
     
-    users = User.query.all()
-    total_system_balance = sum(user.balance for user in users if user.balance is not None)
-    return render_template('distribute_profit.html', total_system_balance=total_system_balance)
+    total_system_balance = system_totals.get_total_balance()
+    return render_template('distribute_profit.html', total_system_balance=total_system_balance,
+                           modes=profit_distribution.DISTRIBUTION_MODES)
+
+@admin_bp.route('/api/profit-distribution/preview', methods=['POST'])
+@login_required
+def preview_profit_distribution():
+    """Dry run of a profit distribution: the shares it would credit, without writing them"""
+    values = request.get_json(silent=True)
+    if not isinstance(values, dict):
+        values = request.form
+    try:
+        distribution = profit_distribution.parse_distribution_request(values)
+        preview = profit_distribution.preview_distribution(distribution)
+    except profit_distribution.ProfitDistributionError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'mode': preview.mode,
+        'amount': f'{preview.amount:.2f}',
+        'accounts': preview.accounts,
+        'total_balance': f'{preview.total_balance:.2f}',
+        'elapsed': round(preview.elapsed, 3),
+        'top_shares': [
+            {'id': share['user_id'], 'cnic': share['cnic'], 'name': share['name'], 'share': f"{share['share']:.2f}"}
+            for share in preview.top_shares
+        ],
+    })
 
 @admin_bp.route('/account-operations', methods=['GET', 'POST'])
 @login_required
 def account_operations():
     if request.method == 'POST':
-        operation_type = request.form.get('operation_type')
-        user_cnic = request.form.get('user_cnic')
-        amount_str = request.form.get('amount')
-        to_user_cnic = request.form.get('to_user_cnic')
-
-        if not operation_type or not user_cnic or not amount_str:
-            flash('Missing required fields for the operation.', 'danger')
-            return redirect(url_for('admin.account_operations'))
-        
-        try:
-            amount = Decimal(amount_str)
-            if amount <= 0:
-                flash('Amount must be positive.', 'danger')
-                return redirect(url_for('admin.account_operations'))
-        except ValueError:
-            flash('Invalid amount.', 'danger')
-            return redirect(url_for('admin.account_operations'))
-
-        user = User.query.filter_by(cnic=user_cnic).first()
-        if not user:
-            flash(f'User with CNIC {user_cnic} not found.', 'danger')
-            return redirect(url_for('admin.account_operations'))
-
+        item = {
+            'operation_type': request.form.get('operation_type'),
+            'user_cnic': request.form.get('user_cnic'),
+            'amount': request.form.get('amount'),
+            'to_user_cnic': request.form.get('to_user_cnic'),
+        }
         try:
-            if operation_type == 'credit':
-                user.balance = (user.balance or Decimal('0.00')) + amount
-                desc = f'Credit operation of {amount:.2f}'
-                trans = Transaction(user_id=user.id, transaction_type='credit', amount=amount, description=desc)
-                db.session.add(trans)
-                flash(f'Successfully credited {amount:.2f} to user {user.name}.', 'success')
-
-            elif operation_type == 'debit':
-                if (user.balance or Decimal('0.00')) < amount:
-                    flash(f'Insufficient balance for user {user.name} to debit {amount:.2f}.', 'danger')
-                    return redirect(url_for('admin.account_operations'))
-                user.balance -= amount
-                desc = f'Debit operation of {amount:.2f}'
-                trans = Transaction(user_id=user.id, transaction_type='debit', amount=amount, description=desc)
-                db.session.add(trans)
-                flash(f'Successfully debited {amount:.2f} from user {user.name}.', 'success')
-
-            elif operation_type == 'transfer':
-                if not to_user_cnic:
-                    flash('Recipient CNIC is required for transfer.', 'danger')
-                    return redirect(url_for('admin.account_operations'))
-                if user_cnic == to_user_cnic:
-                    flash('Cannot transfer to the same account.', 'danger')
-                    return redirect(url_for('admin.account_operations'))
-                
-                to_user = User.query.filter_by(cnic=to_user_cnic).first()
-                if not to_user:
-                    flash(f'Recipient user with CNIC {to_user_cnic} not found.', 'danger')
-                    return redirect(url_for('admin.account_operations'))
-
-                if (user.balance or Decimal('0.00')) < amount:
-                    flash(f'Insufficient balance for user {user.name} to transfer {amount:.2f}.', 'danger')
-                    return redirect(url_for('admin.account_operations'))
-                
-                user.balance -= amount
-                to_user.balance = (to_user.balance or Decimal('0.00')) + amount
-
-                desc_sender = f'Transfer out of {amount:.2f} to user {to_user.name} ({to_user.cnic})'
-                trans_sender = Transaction(user_id=user.id, transaction_type='transfer_out', amount=amount, description=desc_sender, related_user_id=to_user.id)
-                db.session.add(trans_sender)
-
-                desc_receiver = f'Transfer in of {amount:.2f} from user {user.name} ({user.cnic})'
-                trans_receiver = Transaction(user_id=to_user.id, transaction_type='transfer_in', amount=amount, description=desc_receiver, related_user_id=user.id)
-                db.session.add(trans_receiver)
-                flash(f'Successfully transferred {amount:.2f} from user {user.name} to user {to_user.name}.', 'success')
-            
-            else:
-                flash('Invalid operation type.', 'danger')
-                return redirect(url_for('admin.account_operations'))
-
-            db.session.commit()
-
+            batch = posting.post_operations([item], idempotency_key=request.form.get('idempotency_key'))
+            result = batch.results[0]
+            flash(result.message, 'success' if batch.applied else 'danger')
+            if batch.replayed:
+                flash('This operation had already been submitted; it was not performed again.', 'info')
         except Exception as e:
-            db.session.rollback()
             flash(f'Error performing operation: {str(e)}', 'danger')
 
         return redirect(url_for('admin.account_operations'))
 
-    users = User.query.all()
-    return render_template('account_operations.html', users=users)
+    # A fresh key per form load, so resubmitting the same form cannot post twice
+    return render_template('account_operations.html', idempotency_key=uuid.uuid4().hex)
 
-def generate_user_statement_pdf(user, transactions):
-    """Generate a PDF statement for a user"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=1,  # Center alignment
-        textColor=colors.darkblue
-    )
-    
-    # Story (content) list
-    story = []
-    
-    # Title
-    story.append(Paragraph("Samad Islamic Banking System", title_style))
-    story.append(Paragraph("Account Statement", styles['Heading2']))
-    story.append(Spacer(1, 12))
-    
-    # User Information
-    user_info = [
-        ['Account Holder:', user.name],
-        ['CNIC:', user.cnic],
-        ['Current Balance:', f"{user.balance:.2f}"],
-        ['Statement Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-    ]
-    
-    user_table = Table(user_info, colWidths=[2*inch, 3*inch])
-    user_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(user_table)
-    story.append(Spacer(1, 20))
-    
-    # Transaction History
-    story.append(Paragraph("Transaction History", styles['Heading3']))
-    story.append(Spacer(1, 12))
-    
-    if transactions:
-        # Prepare transaction data
-        transaction_data = [['Date', 'Type', 'Amount', 'Description']]
-        
-        for trans in transactions:
-            transaction_data.append([
-                trans.timestamp.strftime('%Y-%m-%d %H:%M'),
-                trans.transaction_type.replace('_', ' ').title(),
-                f"{trans.amount:.2f}",
-                trans.description or 'N/A'
-            ])
-        
-        # Create transaction table
-        trans_table = Table(transaction_data, colWidths=[1.2*inch, 1*inch, 1*inch, 2.8*inch])
-        trans_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (3, 1), (3, -1), 'LEFT'),  # Left align description column
-        ]))
-        
-        story.append(trans_table)
-    else:
-        story.append(Paragraph("No transactions found.", styles['Normal']))
-    
-    story.append(Spacer(1, 20))
-    
-    # Footer
-    story.append(Paragraph("This statement is generated by Samad Islamic Banking System", 
-                          ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=1)))
-    
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+@admin_bp.route('/api/users/search')
+@login_required
+def search_users():
+    """Typeahead lookup of users by CNIC or name prefix"""
+    users = user_directory.search_users(request.args.get('q'), request.args.get('limit', user_directory.SEARCH_LIMIT, type=int))
+    return jsonify({'results': [
+        {'id': user.id, 'cnic': user.cnic, 'name': user.name, 'balance': f'{user.balance:.2f}'}
+        for user in users
+    ]})
+
+@admin_bp.route('/api/operations/batch', methods=['POST'])
+@login_required
+def post_operations_batch():
+    """Apply a JSON batch of credit/debit/transfer operations atomically"""
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('operations')
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'Expected a non-empty "operations" list of objects.'}), 400
+    max_batch_size = current_app.config['POSTING_MAX_BATCH_SIZE']
+    if len(items) > max_batch_size:
+        return jsonify({'error': f'Batch exceeds the maximum of {max_batch_size} operations.'}), 413
+
+    try:
+        batch = posting.post_operations(items, idempotency_key=request.headers.get('Idempotency-Key') or payload.get('idempotency_key'))
+    except idempotency.IdempotencyKeyReusedError as e:
+        return jsonify({'error': str(e)}), 422
+    except idempotency.IdempotencyKeyError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error performing operations: {str(e)}'}), 500
+
+    response = jsonify({
+        'applied': batch.applied,
+        'replayed': batch.replayed,
+        'results': [result._asdict() for result in batch.results],
+    })
+    if batch.replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, 200 if batch.applied else 422
+
+@admin_bp.route('/metrics')
+def metrics():
+    """Request metrics of this process in the Prometheus text format"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not (has_token or current_user.is_authenticated):
+        return login_manager.unauthorized()
+    registry = current_app.extensions.get('metrics')
+    if registry is None:
+        abort(404)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def _statement_filename(user):
+    return f"Statement_{user.name}_{user.cnic}_{datetime.now().strftime('%Y%m%d')}.pdf"
+
+# Seconds the "preparing" page waits before asking for the statement again
+STATEMENT_RETRY_AFTER = 2
+
+def _statement_failed(user, error, retry_url):
+    # Rendering again would most likely fail again; leave that to the admin
+    return render_template('statement_pending.html', user=user, state='failed', error=error,
+                           retry_url=retry_url), 500
+
+def _statement_pending(user, url):
+    """202 page for a statement still being rendered, refreshing itself to url"""
+    response = make_response(render_template('statement_pending.html', user=user, state='pending',
+                                             retry_after=STATEMENT_RETRY_AFTER), 202)
+    response.headers['Retry-After'] = str(STATEMENT_RETRY_AFTER)
+    response.headers['Refresh'] = f'{STATEMENT_RETRY_AFTER}; url={url}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @admin_bp.route('/download-statement/<int:user_id>')
 @login_required
 def download_statement(user_id):
-    """Download user statement as PDF"""
+    """Download user statement as PDF once it is cached, queueing it for rendering otherwise.
+
+    Statements are never rendered in the request. Until the background job
+    finishes the answer is a 202 page that asks again every few seconds.
+    """
     user = User.query.get_or_404(user_id)
-    
-    # Get user transactions ordered by timestamp (newest first)
-    transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.timestamp.desc()).all()
-    
-    # Generate PDF
-    pdf_buffer = generate_user_statement_pdf(user, transactions)
-    
-    # Create filename
-    filename = f"Statement_{user.name}_{user.cnic}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    
-    return Response(
-        pdf_buffer.getvalue(),
-        mimetype='application/pdf',
-        headers={
-            'Content-Disposition': f'attachment; filename="{filename}"'
-        }
-    ) 
\ No newline at end of file
+    job_id = statement_jobs.current_job_id(user)
+    etag = statement_jobs.statement_etag(user, job_id)
+    if request.if_none_match.contains_weak(etag):
+        return response_cache.not_modified(etag)
+    path = statement_jobs.cached_statement(job_id)
+    if path:
+        response = send_file(path, mimetype='application/pdf', as_attachment=True,
+                             download_name=_statement_filename(user), etag=etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    url = url_for('admin.download_statement', user_id=user.id)
+    state, error = statement_jobs.status(job_id)
+    if state == 'failed' and not request.args.get('retry'):
+        return _statement_failed(user, error, url_for('admin.download_statement', user_id=user.id, retry=1))
+    statement_jobs.submit(user)
+    return _statement_pending(user, url)
+
+@admin_bp.route('/statements/<int:user_id>/jobs', methods=['POST'])
+@login_required
+def submit_statement_job(user_id):
+    """Queue a statement for rendering in the background"""
+    user = User.query.get_or_404(user_id)
+    job_id = statement_jobs.submit(user)
+    state, _ = statement_jobs.status(job_id)
+    return jsonify({
+        'job_id': job_id,
+        'status': state,
+        'status_url': url_for('admin.statement_job_status', job_id=job_id),
+        'download_url': url_for('admin.download_statement_job', job_id=job_id),
+    }), 202
+
+@admin_bp.route('/statements/jobs/<job_id>')
+@login_required
+def statement_job_status(job_id):
+    try:
+        state, error = statement_jobs.status(job_id)
+    except statement_jobs.StatementJobError:
+        abort(404)
+    return jsonify({'job_id': job_id, 'status': state, 'error': error})
+
+@admin_bp.route('/statements/jobs/<job_id>/download')
+@login_required
+def download_statement_job(job_id):
+    """Serve a statement rendered by a background job"""
+    try:
+        user_id, _, tag = statement_jobs.parse_job_id(job_id)
+        path = statement_jobs.cached_statement(job_id)
+    except statement_jobs.StatementJobError:
+        abort(404)
+    if not path:
+        abort(404)
+    user = User.query.get_or_404(user_id)
+    if tag != statement_jobs.account_tag(user.cnic):
+        # The statement belongs to a deleted account whose id was reused
+        abort(404)
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     download_name=_statement_filename(user))
@@ -13,6 +13,10 @@ def login():
         password = request.form.get('password')
         admin = Admin.query.filter_by(username=username).first()
         if admin and admin.check_password(password):
+            if admin.needs_rehash():
+                # Moves the admin to the configured hash cost on their next login
+                admin.password_hash = Admin.set_password(password)
+                db.session.commit()
             login_user(admin)
             return redirect(url_for('admin.dashboard'))
         else:
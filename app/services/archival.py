@@ -0,0 +1,259 @@
+from .. import db
+from ..models import User, Transaction, BalanceSnapshot, ArchivalJob, TransactionArchive
+from . import system_totals, user_cache
+from .statement_data import StatementUser, StatementLine
+from flask import current_app
+from sqlalchemy import select, update, delete, insert, func
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+import json
+import threading
+import time
+import zlib
+
+# Jobs that still have work to do, in the order `flask archive resume` picks them up
+ACTIVE_STATUSES = ('pending', 'running')
+
+# Payloads written before running balances existed decode with sequence and balance_after as None
+ArchivedTransaction = namedtuple(
+    'ArchivedTransaction',
+    ['id', 'user_id', 'transaction_type', 'amount', 'timestamp', 'description', 'related_user_id',
+     'sequence', 'balance_after'],
+    defaults=(None, None)
+)
+ChunkResult = namedtuple('ChunkResult', ['archived', 'unlinked'])
+
+_executor = None
+_lock = threading.Lock()
+
+
+class ArchivalError(ValueError):
+    """Raised when an account cannot be archived and deleted"""
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # A single writer thread, so archival never competes with itself for the database
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archival')
+        return _executor
+
+
+def encode_chunk(rows):
+    """Compress transaction rows into an archive payload"""
+    return zlib.compress(json.dumps([
+        [row.id, row.user_id, row.transaction_type, str(row.amount),
+         row.timestamp.isoformat() if row.timestamp else None, row.description, row.related_user_id,
+         row.sequence, str(row.balance_after) if row.balance_after is not None else None]
+        for row in rows
+    ], separators=(',', ':')).encode())
+
+
+def decode_chunk(payload):
+    """ArchivedTransactions from an archive payload, in transaction id order"""
+    rows = []
+    for id, user_id, transaction_type, amount, timestamp, description, related_user_id, *numbering \
+            in json.loads(zlib.decompress(payload)):
+        sequence, balance_after = numbering or (None, None)
+        rows.append(ArchivedTransaction(
+            id, user_id, transaction_type, Decimal(amount),
+            datetime.fromisoformat(timestamp) if timestamp else None, description, related_user_id,
+            sequence, Decimal(balance_after) if balance_after is not None else None,
+        ))
+    return rows
+
+
+def active_job(user_id):
+    return db.session.execute(
+        select(ArchivalJob).where(ArchivalJob.user_id == user_id, ArchivalJob.status.in_(ACTIVE_STATUSES))
+    ).scalar()
+
+
+def start_deletion(user):
+    """Record an archival job for the account and return it; the account is removed once it finishes.
+
+    An account that already has an unfinished job gets that job back.
+    """
+    if user.balance > 0:
+        raise ArchivalError('Cannot delete user with positive balance. Please transfer or withdraw their balance first.')
+    job = active_job(user.id)
+    if job is not None:
+        return job
+    total_rows = db.session.execute(
+        select(func.count(Transaction.id)).where(Transaction.user_id == user.id)
+    ).scalar()
+    job = ArchivalJob(user_id=user.id, cnic=user.cnic, name=user.name,
+                      final_balance=user.balance or Decimal('0.00'), total_rows=total_rows)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def archive_chunk(job, chunk_size):
+    """Move up to chunk_size of the account's transactions into the archive and commit.
+
+    Transfers on other accounts that point at this one lose the link, in
+    chunks of the same size; their rows belong to those accounts and stay.
+    """
+    rows = db.session.execute(
+        select(Transaction.id, Transaction.user_id, Transaction.transaction_type, Transaction.amount,
+               Transaction.timestamp, Transaction.description, Transaction.related_user_id,
+               Transaction.sequence, Transaction.balance_after)
+        .where(Transaction.user_id == job.user_id)
+        .order_by(Transaction.id)
+        .limit(chunk_size)
+    ).all()
+    if rows:
+        timestamps = [row.timestamp for row in rows if row.timestamp is not None]
+        db.session.execute(insert(TransactionArchive), [dict(
+            job_id=job.id,
+            user_id=job.user_id,
+            first_transaction_id=rows[0].id,
+            last_transaction_id=rows[-1].id,
+            first_timestamp=min(timestamps, default=None),
+            last_timestamp=max(timestamps, default=None),
+            row_count=len(rows),
+            payload=encode_chunk(rows),
+            created_at=datetime.utcnow(),
+        )])
+        db.session.execute(delete(Transaction).where(Transaction.id.in_([row.id for row in rows])))
+
+    linked = select(Transaction.id).where(Transaction.related_user_id == job.user_id).limit(chunk_size)
+    unlinked = db.session.execute(
+        update(Transaction).where(Transaction.id.in_(linked)).values(related_user_id=None)
+    ).rowcount
+
+    job.archived_rows += len(rows)
+    job.updated_at = datetime.utcnow()
+    db.session.commit()
+    return ChunkResult(len(rows), unlinked)
+
+
+def _has_history(user_id):
+    return db.session.execute(
+        select(Transaction.id)
+        .where((Transaction.user_id == user_id) | (Transaction.related_user_id == user_id))
+        .limit(1)
+    ).first() is not None
+
+
+def _remove_account(job):
+    """Delete the account once nothing refers to it; returns False if new history arrived meanwhile"""
+    # Lock the account row, and on SQLite take the write lock with the first
+    # delete, so no posting can slip in between the check and the delete
+    user = db.session.get(User, job.user_id, with_for_update=True)
+    db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.user_id == job.user_id))
+    if _has_history(job.user_id):
+        db.session.rollback()
+        return False
+    if user is not None:
+        if user.balance > 0:
+            raise ArchivalError('The account received funds during archival; it was not deleted.')
+        job.final_balance = user.balance or Decimal('0.00')
+        db.session.delete(user)
+        system_totals.adjust_total_balance(-job.final_balance)
+    job.status = 'done'
+    job.finished_at = job.updated_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def run_job(job_id, chunk_size=None, pause=None):
+    """Archive the job's account chunk by chunk, then delete it.
+
+    Every chunk commits on its own, pausing in between so other writers
+    get the database, and the job's row records progress. An interrupted
+    job can be run again and carries on where it stopped.
+    """
+    chunk_size = chunk_size or current_app.config['ARCHIVE_CHUNK_SIZE']
+    pause = current_app.config['ARCHIVE_CHUNK_PAUSE'] if pause is None else pause
+    job = db.session.get(ArchivalJob, job_id)
+    if job is None or job.status not in ACTIVE_STATUSES:
+        return job
+    job.status = 'running'
+    job.error = None
+    db.session.commit()
+    try:
+        while True:
+            result = archive_chunk(job, chunk_size)
+            if result.archived < chunk_size and result.unlinked < chunk_size and _remove_account(job):
+                break
+            if pause:
+                time.sleep(pause)
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)[:255]
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.exception('Archival job %d for user %d failed', job.id, job.user_id)
+    user_cache.invalidate(job.cnic)
+    # Imported here as statement_jobs reads archived history through this module
+    from . import statement_jobs
+    # Drop anything rendered while the account was being archived; its id may be reused
+    statement_jobs.invalidate(job.user_id)
+    return job
+
+
+def _run_in_app(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def submit(job):
+    """Run the job on the background archival thread; returns its future"""
+    return _get_executor().submit(_run_in_app, current_app._get_current_object(), job.id)
+
+
+def resume_jobs(chunk_size=None, pause=None):
+    """Run every unfinished job in this process, oldest first; returns the jobs run"""
+    job_ids = db.session.execute(
+        select(ArchivalJob.id).where(ArchivalJob.status.in_(ACTIVE_STATUSES)).order_by(ArchivalJob.id)
+    ).scalars().all()
+    return [run_job(job_id, chunk_size, pause) for job_id in job_ids]
+
+
+def retry(job):
+    """Queue a failed job again"""
+    if job.status != 'failed':
+        raise ArchivalError(f'Archival job {job.id} has not failed.')
+    job.status = 'pending'
+    db.session.commit()
+    return submit(job)
+
+
+def progress(job):
+    """Share of the account's transactions archived so far, from 0 to 1"""
+    if job.status == 'done':
+        return 1.0
+    if not job.total_rows:
+        return 0.0
+    return min(job.archived_rows / job.total_rows, 1.0)
+
+
+def archived_transactions(user_id):
+    """Every archived transaction of the account, in transaction id order"""
+    payloads = db.session.execute(
+        select(TransactionArchive.payload)
+        .where(TransactionArchive.user_id == user_id)
+        .order_by(TransactionArchive.first_transaction_id)
+    ).scalars()
+    return [row for payload in payloads for row in decode_chunk(payload)]
+
+
+def archived_statement_lines(user_id):
+    """Statement lines for the account's archived history, newest first"""
+    return [
+        StatementLine(row.timestamp, row.transaction_type, row.amount, row.description)
+        for row in reversed(archived_transactions(user_id))
+    ]
+
+
+def archived_statement_user(job):
+    return StatementUser(job.user_id, job.name, job.cnic, job.final_balance)
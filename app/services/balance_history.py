@@ -0,0 +1,236 @@
+from .. import db
+from ..models import User, Transaction, BalanceSnapshot
+from ..database import likely
+from sqlalchemy import select, delete, insert, func, case, and_
+from collections import namedtuple
+from decimal import Decimal
+from datetime import datetime, timedelta
+import time
+
+# Accounts are snapshotted in keyset-ordered chunks of this many rows
+DEFAULT_CHUNK_SIZE = 5000
+
+CENT = Decimal('0.01')
+
+# Transaction types that take money out of the account they are posted to
+OUTGOING_TYPES = ('debit', 'transfer_out')
+
+SnapshotResult = namedtuple('SnapshotResult', ['snapshot_date', 'accounts', 'elapsed'])
+
+
+class BalanceHistoryError(ValueError):
+    """Raised when a historical balance cannot be computed for the given arguments"""
+
+
+def signed_amount():
+    """SQL expression for a transaction's effect on its account's balance"""
+    return case(
+        (Transaction.transaction_type.in_(OUTGOING_TYPES), -Transaction.amount),
+        else_=Transaction.amount,
+    )
+
+
+def signed_value(transaction_type, amount):
+    """Python counterpart of signed_amount()"""
+    return -amount if transaction_type in OUTGOING_TYPES else amount
+
+
+def signed(line):
+    """signed_value() of a loaded transaction row"""
+    return signed_value(line.transaction_type, line.amount)
+
+
+def day_end(day):
+    """Start of the next day: balances 'on' a day include everything before this"""
+    return datetime.combine(day + timedelta(days=1), datetime.min.time())
+
+
+def _as_amount(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def _user_delta(user_id, start=None, end=None):
+    """Net balance change of one account from transactions in [start, end)"""
+    query = select(func.sum(signed_amount())).where(Transaction.user_id == user_id)
+    if start is not None:
+        query = query.where(Transaction.timestamp >= start)
+    if end is not None:
+        query = query.where(Transaction.timestamp < end)
+    return _as_amount(db.session.execute(query).scalar())
+
+
+def balance_at(user_id, day):
+    """Closing balance of an account at the end of day (UTC).
+
+    Read from the running balance of the account's highest-sequence
+    transaction before the end of the day; sequence, not the timestamp,
+    is the order running balances follow. Before its first transaction,
+    or for rows without a running balance, starts from the nearest
+    snapshot, before the day if there is one and otherwise after it, and
+    applies only the transactions in between. Without snapshots the
+    current balance is wound back instead.
+    """
+    running = db.session.execute(
+        select(Transaction.balance_after)
+        .where(Transaction.user_id == user_id, likely(Transaction.timestamp < day_end(day)))
+        .order_by(Transaction.sequence.desc())
+        .limit(1)
+    ).scalar()
+    if running is not None:
+        return _as_amount(running)
+
+    before = db.session.execute(
+        select(BalanceSnapshot.snapshot_date, BalanceSnapshot.balance)
+        .where(BalanceSnapshot.user_id == user_id, BalanceSnapshot.snapshot_date <= day)
+        .order_by(BalanceSnapshot.snapshot_date.desc())
+        .limit(1)
+    ).first()
+    if before is not None:
+        return _as_amount(before.balance) + _user_delta(user_id, day_end(before.snapshot_date), day_end(day))
+
+    after = db.session.execute(
+        select(BalanceSnapshot.snapshot_date, BalanceSnapshot.balance)
+        .where(BalanceSnapshot.user_id == user_id, BalanceSnapshot.snapshot_date > day)
+        .order_by(BalanceSnapshot.snapshot_date)
+        .limit(1)
+    ).first()
+    if after is not None:
+        return _as_amount(after.balance) - _user_delta(user_id, day_end(day), day_end(after.snapshot_date))
+
+    current = db.session.execute(select(User.balance).where(User.id == user_id)).scalar()
+    if current is None:
+        raise BalanceHistoryError(f'Account {user_id} does not exist.')
+    return _as_amount(current) - _user_delta(user_id, day_end(day))
+
+
+def average_daily_balance(user_id, start, end):
+    """Mean of the account's closing balances over the days start..end inclusive"""
+    if end < start:
+        raise BalanceHistoryError('The end date must not be before the start date.')
+    balance = balance_at(user_id, start - timedelta(days=1))
+    rows = db.session.execute(
+        select(Transaction.timestamp, Transaction.transaction_type, Transaction.amount)
+        .where(Transaction.user_id == user_id,
+               Transaction.timestamp >= day_end(start - timedelta(days=1)),
+               Transaction.timestamp < day_end(end))
+        .order_by(Transaction.timestamp, Transaction.id)
+    )
+
+    total = Decimal('0.00')
+    day = start
+    for row in rows:
+        # Close out every day that ended before this transaction
+        while row.timestamp >= day_end(day):
+            total += balance
+            day += timedelta(days=1)
+        balance += signed(row)
+    while day <= end:
+        total += balance
+        day += timedelta(days=1)
+    return (total / ((end - start).days + 1)).quantize(CENT)
+
+
+def latest_snapshot_date(on_or_before):
+    return db.session.execute(
+        select(func.max(BalanceSnapshot.snapshot_date)).where(BalanceSnapshot.snapshot_date <= on_or_before)
+    ).scalar()
+
+
+def closing_balance_chunk(day, anchor, start_id=0, limit=DEFAULT_CHUNK_SIZE):
+    """(user_id, closing balance at the end of day) for up to limit accounts after start_id.
+
+    Accounts start from their snapshot on the anchor day, or from their
+    current balance when anchor is None, and the transactions between
+    that point and the day are netted in a single grouped query.
+    """
+    if anchor is not None:
+        base = (
+            select(User.id, func.coalesce(BalanceSnapshot.balance, 0))
+            .outerjoin(BalanceSnapshot, and_(BalanceSnapshot.user_id == User.id,
+                                             BalanceSnapshot.snapshot_date == anchor))
+        )
+        window = (Transaction.timestamp >= day_end(anchor), Transaction.timestamp < day_end(day))
+        direction = 1
+    else:
+        base = select(User.id, User.balance)
+        window = (Transaction.timestamp >= day_end(day),)
+        direction = -1
+
+    accounts = db.session.execute(base.where(User.id > start_id).order_by(User.id).limit(limit)).all()
+    if not accounts:
+        return []
+    deltas = dict(db.session.execute(
+        select(Transaction.user_id, func.sum(signed_amount()))
+        .where(Transaction.user_id.between(accounts[0][0], accounts[-1][0]), *window)
+        .group_by(Transaction.user_id)
+    ).all())
+    return [
+        (user_id, _as_amount(balance) + direction * _as_amount(deltas.get(user_id)))
+        for user_id, balance in accounts
+    ]
+
+
+def iter_closing_balances(day, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (user_id, closing balance at the end of day) for every account in id order"""
+    anchor = latest_snapshot_date(day)
+    last_id = 0
+    while True:
+        chunk = closing_balance_chunk(day, anchor, last_id, chunk_size)
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1][0]
+
+
+def take_snapshots(day, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Record every account's closing balance for day.
+
+    Snapshots already taken for that day are replaced, so a run can be
+    repeated. Only days that have ended can be snapshotted.
+    """
+    if day >= datetime.utcnow().date():
+        raise BalanceHistoryError(f'Cannot snapshot {day}: the day has not ended yet (UTC).')
+
+    started = time.perf_counter()
+    try:
+        db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.snapshot_date == day))
+        # Anchor before this day's rows are written, so they are never read back
+        anchor = latest_snapshot_date(day - timedelta(days=1))
+        now = datetime.utcnow()
+        accounts = 0
+        last_id = 0
+        while True:
+            chunk = closing_balance_chunk(day, anchor, last_id, chunk_size)
+            if not chunk:
+                break
+            db.session.execute(insert(BalanceSnapshot), [
+                dict(user_id=user_id, snapshot_date=day, balance=balance, created_at=now)
+                for user_id, balance in chunk
+            ])
+            accounts += len(chunk)
+            last_id = chunk[-1][0]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return SnapshotResult(snapshot_date=day, accounts=accounts, elapsed=time.perf_counter() - started)
+
+
+def is_month_end(day):
+    return (day + timedelta(days=1)).day == 1
+
+
+def prune_snapshots(keep_days, today=None):
+    """Delete daily snapshots older than keep_days, keeping month-end ones; returns the days removed"""
+    today = today or datetime.utcnow().date()
+    cutoff = today - timedelta(days=keep_days)
+    days = [
+        day for day in db.session.execute(
+            select(BalanceSnapshot.snapshot_date).where(BalanceSnapshot.snapshot_date < cutoff).distinct()
+        ).scalars()
+        if not is_month_end(day)
+    ]
+    if days:
+        db.session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.snapshot_date.in_(days)))
+        db.session.commit()
+    return days
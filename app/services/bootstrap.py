@@ -0,0 +1,21 @@
+from .. import db
+from ..models import Admin
+from . import system_totals
+
+DEFAULT_ADMIN_USERNAME = 'admin'
+DEFAULT_ADMIN_PASSWORD = 'adminpassword'
+
+
+def create_schema():
+    """Create any missing tables and seed the system totals row; existing data is left untouched"""
+    db.create_all()
+    system_totals.get_total_balance()
+
+
+def seed_default_admin(username=DEFAULT_ADMIN_USERNAME, password=DEFAULT_ADMIN_PASSWORD):
+    """Create the first admin account if there is none; returns True if one was created"""
+    if db.session.query(Admin.id).first() is not None:
+        return False
+    db.session.add(Admin(username=username, password_hash=Admin.set_password(password)))
+    db.session.commit()
+    return True
@@ -0,0 +1,87 @@
+from .. import db
+from ..models import IdempotencyKey
+from flask import current_app
+from sqlalchemy import select, delete
+from collections import namedtuple
+from datetime import datetime, timedelta
+import hashlib
+import json
+
+MAX_KEY_LENGTH = 64
+
+# Expired keys deleted per statement by sweep()
+SWEEP_CHUNK_SIZE = 5000
+
+StoredOutcome = namedtuple('StoredOutcome', ['applied', 'results'])
+
+
+class IdempotencyKeyError(ValueError):
+    """Raised for a malformed idempotency key"""
+
+
+class IdempotencyKeyReusedError(IdempotencyKeyError):
+    """Raised when a key that is still live is sent with different operations"""
+
+
+def normalize_key(key):
+    """The key stripped of surrounding whitespace, or None when no key was sent"""
+    if key is None:
+        return None
+    if not isinstance(key, str):
+        raise IdempotencyKeyError('Idempotency key must be a string.')
+    key = key.strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise IdempotencyKeyError(f'Idempotency key must be at most {MAX_KEY_LENGTH} printable characters.')
+    return key
+
+
+def request_hash(items):
+    """Fingerprint of a batch of operations, independent of key order within each operation"""
+    canonical = json.dumps(items, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def find(key, fingerprint):
+    """The stored outcome for a live key, or None if the key is new.
+
+    An expired key that has not been swept yet is deleted in the caller's
+    transaction so the key can be recorded afresh.
+    """
+    row = db.session.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).scalar()
+    if row is None:
+        return None
+    if row.expires_at <= datetime.utcnow():
+        db.session.delete(row)
+        db.session.flush()
+        return None
+    if row.request_hash != fingerprint:
+        raise IdempotencyKeyReusedError('This idempotency key was already used for a different request.')
+    return StoredOutcome(row.applied, [tuple(result) for result in json.loads(row.results)])
+
+
+def record(key, fingerprint, applied, results):
+    """Store an outcome in the caller's transaction, to be committed with the posting itself"""
+    now = datetime.utcnow()
+    db.session.add(IdempotencyKey(
+        key=key,
+        request_hash=fingerprint,
+        applied=applied,
+        results=json.dumps([list(result) for result in results]),
+        created_at=now,
+        expires_at=now + timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL']),
+    ))
+
+
+def sweep(chunk_size=SWEEP_CHUNK_SIZE, now=None):
+    """Delete expired keys, committing every chunk_size rows; returns the number deleted"""
+    now = now or datetime.utcnow()
+    deleted = 0
+    while True:
+        expired = select(IdempotencyKey.id).where(IdempotencyKey.expires_at <= now).limit(chunk_size)
+        count = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired))).rowcount
+        db.session.commit()
+        deleted += count
+        if count < chunk_size:
+            return deleted
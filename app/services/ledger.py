@@ -0,0 +1,112 @@
+from .. import db
+from ..models import User, Transaction
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import joinedload
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+TRANSACTION_TYPES = ['credit', 'debit', 'transfer_out', 'transfer_in', 'profit_distribution']
+
+LedgerFilters = namedtuple('LedgerFilters', ['cnic', 'transaction_type', 'date_from', 'date_to'])
+LedgerPage = namedtuple('LedgerPage', ['transactions', 'next_cursor'])
+
+
+class LedgerFilterError(ValueError):
+    """Raised when ledger filter or cursor arguments cannot be parsed"""
+
+
+def _parse_date(value, field):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise LedgerFilterError(f'Invalid {field} date, expected YYYY-MM-DD.')
+
+
+def parse_filters(args):
+    """Build LedgerFilters from request arguments"""
+    transaction_type = args.get('type') or None
+    if transaction_type and transaction_type not in TRANSACTION_TYPES:
+        raise LedgerFilterError(f'Unknown transaction type {transaction_type}.')
+    return LedgerFilters(
+        cnic=(args.get('cnic') or '').strip() or None,
+        transaction_type=transaction_type,
+        date_from=_parse_date(args.get('date_from'), 'from'),
+        date_to=_parse_date(args.get('date_to'), 'to'),
+    )
+
+
+def filter_args(filters):
+    """Query-string arguments that reproduce the given filters"""
+    args = {
+        'cnic': filters.cnic,
+        'type': filters.transaction_type,
+        'date_from': filters.date_from.isoformat() if filters.date_from else None,
+        'date_to': filters.date_to.isoformat() if filters.date_to else None,
+    }
+    return {key: value for key, value in args.items() if value}
+
+
+def encode_cursor(transaction):
+    """Opaque cursor pointing just past the given transaction"""
+    return f'{transaction.timestamp.isoformat()}_{transaction.id}'
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into a (timestamp, id) tuple"""
+    if not cursor:
+        return None
+    try:
+        timestamp, transaction_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(transaction_id)
+    except ValueError:
+        raise LedgerFilterError('Invalid page cursor.')
+
+
+def apply_filters(query, filters):
+    """Add the WHERE clauses for filters to a statement over Transaction"""
+    if filters.cnic:
+        user_id = select(User.id).where(User.cnic == filters.cnic).scalar_subquery()
+        query = query.where(Transaction.user_id == user_id)
+    if filters.transaction_type:
+        query = query.where(Transaction.transaction_type == filters.transaction_type)
+    if filters.date_from:
+        query = query.where(Transaction.timestamp >= datetime.combine(filters.date_from, datetime.min.time()))
+    if filters.date_to:
+        # date_to is inclusive, so compare against the start of the next day
+        query = query.where(Transaction.timestamp < datetime.combine(filters.date_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+def filtered_query(filters):
+    """Select statement for the ledger, newest first, with filters applied"""
+    query = apply_filters(select(Transaction), filters)
+    return query.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+
+
+def ledger_page(filters, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """One page of the ledger starting after cursor.
+
+    Pages are seeked on (timestamp, id) rather than offset, so every page
+    costs the same index range scan however deep into the ledger it is.
+    Both user relationships are joined into the same query.
+    """
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    query = filtered_query(filters).options(
+        joinedload(Transaction.user),
+        joinedload(Transaction.related_user),
+    )
+    if cursor:
+        query = query.where(tuple_(Transaction.timestamp, Transaction.id) < cursor)
+
+    # Fetch one extra row to find out whether there is a next page
+    transactions = db.session.execute(query.limit(per_page + 1)).scalars().all()
+    next_cursor = None
+    if len(transactions) > per_page:
+        transactions = transactions[:per_page]
+        next_cursor = encode_cursor(transactions[-1])
+    return LedgerPage(transactions=transactions, next_cursor=next_cursor)
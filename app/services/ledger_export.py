@@ -0,0 +1,77 @@
+from .. import db
+from ..models import User, Transaction
+from .ledger import apply_filters
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+import csv
+import io
+import json
+
+# Rows fetched from the database cursor per round-trip while streaming
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+EXPORT_COLUMNS = [
+    'id', 'timestamp', 'user_cnic', 'user_name', 'transaction_type', 'amount',
+    'description', 'related_user_cnic', 'related_user_name',
+]
+
+
+def _export_rows(filters, batch_size):
+    """Yield plain ledger rows, newest first, batch_size rows per fetch"""
+    owner = aliased(User)
+    related = aliased(User)
+    query = apply_filters(
+        select(
+            Transaction.id, Transaction.timestamp, owner.cnic, owner.name,
+            Transaction.transaction_type, Transaction.amount, Transaction.description,
+            related.cnic, related.name,
+        )
+        .join(owner, Transaction.user_id == owner.id)
+        .outerjoin(related, Transaction.related_user_id == related.id),
+        filters,
+    ).order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for row in result:
+        values = dict(zip(EXPORT_COLUMNS, row))
+        values['timestamp'] = values['timestamp'].isoformat() if values['timestamp'] else None
+        values['amount'] = f"{values['amount']:.2f}"
+        yield values
+
+
+def iter_csv(filters, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the filtered ledger as CSV text, one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for count, values in enumerate(_export_rows(filters, batch_size), 1):
+        writer.writerow(values)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(filters, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the filtered ledger as newline-delimited JSON, one chunk per batch of rows"""
+    lines = []
+    for values in _export_rows(filters, batch_size):
+        lines.append(json.dumps(values))
+        if len(lines) == batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_export(filters, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """Dispatch to the generator for export_format"""
+    if export_format == 'csv':
+        return iter_csv(filters, batch_size)
+    return iter_ndjson(filters, batch_size)
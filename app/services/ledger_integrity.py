@@ -0,0 +1,170 @@
+from .. import db
+from ..models import User, Transaction, LedgerCheckpoint, ArchivalJob
+from ..models.money import paisa, from_paisa
+from .balance_history import signed_value
+from flask import current_app
+from sqlalchemy import select, and_, or_
+from collections import namedtuple
+from datetime import datetime, timedelta
+import time
+
+# Transactions read per round-trip
+CHECK_CHUNK_SIZE = 5000
+
+# Keeps each (user_id, sequence) lookup under SQLite's bound-parameter limit and
+# in a form its planner answers from ix_transaction_user_id_sequence
+LOOKUP_CHUNK_SIZE = 450
+
+# Problems listed in a result; all of them are counted
+MAX_REPORTED_PROBLEMS = 1000
+
+Problem = namedtuple('Problem', ['transaction_id', 'user_id', 'message'])
+CheckResult = namedtuple(
+    'CheckResult',
+    ['start_id', 'last_transaction_id', 'rows_checked', 'accounts_checked', 'problem_count', 'problems', 'elapsed']
+)
+
+
+def last_checkpoint_id():
+    """Id of the newest transaction verified by an earlier run, 0 before the first"""
+    return db.session.execute(
+        select(LedgerCheckpoint.last_transaction_id).order_by(LedgerCheckpoint.id.desc()).limit(1)
+    ).scalar() or 0
+
+
+def _settled_rows(after_id, cutoff, limit):
+    """Up to limit transactions after after_id in id order, stopping at the first newer than cutoff"""
+    rows = db.session.execute(
+        select(Transaction.id, Transaction.user_id, Transaction.transaction_type, paisa(Transaction.amount),
+               Transaction.sequence, paisa(Transaction.balance_after), Transaction.timestamp)
+        .where(Transaction.id > after_id)
+        .order_by(Transaction.id)
+        .limit(limit)
+    ).all()
+    for index, row in enumerate(rows):
+        # Ids are handed out before commit, so a lower id may still appear
+        # while younger rows are in flight; leave those for the next run
+        if row.timestamp is not None and row.timestamp >= cutoff:
+            return rows[:index], True
+    return rows, False
+
+
+def _accounts_being_archived(rows):
+    """Accounts whose deletion has started; their oldest transactions may already be archived"""
+    user_ids = sorted({row.user_id for row in rows})
+    archiving = set()
+    for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE * 2):
+        archiving.update(db.session.execute(
+            select(ArchivalJob.user_id)
+            .where(ArchivalJob.user_id.in_(user_ids[start:start + LOOKUP_CHUNK_SIZE * 2]), ArchivalJob.status != 'done')
+        ).scalars())
+    return archiving
+
+
+def _previous_rows(rows, known):
+    """(sequence, balance_after) of the row before each new account's first row in rows"""
+    wanted = {}
+    for row in rows:
+        if row.user_id not in known and row.user_id not in wanted and row.sequence:
+            wanted[row.user_id] = row.sequence - 1
+    previous = {user_id: (0, 0) for user_id, sequence in wanted.items() if sequence == 0}
+    pairs = [(user_id, sequence) for user_id, sequence in wanted.items() if sequence > 0]
+    for start in range(0, len(pairs), LOOKUP_CHUNK_SIZE):
+        for user_id, sequence, balance_after in db.session.execute(
+            select(Transaction.user_id, Transaction.sequence, paisa(Transaction.balance_after))
+            .where(or_(*(and_(Transaction.user_id == user_id, Transaction.sequence == sequence)
+                         for user_id, sequence in pairs[start:start + LOOKUP_CHUNK_SIZE])))
+        ):
+            previous[user_id] = (sequence, balance_after)
+    return previous
+
+
+def _check_rows(rows, state, report):
+    """Verify each row continues its account's chain; state maps user_id to the last verified row"""
+    archiving = _accounts_being_archived(rows)
+    rows = [row for row in rows if row.user_id not in archiving]
+    state.update(_previous_rows(rows, state))
+    for row in rows:
+        if row.sequence is None or row.balance_after is None:
+            report(row.id, row.user_id, 'has no sequence number or running balance.')
+            state[row.user_id] = None
+            continue
+        previous = state.get(row.user_id, ())
+        if previous is None:
+            # Nothing to chain from after a row without values; start again here
+            state[row.user_id] = (row.sequence, row.balance_after)
+            continue
+        if not previous:
+            report(row.id, row.user_id, f'sequence {row.sequence} follows a missing transaction {row.sequence - 1}.')
+            state[row.user_id] = (row.sequence, row.balance_after)
+            continue
+        sequence, balance = previous
+        if row.sequence != sequence + 1:
+            report(row.id, row.user_id, f'sequence {row.sequence} should be {sequence + 1}.')
+        effect = signed_value(row.transaction_type, row.amount)
+        if row.balance_after != balance + effect:
+            report(row.id, row.user_id,
+                   f'balance after {from_paisa(row.balance_after)} should be {from_paisa(balance + effect)}.')
+        state[row.user_id] = (row.sequence, row.balance_after)
+
+
+def _check_accounts(state, report):
+    """Compare each account's stored balance with its last verified transaction"""
+    user_ids = sorted(user_id for user_id, last in state.items() if last)
+    for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE * 2):
+        for user_id, balance, last_sequence in db.session.execute(
+            select(User.id, paisa(User.balance), User.last_sequence)
+            .where(User.id.in_(user_ids[start:start + LOOKUP_CHUNK_SIZE * 2]))
+        ):
+            sequence, balance_after = state[user_id]
+            if last_sequence < sequence:
+                report(None, user_id, f'last sequence {last_sequence} is behind its transaction {sequence}.')
+            elif last_sequence == sequence and (balance or 0) != balance_after:
+                # Accounts with newer, unsettled transactions are compared on a later run
+                report(None, user_id, f'balance {from_paisa(balance or 0)} does not match '
+                                      f'its running balance {from_paisa(balance_after)}.')
+
+
+def verify(full=False, chunk_size=CHECK_CHUNK_SIZE, settle_seconds=None):
+    """Check the running balances and sequence numbers of transactions past the last checkpoint.
+
+    Every new row must carry the next sequence number of its account and
+    its balance_after must be the previous row's plus the row's amount,
+    and each account touched must hold the balance of its last row. Rows
+    younger than settle_seconds are left for the next run, and accounts
+    being deleted are skipped. The run is recorded as a checkpoint, so the
+    next one starts where it stopped; full starts again from the first
+    transaction.
+    """
+    started = time.perf_counter()
+    if settle_seconds is None:
+        settle_seconds = current_app.config['LEDGER_CHECK_SETTLE_SECONDS']
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    start_id = 0 if full else last_checkpoint_id()
+
+    problems = []
+    problem_count = 0
+
+    def report(transaction_id, user_id, message):
+        nonlocal problem_count
+        problem_count += 1
+        if len(problems) < MAX_REPORTED_PROBLEMS:
+            problems.append(Problem(transaction_id, user_id, message))
+
+    state = {}
+    last_id = start_id
+    checked = 0
+    while True:
+        rows, reached_unsettled = _settled_rows(last_id, cutoff, chunk_size)
+        if rows:
+            _check_rows(rows, state, report)
+            last_id = rows[-1].id
+            checked += len(rows)
+        if reached_unsettled or len(rows) < chunk_size:
+            break
+    _check_accounts(state, report)
+
+    if checked:
+        db.session.add(LedgerCheckpoint(last_transaction_id=last_id, rows_checked=checked, problems=problem_count))
+        db.session.commit()
+    return CheckResult(start_id, last_id, checked, len(state), problem_count, problems, time.perf_counter() - started)
@@ -0,0 +1,322 @@
+from .. import db
+from ..models import User, Transaction, ArchivalJob
+from . import system_totals, user_cache, idempotency, balance_history
+from .archival import ACTIVE_STATUSES
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import OperationalError, IntegrityError
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+
+OPERATION_TYPES = ['credit', 'debit', 'transfer']
+
+# Keeps each CNIC lookup under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 900
+
+# Attempts made when a concurrent writer changes a balance mid-batch
+MAX_ATTEMPTS = 5
+
+# Largest amount accepted from input, that of the NUMERIC(15, 2) columns amounts
+# were stored in before paisa; leaves ample headroom under the BIGINT columns
+MAX_AMOUNT = Decimal('9999999999999.99')
+
+OperationResult = namedtuple('OperationResult', ['index', 'status', 'message'])
+# replayed is set when the outcome was stored under an idempotency key and nothing was posted
+BatchResult = namedtuple('BatchResult', ['applied', 'results', 'replayed'], defaults=(False,))
+
+
+class PostingError(Exception):
+    """Raised when a single operation in a batch fails validation"""
+
+
+class BalanceConflictError(Exception):
+    """Raised when a guarded balance update finds the balance changed underneath it"""
+
+
+class _Account:
+    """In-memory view of a user while a batch is validated"""
+    __slots__ = ('id', 'cnic', 'name', 'balance', 'delta', 'closing')
+
+    def __init__(self, id, cnic, name):
+        self.id = id
+        self.cnic = cnic
+        self.name = name
+        # Opening balance, read only for accounts the batch draws money from
+        self.balance = None
+        self.delta = Decimal('0.00')
+        # Set while the account's history is being archived for deletion
+        self.closing = False
+
+    def available(self):
+        return self.balance + self.delta
+
+
+def parse_amount(value, allow_zero=False, field='Amount'):
+    """A finite, two-decimal Decimal from user input up to MAX_AMOUNT, positive unless allow_zero.
+
+    Raises PostingError naming field for anything else, including text
+    that is not a number at all.
+    """
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise PostingError(f'Invalid {field.lower()}.')
+    if not amount.is_finite():
+        raise PostingError(f'Invalid {field.lower()}.')
+    if allow_zero and amount < 0:
+        raise PostingError(f'{field} cannot be negative.')
+    if not allow_zero and amount <= 0:
+        raise PostingError(f'{field} must be positive.')
+    if amount > MAX_AMOUNT:
+        raise PostingError(f'{field} cannot exceed {MAX_AMOUNT:,}.')
+    if amount != amount.quantize(Decimal('0.01')):
+        raise PostingError(f'{field} cannot have more than two decimal places.')
+    return amount
+
+
+def _load_accounts(cnics, sources):
+    """Resolve every CNIC in the batch and read the balances it draws on.
+
+    CNICs are resolved through the user cache. Balances are only needed
+    for accounts that are debited or send a transfer; credits and
+    incoming transfers are applied by the guarded updates without being
+    read. On backends with row locks the source rows are locked in id
+    order, so two batches touching the same accounts always queue rather
+    than deadlock. SQLite ignores FOR UPDATE and relies on the guarded
+    updates instead. Accounts with an unfinished deletion job are marked
+    as closing.
+    """
+    accounts = {
+        cnic: _Account(*user)
+        for cnic, user in user_cache.lookup_many(cnics).items()
+    }
+    by_id = {account.id: account for account in accounts.values()}
+    ids = sorted(by_id)
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        for user_id in db.session.execute(
+            select(ArchivalJob.user_id)
+            .where(ArchivalJob.user_id.in_(ids[start:start + LOOKUP_CHUNK_SIZE]),
+                   ArchivalJob.status.in_(ACTIVE_STATUSES))
+        ).scalars():
+            by_id[user_id].closing = True
+    source_ids = sorted({accounts[cnic].id for cnic in sources if cnic in accounts})
+    balances = {}
+    for start in range(0, len(source_ids), LOOKUP_CHUNK_SIZE):
+        balances.update(db.session.execute(
+            select(User.id, User.balance)
+            .where(User.id.in_(source_ids[start:start + LOOKUP_CHUNK_SIZE]))
+            .order_by(User.id)
+            .with_for_update()
+        ).all())
+    for cnic in sources:
+        account = accounts.get(cnic)
+        if account is None:
+            continue
+        if account.id not in balances:
+            # The cache still knew a user that has since been deleted
+            raise BalanceConflictError(f'Account {account.id} no longer exists.')
+        account.balance = balances[account.id] or Decimal('0.00')
+    return accounts
+
+
+def _apply(item, accounts, timestamp):
+    """Validate one operation against the running balances.
+
+    Returns the success message and the transaction rows to insert; the
+    in-memory balances are updated so later items see the effect.
+    """
+    operation_type = item.get('operation_type')
+    user_cnic = item.get('user_cnic')
+    amount_value = item.get('amount')
+    to_user_cnic = item.get('to_user_cnic')
+
+    if not operation_type or not user_cnic or amount_value in (None, ''):
+        raise PostingError('Missing required fields for the operation.')
+    if not isinstance(user_cnic, str) or not isinstance(to_user_cnic, (str, type(None))):
+        raise PostingError('CNICs must be given as strings.')
+    if operation_type not in OPERATION_TYPES:
+        raise PostingError('Invalid operation type.')
+    amount = parse_amount(amount_value)
+
+    user = accounts.get(user_cnic)
+    if not user:
+        raise PostingError(f'User with CNIC {user_cnic} not found.')
+    if user.closing:
+        raise PostingError(f'User with CNIC {user_cnic} is being deleted.')
+
+    if operation_type == 'credit':
+        user.delta += amount
+        return f'Successfully credited {amount:.2f} to user {user.name}.', [
+            dict(user_id=user.id, transaction_type='credit', amount=amount, related_user_id=None,
+                 description=f'Credit operation of {amount:.2f}', timestamp=timestamp),
+        ]
+
+    if operation_type == 'debit':
+        if user.available() < amount:
+            raise PostingError(f'Insufficient balance for user {user.name} to debit {amount:.2f}.')
+        user.delta -= amount
+        return f'Successfully debited {amount:.2f} from user {user.name}.', [
+            dict(user_id=user.id, transaction_type='debit', amount=amount, related_user_id=None,
+                 description=f'Debit operation of {amount:.2f}', timestamp=timestamp),
+        ]
+
+    if not to_user_cnic:
+        raise PostingError('Recipient CNIC is required for transfer.')
+    if user_cnic == to_user_cnic:
+        raise PostingError('Cannot transfer to the same account.')
+    to_user = accounts.get(to_user_cnic)
+    if not to_user:
+        raise PostingError(f'Recipient user with CNIC {to_user_cnic} not found.')
+    if to_user.closing:
+        raise PostingError(f'Recipient user with CNIC {to_user_cnic} is being deleted.')
+    if user.available() < amount:
+        raise PostingError(f'Insufficient balance for user {user.name} to transfer {amount:.2f}.')
+    user.delta -= amount
+    to_user.delta += amount
+    return f'Successfully transferred {amount:.2f} from user {user.name} to user {to_user.name}.', [
+        dict(user_id=user.id, transaction_type='transfer_out', amount=amount, related_user_id=to_user.id,
+             description=f'Transfer out of {amount:.2f} to user {to_user.name} ({to_user.cnic})', timestamp=timestamp),
+        dict(user_id=to_user.id, transaction_type='transfer_in', amount=amount, related_user_id=user.id,
+             description=f'Transfer in of {amount:.2f} from user {user.name} ({user.cnic})', timestamp=timestamp),
+    ]
+
+
+def apply_balance_delta(user_id, effects):
+    """Atomically apply the signed amounts in effects, in order, to one account.
+
+    The check and the write are a single UPDATE, so two concurrent debits
+    can never both pass against the same funds. The same statement
+    reserves one sequence number per effect and returns the new balance,
+    from which the (sequence, balance_after) of every effect is worked
+    back; they are returned in the order of effects.
+    """
+    delta = sum(effects, Decimal('0.00'))
+    user_table = User.__table__
+    row = db.session.execute(
+        update(user_table)
+        .where(user_table.c.id == user_id, user_table.c.balance + delta >= 0)
+        .values(balance=user_table.c.balance + delta,
+                last_sequence=user_table.c.last_sequence + len(effects))
+        .returning(user_table.c.balance, user_table.c.last_sequence)
+    ).first()
+    if row is None:
+        raise BalanceConflictError(f'Balance of account {user_id} changed during posting.')
+    balance, sequence = row
+    numbered = []
+    for effect in reversed(effects):
+        numbered.append((sequence, balance))
+        sequence -= 1
+        balance -= effect
+    numbered.reverse()
+    return numbered
+
+
+def _batch_cnics(items):
+    """Every CNIC in the batch, and those the batch draws money from.
+
+    Values that are not strings are left out; _apply rejects their items.
+    """
+    cnics = set()
+    sources = set()
+    for item in items:
+        cnics.update(cnic for cnic in (item.get('user_cnic'), item.get('to_user_cnic')) if cnic and isinstance(cnic, str))
+        user_cnic = item.get('user_cnic')
+        if item.get('operation_type') in ('debit', 'transfer') and user_cnic and isinstance(user_cnic, str):
+            sources.add(user_cnic)
+    return cnics, sources
+
+
+def _post_once(items, key=None, fingerprint=None):
+    if key is not None:
+        stored = idempotency.find(key, fingerprint)
+        if stored is not None:
+            db.session.rollback()
+            return BatchResult(stored.applied, [OperationResult(*result) for result in stored.results], replayed=True)
+
+    accounts = _load_accounts(*_batch_cnics(items))
+
+    timestamp = datetime.utcnow()
+    results = []
+    transaction_rows = []
+    failed = False
+    for index, item in enumerate(items):
+        try:
+            message, rows = _apply(item, accounts, timestamp)
+        except PostingError as e:
+            failed = True
+            results.append(OperationResult(index, 'rejected', str(e)))
+            continue
+        transaction_rows.extend(rows)
+        results.append(OperationResult(index, 'applied', message))
+
+    if failed:
+        results = [
+            result._replace(status='skipped', message='Not applied because another operation in the batch was rejected.')
+            if result.status == 'applied' else result
+            for result in results
+        ]
+        if key is not None:
+            # Nothing was written, so only the outcome is committed; a retry with the key gets the same rejection
+            idempotency.record(key, fingerprint, False, results)
+            db.session.commit()
+        else:
+            db.session.rollback()
+        return BatchResult(applied=False, results=results)
+
+    # Write each account in id order, the same order locks were taken, and
+    # number its transactions in the order they appear in the batch
+    rows_by_account = {}
+    for row in transaction_rows:
+        rows_by_account.setdefault(row['user_id'], []).append(row)
+    for user_id in sorted(rows_by_account):
+        rows = rows_by_account[user_id]
+        numbered = apply_balance_delta(user_id, [balance_history.signed_value(row['transaction_type'], row['amount'])
+                                                 for row in rows])
+        for row, (sequence, balance_after) in zip(rows, numbered):
+            row['sequence'] = sequence
+            row['balance_after'] = balance_after
+    if transaction_rows:
+        system_totals.adjust_total_balance(sum(account.delta for account in accounts.values()))
+        db.session.execute(insert(Transaction), transaction_rows)
+    if key is not None:
+        idempotency.record(key, fingerprint, True, results)
+    db.session.commit()
+    return BatchResult(applied=True, results=results)
+
+
+def post_operations(items, idempotency_key=None):
+    """Validate and apply a batch of credit/debit/transfer operations.
+
+    items are mappings with operation_type, user_cnic, amount and, for
+    transfers, to_user_cnic. Operations are checked in order against
+    running in-memory balances. The batch is all-or-nothing: if any item
+    is rejected nothing is written and the valid items are reported as
+    skipped. Otherwise each account's net change is applied with a
+    guarded UPDATE and the transactions are inserted in bulk, committed
+    together. If another writer got in between the read and the write the
+    batch is rolled back and revalidated against fresh balances.
+
+    With an idempotency_key the outcome is committed together with the
+    posting, and a later call with the same key and operations returns it
+    with replayed set instead of posting again.
+    """
+    key = idempotency.normalize_key(idempotency_key)
+    fingerprint = idempotency.request_hash(items) if key is not None else None
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return _post_once(items, key, fingerprint)
+        except (BalanceConflictError, OperationalError):
+            # OperationalError covers SQLite reporting the database as locked
+            db.session.rollback()
+            if attempt == MAX_ATTEMPTS:
+                raise
+            # A conflict can also mean a cached CNIC went stale; resolve afresh
+            user_cache.invalidate(*_batch_cnics(items)[0])
+        except IntegrityError:
+            db.session.rollback()
+            # A concurrent request with the same key committed first; the next attempt replays it
+            if key is None or attempt == MAX_ATTEMPTS:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
@@ -0,0 +1,165 @@
+from .. import db
+from ..models import Admin
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from collections import OrderedDict, namedtuple
+from itertools import chain
+import threading
+import time
+
+# Session.info key holding the ids of admins changed in the open transaction
+_CHANGED_KEY = 'principal_cache_changed'
+
+PrincipalCacheStats = namedtuple('PrincipalCacheStats', ['hits', 'misses', 'size', 'capacity', 'hit_rate'])
+
+
+class Principal(UserMixin):
+    """The signed-in admin as Flask-Login sees it on later requests.
+
+    Only what identifies the admin is kept; the password hash never sits
+    in the cache.
+    """
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def __repr__(self):
+        return f'<Principal {self.username}>'
+
+
+class PrincipalCache:
+    """Bounded map of admin id to Principal with a per-entry TTL, for one app in one process.
+
+    Changes to Admin rows made through this process's sessions drop the
+    entry when they are flushed and again when they commit. Other worker
+    processes keep serving an entry for up to ttl seconds, which bounds
+    how long a renamed or deleted admin stays signed in there.
+    """
+
+    def __init__(self, capacity, ttl):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, admin_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(admin_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(admin_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[admin_id]
+            self.misses += 1
+            return None
+
+    def put(self, principal):
+        if self.capacity <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *admin_ids):
+        with self._lock:
+            for admin_id in admin_ids:
+                self._entries.pop(admin_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return PrincipalCacheStats(self.hits, self.misses, len(self._entries), self.capacity,
+                                       self.hits / lookups if lookups else 0.0)
+
+    def render_metrics(self):
+        """Prometheus text lines for /admin/metrics"""
+        stats = self.stats()
+        return [
+            '# HELP samad_principal_cache_hits_total Signed-in admins loaded from the principal cache.',
+            '# TYPE samad_principal_cache_hits_total counter',
+            f'samad_principal_cache_hits_total {stats.hits}',
+            '# HELP samad_principal_cache_misses_total Signed-in admins loaded from the database.',
+            '# TYPE samad_principal_cache_misses_total counter',
+            f'samad_principal_cache_misses_total {stats.misses}',
+            '# HELP samad_principal_cache_hit_ratio Share of admin loads answered from the cache.',
+            '# TYPE samad_principal_cache_hit_ratio gauge',
+            f'samad_principal_cache_hit_ratio {stats.hit_rate!r}',
+            '# HELP samad_principal_cache_entries Admins currently held in the cache.',
+            '# TYPE samad_principal_cache_entries gauge',
+            f'samad_principal_cache_entries {stats.size}',
+        ]
+
+
+def _invalidate_if_active(admin_ids):
+    if admin_ids and has_app_context():
+        cache = current_app.extensions.get('principal_cache')
+        if cache is not None:
+            cache.invalidate(*admin_ids)
+
+
+def _after_flush(session, flush_context):
+    changed = {obj.id for obj in chain(session.dirty, session.deleted) if isinstance(obj, Admin)}
+    if changed:
+        session.info.setdefault(_CHANGED_KEY, set()).update(changed)
+        _invalidate_if_active(changed)
+
+
+def _after_commit(session):
+    # A load between the flush and the commit may have cached the old row again
+    _invalidate_if_active(session.info.pop(_CHANGED_KEY, None))
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def init_app(app):
+    cache = app.extensions['principal_cache'] = PrincipalCache(
+        app.config['PRINCIPAL_CACHE_SIZE'], app.config['PRINCIPAL_CACHE_TTL'])
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.collectors.append(cache.render_metrics)
+    return cache
+
+
+def _cache():
+    return current_app.extensions['principal_cache']
+
+
+def load(admin_id):
+    """The Principal for admin_id, or None if no such admin exists"""
+    cache = _cache()
+    principal = cache.get(admin_id)
+    if principal is None:
+        row = db.session.execute(select(Admin.id, Admin.username).where(Admin.id == admin_id)).first()
+        if row is None:
+            return None
+        principal = Principal(*row)
+        cache.put(principal)
+    return principal
+
+
+def invalidate(*admin_ids):
+    """Forget the given admins; needed only after writes that bypass the ORM session"""
+    _cache().invalidate(*admin_ids)
+
+
+def stats():
+    return _cache().stats()
@@ -0,0 +1,352 @@
+from .. import db
+from ..models import User, Transaction
+from ..models.money import PAISA, paisa, to_paisa, from_paisa
+from . import system_totals, balance_history, posting
+from sqlalchemy import select, update, insert, bindparam, literal, BigInteger, DateTime, String
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+from datetime import datetime, timedelta
+from array import array
+import heapq
+import time
+
+# Accounts are read and written in keyset-ordered chunks of this many rows
+DEFAULT_CHUNK_SIZE = 5000
+
+# 'balance' weights accounts by their current balance, 'average_balance' by
+# the sum of their daily closing balances over a period
+DISTRIBUTION_MODES = ['balance', 'average_balance']
+
+# Rows per round-trip for the read-only scans behind average balance weights
+SCAN_BATCH_SIZE = 20000
+
+# Largest shares listed by a dry-run preview
+PREVIEW_TOP_SHARES = 20
+
+DistributionResult = namedtuple(
+    'DistributionResult',
+    ['amount_distributed', 'total_balance', 'accounts', 'elapsed', 'rows_per_second']
+)
+DistributionRequest = namedtuple(
+    'DistributionRequest',
+    ['total_profit', 'distribution_percentage', 'mode', 'period_start', 'period_end']
+)
+Allocation = namedtuple('Allocation', ['ids', 'weights', 'shares', 'total_weight', 'amount_paisa'])
+DistributionPreview = namedtuple(
+    'DistributionPreview',
+    ['amount', 'mode', 'accounts', 'total_balance', 'top_shares', 'elapsed']
+)
+
+
+class ProfitDistributionError(Exception):
+    """Raised when a profit distribution cannot be carried out"""
+
+
+def _eligible_chunks(chunk_size, lock=False):
+    """Yield lists of (id, balance_paisa) for positive-balance accounts in id order.
+
+    With lock, the rows are read FOR UPDATE and stay locked until the
+    caller commits, so their balances cannot move under it. SQLite ignores
+    FOR UPDATE; there the credits are applied as increments instead.
+    """
+    last_id = 0
+    while True:
+        query = (
+            select(User.id, paisa(User.balance))
+            .where(User.id > last_id, User.balance > 0)
+            .order_by(User.id)
+            .limit(chunk_size)
+        )
+        rows = db.session.execute(query.with_for_update() if lock else query).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _write_shares(shares, timestamp):
+    """Credit (user_id, share_paisa, description) rows in bulk.
+
+    Returns the number of accounts credited and the paisa credited to
+    them; accounts deleted since their shares were worked out are skipped
+    by the update and left out of both.
+    """
+    rows = [
+        {'account_id': user_id, 'share': share, 'timestamp': timestamp, 'description': description}
+        for user_id, share, description in shares if share > 0
+    ]
+    if not rows:
+        return 0, 0
+    # Increment rather than overwrite so concurrent postings are not lost.
+    # Shares stay integer paisa all the way into the database.
+    user_table = User.__table__
+    db.session.execute(
+        update(user_table)
+        .where(user_table.c.id == bindparam('account_id'))
+        .values(balance=paisa(user_table.c.balance) + bindparam('share', type_=BigInteger),
+                last_sequence=user_table.c.last_sequence + 1),
+        rows
+    )
+    # Each transaction copies the sequence number and balance the update just wrote
+    db.session.execute(
+        insert(Transaction.__table__).from_select(
+            ['user_id', 'transaction_type', 'amount', 'timestamp', 'description', 'sequence', 'balance_after'],
+            select(user_table.c.id, literal('profit_distribution'), bindparam('share', type_=BigInteger),
+                   bindparam('timestamp', type_=DateTime), bindparam('description', type_=String),
+                   user_table.c.last_sequence, paisa(user_table.c.balance))
+            .where(user_table.c.id == bindparam('account_id'))
+        ),
+        rows
+    )
+    # The updated rows are now held by this transaction, so none can vanish after this read
+    credited_ids = set(db.session.execute(
+        select(User.id).where(User.id.in_([row['account_id'] for row in rows]))
+    ).scalars())
+    return len(credited_ids), sum(row['share'] for row in rows if row['account_id'] in credited_ids)
+
+
+def _credit_allocation(allocation, description, chunk_size):
+    """Write an allocation's shares and the system total in one database transaction.
+
+    The system total grows by the paisa actually credited. Returns the
+    number of accounts credited and that amount in paisa.
+    """
+    timestamp = datetime.utcnow()
+    accounts = 0
+    credited = 0
+    try:
+        for start in range(0, len(allocation.ids), chunk_size):
+            chunk_accounts, chunk_credited = _write_shares([
+                (allocation.ids[i], allocation.shares[i],
+                 f'{description} ({Decimal(allocation.weights[i] * 100) / allocation.total_weight:.2f}% share)')
+                for i in range(start, min(start + chunk_size, len(allocation.ids)))
+            ], timestamp)
+            accounts += chunk_accounts
+            credited += chunk_credited
+        system_totals.adjust_total_balance(from_paisa(credited))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return accounts, credited
+
+
+def distribute_profit(total_profit, distribution_percentage, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Distribute a percentage of total_profit across all positive balances.
+
+    Balances are read once, locked where the database supports it, and
+    split by allocate: each account receives floor(balance * amount /
+    total_balance) paisa and the paisa lost to flooring go one each to the
+    largest balances, so the shares add up to exactly the amount being
+    distributed. Balances are updated and profit_distribution transactions
+    inserted in bulk, one chunk at a time, within a single database
+    transaction.
+    """
+    started = time.perf_counter()
+
+    amount_paisa = distributable_paisa(total_profit, distribution_percentage)
+    ids, weights = balance_weights(chunk_size, lock=True)
+    if sum(weights) <= 0:
+        db.session.rollback()
+        raise ProfitDistributionError('Cannot distribute profit as the total system balance of all users is zero or less.')
+    allocation = allocate(ids, weights, amount_paisa)
+
+    description = f'Profit share from {distribution_percentage}% of total profit {Decimal(total_profit):.2f}'
+    accounts, credited = _credit_allocation(allocation, description, chunk_size)
+
+    elapsed = time.perf_counter() - started
+    return DistributionResult(
+        amount_distributed=from_paisa(credited),
+        total_balance=from_paisa(allocation.total_weight),
+        accounts=accounts,
+        elapsed=elapsed,
+        rows_per_second=accounts / elapsed if elapsed > 0 else float(accounts),
+    )
+
+
+def _parse_decimal(value, message):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ProfitDistributionError(message)
+    if not number.is_finite():
+        raise ProfitDistributionError(message)
+    return number
+
+
+def _parse_day(value, field):
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise ProfitDistributionError(f'Invalid period {field} date, expected YYYY-MM-DD.')
+
+
+def parse_distribution_request(values):
+    """Validate the profit distribution form or JSON body into a DistributionRequest"""
+    if not values.get('total_profit'):
+        raise ProfitDistributionError('Total profit amount is required.')
+    if not values.get('distribution_percentage'):
+        raise ProfitDistributionError('Distribution percentage is required.')
+    try:
+        total_profit = posting.parse_amount(values.get('total_profit'), field='Total profit')
+    except posting.PostingError as e:
+        raise ProfitDistributionError(str(e))
+    distribution_percentage = _parse_decimal(values.get('distribution_percentage'), 'Invalid distribution percentage. Please enter a valid number.')
+    if distribution_percentage <= 0 or distribution_percentage > 100:
+        raise ProfitDistributionError('Distribution percentage must be between 0 and 100.')
+
+    mode = values.get('mode') or 'balance'
+    if mode not in DISTRIBUTION_MODES:
+        raise ProfitDistributionError(f'Unknown distribution mode {mode}.')
+    period_start = period_end = None
+    if mode == 'average_balance':
+        period_start = _parse_day(values.get('period_start'), 'start')
+        period_end = _parse_day(values.get('period_end'), 'end')
+        if period_end < period_start:
+            raise ProfitDistributionError('The period end must not be before its start.')
+        if period_end >= datetime.utcnow().date():
+            raise ProfitDistributionError('The period must have ended; its last day can be yesterday (UTC) at the latest.')
+    return DistributionRequest(total_profit, distribution_percentage, mode, period_start, period_end)
+
+
+def distributable_paisa(total_profit, distribution_percentage):
+    """distribution_percentage of total_profit in paisa, rounded down to a whole paisa"""
+    amount = (Decimal(total_profit) * Decimal(distribution_percentage) / 100).quantize(PAISA, rounding=ROUND_DOWN)
+    amount_paisa = to_paisa(amount)
+    if amount_paisa <= 0:
+        raise ProfitDistributionError('Amount to distribute is less than the smallest currency unit.')
+    return amount_paisa
+
+
+def balance_weights(chunk_size=DEFAULT_CHUNK_SIZE, lock=False):
+    """(ids, weights) arrays of every positive balance in paisa, in id order"""
+    ids = array('q')
+    weights = array('q')
+    for chunk in _eligible_chunks(chunk_size, lock):
+        for user_id, balance in chunk:
+            ids.append(user_id)
+            weights.append(balance)
+    return ids, weights
+
+
+def _stream(query):
+    """Execute a read-only Core query, fetching SCAN_BATCH_SIZE rows per round-trip"""
+    return db.session.connection().execution_options(yield_per=SCAN_BATCH_SIZE).execute(query)
+
+
+def average_balance_weights(period_start, period_end):
+    """(ids, weights) arrays of each account's daily-balance product over the period.
+
+    An account's weight is the sum of its closing balances, in paisa, over
+    every day of the period: its average daily balance times the D days.
+    A transaction on day index i (0 for the first day) is missing from the
+    closing balances of the i days before it, and one after the period from
+    all D of them, so the weight is D * current balance minus the sum of
+    amount * min(i, D) over every transaction since the period started.
+    Accounts and those transactions are each read in one id-ordered stream,
+    with amounts signed and converted to paisa by the database, and merged
+    in integer arithmetic.
+    """
+    days = (period_end - period_start).days + 1
+    first = balance_history.day_end(period_start - timedelta(days=1))
+    accounts = _stream(select(User.id, paisa(User.balance)).order_by(User.id))
+    transactions = _stream(
+        select(Transaction.user_id, Transaction.timestamp, paisa(balance_history.signed_amount()))
+        .where(Transaction.timestamp >= first)
+        .order_by(Transaction.user_id)
+    )
+
+    ids = array('q')
+    weights = array('q')
+    pending = transactions.fetchone()
+    for user_id, balance in accounts:
+        weight = days * balance
+        # Transactions of users deleted since are skipped as the scans pass them
+        while pending is not None and pending[0] < user_id:
+            pending = transactions.fetchone()
+        while pending is not None and pending[0] == user_id:
+            weight -= pending[2] * min((pending[1] - first).days, days)
+            pending = transactions.fetchone()
+        if weight > 0:
+            ids.append(user_id)
+            weights.append(weight)
+    return ids, weights
+
+
+def allocate(ids, weights, amount_paisa):
+    """Split amount_paisa in proportion to weights, exactly to the paisa.
+
+    Every account gets floor(weight * amount / total) and the leftover
+    paisa go one each to the largest weights, ties broken by the lowest
+    account id, the same rule the balance mode uses. ids must be ascending.
+    """
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        raise ProfitDistributionError('Cannot distribute profit as the total weight of all eligible accounts is zero.')
+    shares = array('q', [weight * amount_paisa // total_weight for weight in weights])
+    leftover = amount_paisa - sum(shares)
+    # nlargest is stable, so equal weights keep their ascending id order
+    for index in heapq.nlargest(leftover, range(len(ids)), key=weights.__getitem__):
+        shares[index] += 1
+    return Allocation(ids, weights, shares, total_weight, amount_paisa)
+
+
+def _allocation_for(request):
+    if request.mode == 'average_balance':
+        ids, weights = average_balance_weights(request.period_start, request.period_end)
+    else:
+        ids, weights = balance_weights(SCAN_BATCH_SIZE)
+    return allocate(ids, weights, distributable_paisa(request.total_profit, request.distribution_percentage))
+
+
+def _period_days(request):
+    return (request.period_end - request.period_start).days + 1 if request.mode == 'average_balance' else 1
+
+
+def preview_distribution(request, top=PREVIEW_TOP_SHARES):
+    """Compute a distribution without writing it, listing the largest shares"""
+    started = time.perf_counter()
+    allocation = _allocation_for(request)
+    largest = heapq.nlargest(top, range(len(allocation.ids)), key=allocation.shares.__getitem__)
+    users = {
+        user.id: user for user in db.session.execute(
+            select(User.id, User.cnic, User.name).where(User.id.in_([allocation.ids[i] for i in largest]))
+        ).all()
+    }
+    top_shares = [
+        dict(user_id=allocation.ids[i], cnic=users[allocation.ids[i]].cnic, name=users[allocation.ids[i]].name,
+             share=from_paisa(allocation.shares[i]))
+        for i in largest if allocation.ids[i] in users
+    ]
+    return DistributionPreview(
+        amount=from_paisa(allocation.amount_paisa),
+        mode=request.mode,
+        accounts=sum(1 for share in allocation.shares if share > 0),
+        total_balance=from_paisa(allocation.total_weight // _period_days(request)),
+        top_shares=top_shares,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def distribute_profit_by_average_balance(request, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Distribute profit weighted by each account's average daily balance over the request's period.
+
+    Weights come from the transaction history, so balances that were held
+    for only part of the period earn proportionally less. Shares are
+    credited in bulk within a single database transaction.
+    """
+    started = time.perf_counter()
+    allocation = _allocation_for(request)
+    days = _period_days(request)
+    description = (f'Profit share from {request.distribution_percentage}% of total profit {request.total_profit:.2f}, '
+                   f'weighted by average balance {request.period_start} to {request.period_end}')
+    accounts, credited = _credit_allocation(allocation, description, chunk_size)
+
+    elapsed = time.perf_counter() - started
+    return DistributionResult(
+        amount_distributed=from_paisa(credited),
+        total_balance=from_paisa(allocation.total_weight // days),
+        accounts=accounts,
+        elapsed=elapsed,
+        rows_per_second=accounts / elapsed if elapsed > 0 else float(accounts),
+    )
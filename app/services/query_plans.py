@@ -0,0 +1,128 @@
+from .. import db
+from ..models import User, Transaction, BalanceSnapshot, ArchivalJob, TransactionArchive, IdempotencyKey
+from . import user_directory
+from ..database import likely
+from sqlalchemy import select, func, text, tuple_, and_, or_
+from collections import namedtuple
+from datetime import datetime
+
+PlanCheck = namedtuple('PlanCheck', ['name', 'uses_index', 'plan'])
+
+
+class QueryPlanError(Exception):
+    """Raised when the database's query plans cannot be checked"""
+
+# Sample bind values; only the shape of each statement matters to the planner
+_NOW = datetime(2026, 1, 1)
+
+
+def hot_queries():
+    """The statements behind the busiest pages, keyed by a readable name"""
+    return {
+        'statement transactions by user': select(Transaction)
+            .where(Transaction.user_id == 1)
+            .order_by(Transaction.timestamp.desc()),
+        'latest transaction per user': select(func.max(Transaction.id))
+            .where(Transaction.user_id == 1),
+        'ledger high-water mark': select(func.max(Transaction.id)),
+        'ledger page': select(Transaction)
+            .where(tuple_(Transaction.timestamp, Transaction.id) < (_NOW, 1))
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+            .limit(50),
+        'ledger filtered by type': select(Transaction)
+            .where(Transaction.transaction_type == 'credit')
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+            .limit(50),
+        'ledger filtered by cnic': select(Transaction)
+            .where(Transaction.user_id == select(User.id).where(User.cnic == 'x').scalar_subquery())
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+            .limit(50),
+        'archive chunk of user transactions': select(Transaction.id)
+            .where(Transaction.user_id == 1)
+            .order_by(Transaction.id)
+            .limit(1000),
+        'transfers linked to a deleted user': select(Transaction.id)
+            .where(Transaction.related_user_id == 1)
+            .limit(1000),
+        'archived history of a user': select(TransactionArchive.payload)
+            .where(TransactionArchive.user_id == 1)
+            .order_by(TransactionArchive.first_transaction_id),
+        'accounts being deleted': select(ArchivalJob.user_id)
+            .where(ArchivalJob.user_id.in_([1, 2]), ArchivalJob.status.in_(['pending', 'running'])),
+        'user by cnic': select(User).where(User.cnic == 'x'),
+        'idempotency key lookup': select(IdempotencyKey).where(IdempotencyKey.key == 'x'),
+        'expired idempotency keys': select(IdempotencyKey.id)
+            .where(IdempotencyKey.expires_at <= _NOW)
+            .limit(5000),
+        'users page by name': select(User)
+            .where(tuple_(User.name, User.id) > ('x', 1))
+            .order_by(User.name, User.id)
+            .limit(50),
+        'users page by balance': select(User)
+            .order_by(User.balance.desc(), User.id.desc())
+            .limit(50),
+        'user search by cnic prefix': select(User.id).where(user_directory.prefix_condition('3520')),
+        'balance snapshot on or before date': select(BalanceSnapshot.balance)
+            .where(BalanceSnapshot.user_id == 1, BalanceSnapshot.snapshot_date <= _NOW.date())
+            .order_by(BalanceSnapshot.snapshot_date.desc())
+            .limit(1),
+        'balance snapshots for a day': select(BalanceSnapshot.user_id)
+            .where(BalanceSnapshot.snapshot_date == _NOW.date()),
+        'user search by name prefix': select(User.id).where(user_directory.prefix_condition('ali')),
+        'running balance at a date': select(Transaction.balance_after)
+            .where(Transaction.user_id == 1, likely(Transaction.timestamp < _NOW))
+            .order_by(Transaction.sequence.desc())
+            .limit(1),
+        'transactions by account sequence': select(Transaction.balance_after)
+            .where(or_(and_(Transaction.user_id == 1, Transaction.sequence == 1),
+                       and_(Transaction.user_id == 2, Transaction.sequence == 4))),
+        'transactions after the integrity checkpoint': select(Transaction.id)
+            .where(Transaction.id > 1)
+            .order_by(Transaction.id)
+            .limit(5000),
+    }
+
+
+def _sqlite_plan(statement):
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    plan = [row[-1] for row in rows]
+    # Full scans of a table read every row; SEARCH or a SCAN driven by an
+    # index (as used for ORDER BY ... LIMIT) are what we want
+    full_scans = [
+        line for line in plan
+        if line.startswith('SCAN') and 'USING' not in line and 'CONSTANT ROW' not in line
+    ]
+    return plan, not full_scans
+
+
+def _postgresql_plan(statement):
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    # Tiny tables make sequential scans cheaper; force the planner to show
+    # whether an index is usable at all
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = [row[0] for row in db.session.execute(text(f'EXPLAIN {compiled}')).all()]
+    return plan, not any('Seq Scan' in line for line in plan)
+
+
+def plan_reader(dialect):
+    """The function that explains a statement on dialect"""
+    if dialect == 'sqlite':
+        return _sqlite_plan
+    if dialect == 'postgresql':
+        return _postgresql_plan
+    raise QueryPlanError(f'Query plans can only be checked on SQLite and PostgreSQL, not {dialect}.')
+
+
+def check_query_plans():
+    """Explain every hot query and report whether each one is index-driven"""
+    explain = plan_reader(db.engine.dialect.name)
+    results = []
+    try:
+        for name, statement in hot_queries().items():
+            plan, uses_index = explain(statement)
+            results.append(PlanCheck(name, uses_index, plan))
+    finally:
+        # Ends the read transaction, and on PostgreSQL the SET LOCAL with it
+        db.session.rollback()
+    return results
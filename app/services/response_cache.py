@@ -0,0 +1,146 @@
+from . import system_totals
+from flask import current_app, request, session
+from collections import OrderedDict, namedtuple
+import hashlib
+import os
+import threading
+
+ResponseCacheStats = namedtuple('ResponseCacheStats', ['hits', 'misses', 'not_modified', 'size', 'bytes', 'max_bytes'])
+
+
+class ResponseCache:
+    """Rendered page bodies by ETag, least recently used first out once over max_bytes.
+
+    ETags embed the ledger high-water mark, so entries never go stale;
+    they stop being asked for once the ledger moves and age out.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            body = self._entries.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(etag, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[etag] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return ResponseCacheStats(self.hits, self.misses, self.not_modified,
+                                      len(self._entries), self._bytes, self.max_bytes)
+
+    def render_metrics(self):
+        """Prometheus text lines for /admin/metrics"""
+        stats = self.stats()
+        return [
+            '# HELP samad_response_cache_hits_total Pages served from the rendered-response cache.',
+            '# TYPE samad_response_cache_hits_total counter',
+            f'samad_response_cache_hits_total {stats.hits}',
+            '# HELP samad_response_cache_misses_total Pages rendered because no cached copy matched.',
+            '# TYPE samad_response_cache_misses_total counter',
+            f'samad_response_cache_misses_total {stats.misses}',
+            '# HELP samad_response_not_modified_total Conditional requests answered with 304 Not Modified.',
+            '# TYPE samad_response_not_modified_total counter',
+            f'samad_response_not_modified_total {stats.not_modified}',
+            '# HELP samad_response_cache_bytes Size of the rendered pages held in the cache.',
+            '# TYPE samad_response_cache_bytes gauge',
+            f'samad_response_cache_bytes {stats.bytes}',
+        ]
+
+
+def _templates_fingerprint(app):
+    """Changes when a deploy changes the templates, so browsers do not keep old markup"""
+    digest = hashlib.sha1()
+    for root, _, names in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            digest.update(f'{os.path.relpath(path, app.root_path)}:{os.stat(path).st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+
+def init_app(app):
+    cache = app.extensions['response_cache'] = ResponseCache(app.config['RESPONSE_CACHE_MAX_BYTES'])
+    app.extensions['response_cache_salt'] = _templates_fingerprint(app)
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.collectors.append(cache.render_metrics)
+    return cache
+
+
+def _cache():
+    return current_app.extensions['response_cache']
+
+
+def page_etag(mark):
+    """ETag of the current request's page while the ledger stays at mark"""
+    key = f"{current_app.extensions['response_cache_salt']}|{request.full_path}|{mark.transaction_id}|{mark.user_version}"
+    return f'page-{mark.transaction_id}-{mark.user_version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}'
+
+
+def _revalidate(response, etag):
+    response.set_etag(etag)
+    # Browsers may keep the page but must check it with the ETag before reuse
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag):
+    """A 304 response for a conditional request whose ETag still matches"""
+    _cache().record_not_modified()
+    return _revalidate(current_app.response_class(status=304), etag)
+
+
+def conditional_page(render):
+    """Respond with render()'s page, skipping the render while the ledger has not moved.
+
+    The ETag comes from the ledger high-water mark. A request that already
+    holds it gets 304, and otherwise a copy rendered for the same URL at the
+    same mark is served from the cache. Requests with flashed messages
+    pending are always rendered, since the messages belong in the page.
+    """
+    if session.get('_flashes'):
+        return render()
+    etag = page_etag(system_totals.high_water_mark())
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    cache = _cache()
+    body = cache.get(etag)
+    if body is not None:
+        return _revalidate(current_app.response_class(body, mimetype='text/html'), etag)
+    response = current_app.make_response(render())
+    if response.status_code != 200 or session.get('_flashes'):
+        return response
+    cache.put(etag, response.get_data())
+    return _revalidate(response, etag)
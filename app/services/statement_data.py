@@ -0,0 +1,14 @@
+from collections import namedtuple
+
+# Plain snapshots of the rows a statement needs, so rendering can run in a
+# worker process without a database session. Kept apart from statement_pdf
+# so reading them does not import reportlab.
+# Opening and closing balances are only known for period statements
+StatementUser = namedtuple('StatementUser', ['id', 'name', 'cnic', 'balance', 'opening_balance', 'closing_balance'],
+                           defaults=(None, None))
+StatementLine = namedtuple('StatementLine', ['timestamp', 'transaction_type', 'amount', 'description'])
+
+
+def snapshot_user(user):
+    return StatementUser(user.id, user.name, user.cnic, user.balance)
+
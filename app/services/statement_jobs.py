@@ -0,0 +1,351 @@
+from .. import db
+from ..models import User, Transaction, ArchivalJob
+from .statement_data import StatementLine, snapshot_user
+from .archival import archived_statement_lines, archived_statement_user
+from flask import current_app
+from sqlalchemy import select, func
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+
+# Transactions fetched per round-trip while a worker streams a statement
+LINE_BATCH_SIZE = 5000
+
+# Hex digits of the CNIC digest in a job id
+ACCOUNT_TAG_LENGTH = 10
+
+# Job ids of deleted accounts' statements start with this, followed by the archival job id
+ARCHIVE_JOB_PREFIX = 'archive-'
+
+_executor = None
+_lock = threading.Lock()
+
+# The app each rendering process builds for itself, see _init_worker
+_worker_app = None
+
+
+class StatementJobError(Exception):
+    """Raised for malformed statement job ids and statements of accounts that no longer exist"""
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn keeps the workers free of the parent's open DB connections;
+            # each opens its own through an app of its own
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config['STATEMENT_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(_worker_config(),),
+            )
+        return _executor
+
+
+def cache_dir():
+    directory = current_app.config.get('STATEMENT_CACHE_DIR') or os.path.join(current_app.instance_path, 'statement_cache')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def account_tag(cnic):
+    """Short digest of a CNIC, which identifies the account in job ids without showing it in URLs"""
+    return hashlib.sha1(cnic.encode()).hexdigest()[:ACCOUNT_TAG_LENGTH]
+
+
+def job_id_for(user_id, cnic, last_transaction_id):
+    """A statement is identified by its account and the newest transaction it covers.
+
+    SQLite hands the ids of deleted users and transactions out again, so
+    the account's CNIC is part of the id too; a new account that reuses
+    both ids never gets the statement of the one it replaced.
+    """
+    return f'{user_id}-{last_transaction_id or 0}-{account_tag(cnic)}'
+
+
+def parse_job_id(job_id):
+    """(user_id, last_transaction_id, account tag) of a job id"""
+    try:
+        user_id, last_transaction_id, tag = job_id.split('-')
+        user_id, last_transaction_id = int(user_id), int(last_transaction_id)
+    except ValueError:
+        raise StatementJobError(f'Invalid statement job id {job_id}.')
+    if len(tag) != ACCOUNT_TAG_LENGTH or tag.strip('0123456789abcdef'):
+        raise StatementJobError(f'Invalid statement job id {job_id}.')
+    return user_id, last_transaction_id, tag
+
+
+def archive_job_id(archival_job_id):
+    """A deleted account's statement is identified by its archival job; archived history never changes"""
+    return f'{ARCHIVE_JOB_PREFIX}{archival_job_id}'
+
+
+def _check_job_id(job_id):
+    """Raise StatementJobError unless job_id is a well-formed statement or archive job id"""
+    if job_id.startswith(ARCHIVE_JOB_PREFIX):
+        archival_job_id = job_id[len(ARCHIVE_JOB_PREFIX):]
+        if not (archival_job_id.isascii() and archival_job_id.isdigit()):
+            raise StatementJobError(f'Invalid statement job id {job_id}.')
+        return
+    parse_job_id(job_id)
+
+
+def current_job_id(user):
+    last_transaction_id = db.session.execute(
+        select(func.max(Transaction.id)).where(Transaction.user_id == user.id)
+    ).scalar()
+    return job_id_for(user.id, user.cnic, last_transaction_id)
+
+
+def statement_etag(user, job_id=None):
+    """ETag of the user's statement: their latest transaction plus the name and CNIC it prints"""
+    job_id = job_id or current_job_id(user)
+    details = hashlib.sha1(f'{user.name}|{user.cnic}'.encode()).hexdigest()[:12]
+    return f'statement-{job_id}-{details}'
+
+
+def _cache_path(directory, job_id):
+    return os.path.join(directory, f'statement_{job_id}.pdf')
+
+
+def cached_statement(job_id):
+    """Path of the rendered PDF for job_id, or None if it is not cached"""
+    _check_job_id(job_id)
+    path = _cache_path(cache_dir(), job_id)
+    if not os.path.exists(path):
+        return None
+    # Bump the modification time so eviction treats the file as recently used
+    os.utime(path)
+    return path
+
+
+def _enforce_cache_limit(directory, max_bytes):
+    """Delete least recently used statements until the cache fits in max_bytes"""
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith('.pdf'):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(os.path.join(directory, name))
+        except OSError:
+            pass
+        total -= size
+
+
+def _remove_statements(directory, user_id, keep_job_id=None):
+    """Delete the user's cached statements and failure markers, except keep_job_id's"""
+    prefix = f'statement_{user_id}-'
+    keep = f'statement_{keep_job_id}.' if keep_job_id else None
+    for name in os.listdir(directory):
+        if (name.startswith(prefix) and name.endswith(('.pdf', '.failed'))
+                and not (keep and name.startswith(keep))):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def invalidate(user_id):
+    """Drop every cached statement for user_id"""
+    _remove_statements(cache_dir(), user_id)
+
+
+def _pending_path(directory, job_id):
+    return os.path.join(directory, f'statement_{job_id}.pending')
+
+
+def _failed_path(directory, job_id):
+    return os.path.join(directory, f'statement_{job_id}.failed')
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _is_fresh(path, timeout):
+    """Whether the marker at path exists and is younger than timeout seconds"""
+    try:
+        return time.time() - os.stat(path).st_mtime < timeout
+    except OSError:
+        return False
+
+
+def _claim(directory, job_id, timeout):
+    """Create the job's pending marker; False if another process is already rendering it.
+
+    The marker lives next to the cache entry, so every worker sees the
+    job. A marker older than timeout is left from a process that died
+    mid-render and is taken over.
+    """
+    path = _pending_path(directory, job_id)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            if _is_fresh(path, timeout):
+                return False
+            _unlink(path)
+    return False
+
+
+def _statement_lines(user_id):
+    """The account's statement lines, newest first, streamed from the database"""
+    transactions = db.session.execute(
+        select(Transaction.timestamp, Transaction.transaction_type, Transaction.amount, Transaction.description)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+        .execution_options(yield_per=LINE_BATCH_SIZE)
+    )
+    lines = (StatementLine(*row) for row in transactions)
+    # Only accounts whose deletion was interrupted have part of their history archived
+    archived = archived_statement_lines(user_id)
+    if archived:
+        return sorted(list(lines) + archived, key=lambda line: line.timestamp or datetime.min, reverse=True)
+    return lines
+
+
+def _init_worker(config):
+    global _worker_app
+    from .. import create_app
+    _worker_app = create_app(config)
+
+
+def _render(job_id, directory, read_statement):
+    """Render one statement inside a worker process from what read_statement returns.
+
+    read_statement runs under the app the worker was started with and
+    returns the statement's user and lines. The pending marker is removed
+    once the PDF is in place; on failure the error is left in a marker of
+    its own for status() to report.
+    """
+    from .statement_pdf import render_statement_file
+    try:
+        with _worker_app.app_context():
+            user, lines = read_statement()
+            render_statement_file(user, lines, _cache_path(directory, job_id))
+    except Exception as e:
+        with open(_failed_path(directory, job_id), 'w') as f:
+            f.write(str(e) or e.__class__.__name__)
+        raise
+    finally:
+        _unlink(_pending_path(directory, job_id))
+    return job_id
+
+
+def _render_job(user_id, job_id, directory):
+    """Render an account's statement, reading the account and its history in the worker"""
+    def read_statement():
+        user = db.session.get(User, user_id)
+        if user is None or account_tag(user.cnic) != parse_job_id(job_id)[2]:
+            raise StatementJobError(f'Account {user_id} no longer exists.')
+        return snapshot_user(user), _statement_lines(user_id)
+    return _render(job_id, directory, read_statement)
+
+
+def _render_archive_job(archival_job_id, job_id, directory):
+    """Render a deleted account's statement from its archived transactions in the worker"""
+    def read_statement():
+        job = db.session.get(ArchivalJob, archival_job_id)
+        if job is None or job.status != 'done':
+            raise StatementJobError(f'Archival job {archival_job_id} has not finished.')
+        return archived_statement_user(job), archived_statement_lines(job.user_id)
+    return _render(job_id, directory, read_statement)
+
+
+def _worker_config():
+    """What a worker process needs to reach the same database as this app"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': current_app.config['SQLALCHEMY_DATABASE_URI'],
+        'DB_ENGINE_PROFILE': current_app.config['DB_ENGINE_PROFILE'],
+        'SQLITE_PRAGMAS': current_app.config.get('SQLITE_PRAGMAS'),
+        'METRICS_ENABLED': False,
+    }
+
+
+def _enqueue(job_id, render, key, superseded=None):
+    """Queue render(key, job_id, directory) unless job_id is cached or already being rendered.
+
+    superseded, if given, is called with the cache directory once the
+    statement is written, to drop the entries it replaces.
+    """
+    if cached_statement(job_id):
+        return job_id
+    directory = cache_dir()
+    if not _claim(directory, job_id, current_app.config['STATEMENT_JOB_TIMEOUT']):
+        return job_id
+    _unlink(_failed_path(directory, job_id))
+    max_bytes = current_app.config['STATEMENT_CACHE_MAX_BYTES']
+
+    def _on_done(done):
+        if done.exception() is None:
+            if superseded is not None:
+                superseded(directory)
+            _enforce_cache_limit(directory, max_bytes)
+
+    try:
+        future = _get_executor().submit(render, key, job_id, directory)
+    except Exception:
+        _unlink(_pending_path(directory, job_id))
+        raise
+    future.add_done_callback(_on_done)
+    return job_id
+
+
+def submit(user):
+    """Queue rendering of the user's current statement; returns the job id.
+
+    Nothing is queued when the statement is already cached or another
+    worker is rendering it. The worker process reads the account's
+    history itself, so the request only records the job. The previous
+    statements for the user are dropped once the new one is written,
+    since new activity has superseded them.
+    """
+    user_id = user.id
+    job_id = current_job_id(user)
+    return _enqueue(job_id, _render_job, user_id,
+                    superseded=lambda directory: _remove_statements(directory, user_id, job_id))
+
+
+def submit_archived(job):
+    """Queue rendering of a deleted account's statement from its archive; returns the job id.
+
+    job is the finished ArchivalJob. Its statement never changes, so once
+    rendered it is served from the cache until evicted.
+    """
+    return _enqueue(archive_job_id(job.id), _render_archive_job, job.id)
+
+
+def status(job_id):
+    """One of 'done', 'pending', 'failed' or 'unknown', plus an error message for failures.
+
+    Read from the cache directory, so any worker can answer for a job
+    queued by another.
+    """
+    if cached_statement(job_id):
+        return 'done', None
+    directory = cache_dir()
+    if _is_fresh(_pending_path(directory, job_id), current_app.config['STATEMENT_JOB_TIMEOUT']):
+        return 'pending', None
+    try:
+        with open(_failed_path(directory, job_id)) as f:
+            return 'failed', f.read()
+    except OSError:
+        return 'unknown', None
@@ -0,0 +1,180 @@
+from reportlab.lib.pagesizes import letter, A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from datetime import datetime
+from itertools import islice
+import io
+import os
+
+
+TRANSACTION_HEADER = ['Date', 'Type', 'Amount', 'Description']
+TRANSACTION_COL_WIDTHS = [1.2*inch, 1*inch, 1*inch, 2.8*inch]
+TRANSACTION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (3, 1), (3, -1), 'LEFT'),  # Left align description column
+])
+
+# Fast renderer layout: fixed row heights, and tables short enough for a page
+HEADER_ROW_HEIGHT = 26
+BODY_ROW_HEIGHT = 14
+ROWS_PER_TABLE = 45
+
+
+def _statement_header(styles, user):
+    """Title, account details and history heading shared by both renderers"""
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1,  # Center alignment
+        textColor=colors.darkblue
+    )
+    
+    story = []
+    
+    # Title
+    story.append(Paragraph("Samad Islamic Banking System", title_style))
+    story.append(Paragraph("Account Statement", styles['Heading2']))
+    story.append(Spacer(1, 12))
+    
+    # User Information
+    user_info = [
+        ['Account Holder:', user.name],
+        ['CNIC:', user.cnic],
+        ['Current Balance:', f"{user.balance:.2f}"],
+        ['Statement Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    ]
+    if user.opening_balance is not None:
+        user_info.insert(2, ['Opening Balance:', f"{user.opening_balance:.2f}"])
+        user_info.insert(3, ['Closing Balance:', f"{user.closing_balance:.2f}"])
+    
+    user_table = Table(user_info, colWidths=[2*inch, 3*inch])
+    user_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    
+    story.append(user_table)
+    story.append(Spacer(1, 20))
+    
+    # Transaction History
+    story.append(Paragraph("Transaction History", styles['Heading3']))
+    story.append(Spacer(1, 12))
+    return story
+
+
+def _statement_footer(styles):
+    return [
+        Spacer(1, 20),
+        Paragraph("This statement is generated by Samad Islamic Banking System", 
+                  ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=1)),
+    ]
+
+
+def _transaction_row(trans):
+    return [
+        trans.timestamp.strftime('%Y-%m-%d %H:%M'),
+        trans.transaction_type.replace('_', ' ').title(),
+        f"{trans.amount:.2f}",
+        trans.description or 'N/A'
+    ]
+
+
+def generate_user_statement_pdf(user, transactions):
+    """Generate a PDF statement for a user"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    
+    # Get styles
+    styles = getSampleStyleSheet()
+    
+    # Story (content) list
+    story = _statement_header(styles, user)
+    
+    if transactions:
+        # Prepare transaction data
+        transaction_data = [TRANSACTION_HEADER]
+        
+        for trans in transactions:
+            transaction_data.append(_transaction_row(trans))
+        
+        # Create transaction table
+        trans_table = Table(transaction_data, colWidths=TRANSACTION_COL_WIDTHS)
+        trans_table.setStyle(TRANSACTION_TABLE_STYLE)
+        
+        story.append(trans_table)
+    else:
+        story.append(Paragraph("No transactions found.", styles['Normal']))
+    
+    story.extend(_statement_footer(styles))
+    
+    # Build PDF
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+
+def generate_user_statement_pdf_fast(user, transactions, rows_per_table=ROWS_PER_TABLE):
+    """Generate a PDF statement from any iterable of transactions.
+
+    Rows are cut into tables of rows_per_table, each small enough to fit
+    on a page, with fixed column widths and row heights and one shared
+    style. reportlab then never measures or splits one huge table, so
+    layout time grows linearly with the number of transactions.
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    styles = getSampleStyleSheet()
+    story = _statement_header(styles, user)
+
+    rows = iter(transactions)
+    has_rows = False
+    while True:
+        chunk = [_transaction_row(trans) for trans in islice(rows, rows_per_table)]
+        if not chunk:
+            break
+        has_rows = True
+        table = Table(
+            [TRANSACTION_HEADER] + chunk,
+            colWidths=TRANSACTION_COL_WIDTHS,
+            rowHeights=[HEADER_ROW_HEIGHT] + [BODY_ROW_HEIGHT] * len(chunk),
+            repeatRows=1,
+        )
+        table.setStyle(TRANSACTION_TABLE_STYLE)
+        story.append(table)
+
+    if not has_rows:
+        story.append(Paragraph("No transactions found.", styles['Normal']))
+
+    story.extend(_statement_footer(styles))
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+
+def render_statement_file(user, transactions, path):
+    """Render a statement and move it into place at path atomically"""
+    buffer = generate_user_statement_pdf_fast(user, transactions)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temp_path, path)
+    return path
@@ -0,0 +1,207 @@
+from .. import db
+from ..models import User, Transaction
+from .statement_data import StatementUser, StatementLine
+from . import balance_history
+from sqlalchemy import select, func
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from decimal import Decimal
+import multiprocessing
+import os
+import shutil
+import time
+import zipfile
+
+# Rows fetched per round-trip from each streaming cursor
+SCAN_BATCH_SIZE = 5000
+
+# Statements queued per worker before the scan waits for renders to finish
+QUEUE_DEPTH_PER_WORKER = 4
+
+RunProgress = namedtuple('RunProgress', ['rendered', 'skipped', 'total', 'elapsed'])
+RunResult = namedtuple('RunResult', ['rendered', 'skipped', 'total', 'elapsed', 'statements_per_second'])
+
+
+class StatementRunError(ValueError):
+    """Raised when a statement run is given invalid arguments"""
+
+
+def parse_period(period):
+    """Turn 'YYYY-MM' into the [start, end) datetimes of that month"""
+    try:
+        start = datetime.strptime(period, '%Y-%m')
+    except ValueError:
+        raise StatementRunError(f'Invalid period {period}, expected YYYY-MM.')
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def statement_name(period, user):
+    return f'statement_{period}_{user.id}.pdf'
+
+
+def staging_dir(output):
+    """Directory a zip run renders into before the archive is built"""
+    return f'{output}.parts'
+
+
+def _zipped_names(output):
+    """Entries of a zip written by an earlier, finished run, or none"""
+    try:
+        with zipfile.ZipFile(output) as archive:
+            return set(archive.namelist())
+    except (OSError, zipfile.BadZipFile):
+        return set()
+
+
+def _build_zip(output, staging):
+    """Write the staged statements, and those of an earlier zip, into output atomically.
+
+    The archive is built under a temporary name and moved into place, so
+    output is only ever a complete zip; the staging directory is removed
+    once it is.
+    """
+    temp_path = f'{output}.{os.getpid()}.tmp'
+    staged = sorted(name for name in os.listdir(staging) if name.endswith('.pdf'))
+    with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        if zipfile.is_zipfile(output):
+            with zipfile.ZipFile(output) as previous:
+                for name in previous.namelist():
+                    if name not in staged:
+                        archive.writestr(previous.getinfo(name), previous.read(name))
+        for name in staged:
+            archive.write(os.path.join(staging, name), name)
+    os.replace(temp_path, output)
+    shutil.rmtree(staging)
+
+
+def _iter_statements(start, end):
+    """Yield (user, lines) for every user, newest transaction first.
+
+    Users and the period's transactions are each read in one ordered
+    streaming scan and merged on user id, so memory holds one user's
+    transactions at a time. Closing balances come from the nearest
+    balance snapshot; the opening balance is the closing balance less
+    the period's transactions. Where the transactions carry running
+    balances both are read from the period's lowest and highest sequence
+    numbers instead.
+    """
+    users = db.session.execute(
+        select(User.id, User.name, User.cnic, User.balance)
+        .order_by(User.id)
+        .execution_options(yield_per=SCAN_BATCH_SIZE)
+    )
+    transactions = db.session.execute(
+        select(Transaction.user_id, Transaction.timestamp, Transaction.transaction_type,
+               Transaction.amount, Transaction.description, Transaction.balance_after, Transaction.sequence)
+        .where(Transaction.timestamp >= start, Transaction.timestamp < end)
+        .order_by(Transaction.user_id, Transaction.timestamp.desc(), Transaction.id.desc())
+        .execution_options(yield_per=SCAN_BATCH_SIZE)
+    )
+
+    closing_balances = balance_history.iter_closing_balances((end - timedelta(days=1)).date())
+
+    pending = next(transactions, None)
+    for row, (closing_user_id, closing) in zip(users, closing_balances):
+        if closing_user_id != row.id:
+            raise StatementRunError('Accounts were added or removed during the run; start it again to resume.')
+        lines = []
+        newest = oldest = None
+        numbered = True
+        # Transactions of users deleted since are skipped as the scans pass them
+        while pending is not None and pending.user_id < row.id:
+            pending = next(transactions, None)
+        while pending is not None and pending.user_id == row.id:
+            lines.append(StatementLine(*pending[1:5]))
+            # Lines are listed by time, but running balances follow the sequence
+            if pending.sequence is None or pending.balance_after is None:
+                numbered = False
+            elif numbered:
+                if newest is None or pending.sequence > newest.sequence:
+                    newest = pending
+                if oldest is None or pending.sequence < oldest.sequence:
+                    oldest = pending
+            pending = next(transactions, None)
+        if numbered and newest is not None:
+            closing = newest.balance_after
+            opening = oldest.balance_after - balance_history.signed(oldest)
+        else:
+            opening = closing - sum((balance_history.signed(line) for line in lines), Decimal('0.00'))
+        yield StatementUser(*row, opening_balance=opening, closing_balance=closing), lines
+
+
+def count_users():
+    return db.session.execute(select(func.count(User.id))).scalar()
+
+
+def generate_period_statements(period, output, workers=None, as_zip=False, progress=None, progress_every=100):
+    """Render every user's statement for period into a directory or zip file.
+
+    Rendering is fanned out to a process pool of workers, each writing its
+    PDF into place atomically. Statements that already exist in the output
+    are skipped, so an interrupted run picks up where it left off. A zip
+    run renders into a staging directory next to the zip in the same way
+    and builds the zip from it only once every statement is there.
+    progress, if given, is called with a RunProgress every progress_every
+    statements and at the end.
+    """
+    start, end = parse_period(period)
+    workers = workers or os.cpu_count() or 1
+    total = count_users()
+
+    directory = staging_dir(output) if as_zip else output
+    os.makedirs(directory, exist_ok=True)
+    existing = set(os.listdir(directory))
+    if as_zip:
+        existing |= _zipped_names(output)
+
+    started = time.perf_counter()
+    rendered = 0
+    skipped = 0
+    in_flight = {}
+
+    def report():
+        if progress:
+            progress(RunProgress(rendered, skipped, total, time.perf_counter() - started))
+
+    def collect(done):
+        nonlocal rendered
+        for future in done:
+            in_flight.pop(future)
+            future.result()
+            rendered += 1
+            if rendered % progress_every == 0:
+                report()
+
+    from .statement_pdf import render_statement_file
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for user, lines in _iter_statements(start, end):
+            name = statement_name(period, user)
+            if name in existing:
+                skipped += 1
+                continue
+            future = pool.submit(render_statement_file, user, lines, os.path.join(directory, name))
+            in_flight[future] = name
+            if len(in_flight) >= workers * QUEUE_DEPTH_PER_WORKER:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+    if as_zip:
+        _build_zip(output, directory)
+
+    elapsed = time.perf_counter() - started
+    report()
+    return RunResult(
+        rendered=rendered,
+        skipped=skipped,
+        total=total,
+        elapsed=elapsed,
+        statements_per_second=rendered / elapsed if elapsed > 0 else float(rendered),
+    )
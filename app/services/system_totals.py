@@ -0,0 +1,112 @@
+from .. import db
+from ..models import User, Transaction, SystemTotals
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+from collections import namedtuple
+from decimal import Decimal
+from datetime import datetime
+
+TOTALS_ID = 1
+
+ReconcileResult = namedtuple('ReconcileResult', ['stored', 'actual', 'difference'])
+HighWaterMark = namedtuple('HighWaterMark', ['transaction_id', 'user_version'])
+
+
+def _actual_total_balance():
+    return db.session.execute(select(func.coalesce(func.sum(User.balance), 0))).scalar() or Decimal('0.00')
+
+
+def _stored_total_balance():
+    return db.session.execute(
+        select(SystemTotals.total_balance).where(SystemTotals.id == TOTALS_ID)
+    ).scalar()
+
+
+def _create_totals_row():
+    """Seed the aggregate from the user table; the session must be flushed first.
+
+    The insert runs in a savepoint, so when another writer seeded the row
+    first only the insert is undone and False is returned; the caller's
+    transaction carries on and can use that row instead.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.add(SystemTotals(id=TOTALS_ID, total_balance=_actual_total_balance()))
+    except IntegrityError:
+        return False
+    return True
+
+
+def get_total_balance():
+    """Total of all user balances, read from the maintained aggregate"""
+    total = _stored_total_balance()
+    if total is None:
+        _create_totals_row()
+        db.session.commit()
+        total = _stored_total_balance()
+    return total
+
+
+def get_total_users():
+    return db.session.execute(select(func.count(User.id))).scalar()
+
+
+def _update_totals(**values):
+    """Apply values to the aggregate row and advance user_version, creating the row if needed"""
+    db.session.flush()
+    statement = (
+        update(SystemTotals)
+        .where(SystemTotals.id == TOTALS_ID)
+        .values(user_version=SystemTotals.user_version + 1, updated_at=datetime.utcnow(), **values)
+    )
+    if db.session.execute(statement).rowcount == 0:
+        # First write on this database: the seeded sum already includes the change
+        if not _create_totals_row():
+            # Another writer seeded the row first, from a sum without this change
+            db.session.execute(statement)
+
+
+def adjust_total_balance(delta):
+    """Add delta to the aggregate inside the caller's transaction.
+
+    Call this after the matching balance change has been made, even when
+    the changes net to zero as transfers do; the caller commits both
+    together. The increment is done in SQL so concurrent writers cannot
+    overwrite each other's adjustments, and it advances user_version.
+    """
+    _update_totals(total_balance=SystemTotals.total_balance + delta)
+
+
+def record_user_change():
+    """Advance user_version for a user-table write that moves no money, such as a rename"""
+    _update_totals()
+
+
+def high_water_mark():
+    """The newest transaction id and the user_version, read in one round-trip.
+
+    Every write to the ledger or the user table moves at least one of
+    them, so pages built from those tables can be cached under this mark.
+    """
+    transaction_id, user_version = db.session.execute(select(
+        select(func.max(Transaction.id)).scalar_subquery(),
+        select(SystemTotals.user_version).where(SystemTotals.id == TOTALS_ID).scalar_subquery(),
+    )).one()
+    return HighWaterMark(transaction_id or 0, user_version or 0)
+
+
+def reconcile(fix=False):
+    """Compare the aggregate with SUM(user.balance), optionally resetting it"""
+    actual = Decimal(_actual_total_balance())
+    stored = _stored_total_balance()
+    result = ReconcileResult(
+        stored=stored,
+        actual=actual,
+        difference=actual - (stored or Decimal('0.00')),
+    )
+    if fix and (stored is None or result.difference != 0):
+        # A seeded row already holds the actual sum
+        if stored is not None or not _create_totals_row():
+            _update_totals(total_balance=actual)
+        db.session.commit()
+    return result
@@ -0,0 +1,129 @@
+from .. import db
+from ..models import User
+from flask import current_app
+from sqlalchemy import select
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+# Keeps each CNIC lookup under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 900
+
+# Only the fields that rarely change are cached; balances are always read live
+CachedUser = namedtuple('CachedUser', ['id', 'cnic', 'name'])
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'size', 'capacity'])
+
+
+class UserCache:
+    """Bounded LRU map of CNIC to CachedUser for one app in one process.
+
+    Writes in this process invalidate entries directly. Other worker
+    processes can still hold an entry for up to ttl seconds, which bounds
+    how long a renamed or deleted account is served from their cache.
+    """
+
+    def __init__(self, capacity, ttl):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, cnics):
+        """Cached users for the given CNICs; CNICs not returned are misses"""
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for cnic in cnics:
+                entry = self._entries.get(cnic)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(cnic)
+                    found[cnic] = entry[0]
+                elif entry is not None:
+                    del self._entries[cnic]
+            self.hits += len(found)
+            self.misses += len(cnics) - len(found)
+        return found
+
+    def put_many(self, users):
+        if self.capacity <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for user in users:
+                self._entries[user.cnic] = (user, expires)
+                self._entries.move_to_end(user.cnic)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *cnics):
+        with self._lock:
+            for cnic in cnics:
+                self._entries.pop(cnic, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.hits, self.misses, len(self._entries), self.capacity)
+
+    def render_metrics(self):
+        """Prometheus text lines for /admin/metrics"""
+        stats = self.stats()
+        return [
+            '# HELP samad_user_cache_hits_total CNIC lookups answered from the user cache.',
+            '# TYPE samad_user_cache_hits_total counter',
+            f'samad_user_cache_hits_total {stats.hits}',
+            '# HELP samad_user_cache_misses_total CNIC lookups that went to the database.',
+            '# TYPE samad_user_cache_misses_total counter',
+            f'samad_user_cache_misses_total {stats.misses}',
+            '# HELP samad_user_cache_entries Users currently held in the cache.',
+            '# TYPE samad_user_cache_entries gauge',
+            f'samad_user_cache_entries {stats.size}',
+        ]
+
+
+def init_app(app):
+    cache = app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.collectors.append(cache.render_metrics)
+    return cache
+
+
+def _cache():
+    return current_app.extensions['user_cache']
+
+
+def lookup_many(cnics):
+    """Map each existing CNIC to a CachedUser, reading only cache misses from the database"""
+    cnics = sorted(set(cnics))
+    cache = _cache()
+    found = cache.get_many(cnics)
+    missing = [cnic for cnic in cnics if cnic not in found]
+    for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+        rows = db.session.execute(
+            select(User.id, User.cnic, User.name)
+            .where(User.cnic.in_(missing[start:start + LOOKUP_CHUNK_SIZE]))
+        ).all()
+        users = [CachedUser(*row) for row in rows]
+        cache.put_many(users)
+        found.update((user.cnic, user) for user in users)
+    return found
+
+
+def lookup(cnic):
+    """The CachedUser for cnic, or None if no such user exists"""
+    return lookup_many([cnic]).get(cnic)
+
+
+def invalidate(*cnics):
+    """Forget the given CNICs; call after any write that changes or removes them"""
+    _cache().invalidate(*cnics)
+
+
+def stats():
+    return _cache().stats()
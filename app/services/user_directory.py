@@ -0,0 +1,125 @@
+from .. import db
+from ..models import User
+from ..models.money import to_paisa, from_paisa
+from sqlalchemy import select, func, tuple_
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+SORT_COLUMNS = {
+    'name': User.name,
+    'cnic': User.cnic,
+    'balance': User.balance,
+}
+SORT_DIRECTIONS = ['asc', 'desc']
+
+UserListing = namedtuple('UserListing', ['search', 'sort', 'direction'])
+UserPage = namedtuple('UserPage', ['users', 'next_cursor'])
+
+
+class UserDirectoryError(ValueError):
+    """Raised when user listing, search or cursor arguments cannot be parsed"""
+
+
+def parse_listing(args, default_sort='name'):
+    """Build a UserListing from request arguments"""
+    sort = args.get('sort') or default_sort
+    if sort not in SORT_COLUMNS:
+        raise UserDirectoryError(f'Cannot sort users by {sort}.')
+    direction = args.get('direction') or 'asc'
+    if direction not in SORT_DIRECTIONS:
+        raise UserDirectoryError(f'Unknown sort direction {direction}.')
+    return UserListing(search=(args.get('q') or '').strip() or None, sort=sort, direction=direction)
+
+
+def listing_args(listing):
+    """Query-string arguments that reproduce the given listing"""
+    args = {'q': listing.search, 'sort': listing.sort, 'direction': listing.direction}
+    return {key: value for key, value in args.items() if value}
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_condition(search):
+    """Match users whose CNIC or, for non-numeric input, lowercased name starts with search.
+
+    Written as a range rather than LIKE so the unique CNIC index and the
+    lower(name) expression index can serve it.
+    """
+    if search[0].isdigit():
+        column = User.cnic
+    else:
+        column = func.lower(User.name)
+        search = search.lower()
+    return (column >= search) & (column < prefix_upper_bound(search))
+
+
+def encode_cursor(user, sort):
+    """Opaque cursor pointing just past user in the given sort order"""
+    return f'{getattr(user, sort)}_{user.id}'
+
+
+def decode_cursor(cursor, sort):
+    """Turn a cursor back into a (sort value, id) tuple"""
+    if not cursor:
+        return None
+    try:
+        value, user_id = cursor.rsplit('_', 1)
+        if sort == 'balance':
+            # Balances are whole paisa, so finer values never come from a real page link
+            value = from_paisa(to_paisa(Decimal(value)))
+        return value, int(user_id)
+    except (ValueError, InvalidOperation):
+        raise UserDirectoryError('Invalid page cursor.')
+
+
+def user_page(listing, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """One page of users in the listing's order, starting after cursor.
+
+    Pages are seeked on (sort column, id), which the name, balance and
+    CNIC indexes cover, so deep pages cost the same as the first.
+    """
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    column = SORT_COLUMNS[listing.sort]
+    query = select(User)
+    if listing.search:
+        query = query.where(prefix_condition(listing.search))
+    if listing.direction == 'desc':
+        query = query.order_by(column.desc(), User.id.desc())
+        if cursor:
+            query = query.where(tuple_(column, User.id) < cursor)
+    else:
+        query = query.order_by(column, User.id)
+        if cursor:
+            query = query.where(tuple_(column, User.id) > cursor)
+
+    # Fetch one extra row to find out whether there is a next page
+    users = db.session.execute(query.limit(per_page + 1)).scalars().all()
+    next_cursor = None
+    if len(users) > per_page:
+        users = users[:per_page]
+        next_cursor = encode_cursor(users[-1], listing.sort)
+    return UserPage(users=users, next_cursor=next_cursor)
+
+
+def search_users(search, limit=SEARCH_LIMIT):
+    """Up to limit users whose CNIC or name starts with search, for typeahead pickers"""
+    search = (search or '').strip()
+    if not search:
+        return []
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    order = User.cnic if search[0].isdigit() else func.lower(User.name)
+    return db.session.execute(
+        select(User.id, User.cnic, User.name, User.balance)
+        .where(prefix_condition(search))
+        .order_by(order, User.id)
+        .limit(limit)
+    ).all()
@@ -0,0 +1,90 @@
+"""Weighting and previewing an average daily balance profit distribution.
+
+    python -m benchmarks.average_balance --users 1000000 --transactions 1000000
+
+Seeds the given number of accounts and spreads the transactions over a
+30-day period, then times computing every account's daily-balance weight
+in one streaming pass, allocating a profit to the paisa, and the dry-run
+preview. Nothing is written by the timed steps.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks.common import make_app, cleanup
+
+PERIOD_DAYS = 30
+
+
+def seed(app, users, transactions, period_start, seed_value=11):
+    from app import db
+    from app.models import User, Transaction
+    from sqlalchemy import insert
+
+    rng = random.Random(seed_value)
+    with app.app_context():
+        for start in range(0, users, 50000):
+            db.session.execute(insert(User), [
+                dict(cnic=f'AVG-{i:07d}', name=f'Average User {i}', balance=Decimal('5000.00'))
+                for i in range(start, min(start + 50000, users))
+            ])
+        first = datetime.combine(period_start, datetime.min.time())
+        for start in range(0, transactions, 50000):
+            db.session.execute(insert(Transaction), [
+                dict(user_id=rng.randrange(users) + 1, transaction_type=rng.choice(['credit', 'debit']),
+                     amount=Decimal(rng.randrange(1, 100000)) / 100,
+                     timestamp=first + timedelta(seconds=rng.randrange(PERIOD_DAYS * 86400)))
+                for _ in range(start, min(start + 50000, transactions))
+            ])
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    from app.services import profit_distribution
+
+    period_end = datetime.utcnow().date() - timedelta(days=1)
+    period_start = period_end - timedelta(days=PERIOD_DAYS - 1)
+    app, db_path = make_app(METRICS_ENABLED=False)
+    try:
+        seed(app, args.users, args.transactions, period_start)
+        request = profit_distribution.DistributionRequest(
+            Decimal('1000000.00'), Decimal('10'), 'average_balance', period_start, period_end)
+        with app.app_context():
+            started = time.perf_counter()
+            ids, weights = profit_distribution.average_balance_weights(period_start, period_end)
+            weighted = time.perf_counter()
+            allocation = profit_distribution.allocate(ids, weights, 100000000)
+            allocated = time.perf_counter()
+            preview = profit_distribution.preview_distribution(request)
+    finally:
+        cleanup(db_path)
+
+    assert sum(allocation.shares) == allocation.amount_paisa
+    result = {
+        'users': args.users,
+        'transactions': args.transactions,
+        'weight_seconds': weighted - started,
+        'allocate_seconds': allocated - weighted,
+        'preview_seconds': preview.elapsed,
+        'accounts_per_second': len(ids) / (weighted - started),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['users']} accounts, {result['transactions']} transactions over {PERIOD_DAYS} days")
+    print(f"weights   {result['weight_seconds']:.2f}s ({result['accounts_per_second']:.0f} accounts/s)")
+    print(f"allocate  {result['allocate_seconds']:.2f}s")
+    print(f"preview   {result['preview_seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
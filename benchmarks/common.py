@@ -0,0 +1,52 @@
+"""Helpers shared by the benchmark scripts.
+
+Every benchmark runs against a throwaway SQLite file so the real
+instance database is never touched.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+ADMIN_USERNAME = 'benchmark'
+ADMIN_PASSWORD = 'benchmark-password'
+
+
+def make_app(db_path=None, **config):
+    """Create the app bound to a fresh temporary database.
+
+    Extra keyword arguments are applied as config overrides.
+    """
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='samad-bench-', suffix='.sqlite')
+        os.close(fd)
+        os.unlink(db_path)
+
+    from app import create_app, db
+    from app.models import Admin
+
+    config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        if not Admin.query.filter_by(username=ADMIN_USERNAME).first():
+            db.session.add(Admin(username=ADMIN_USERNAME, password_hash=Admin.set_password(ADMIN_PASSWORD)))
+            db.session.commit()
+    return app, db_path
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    return client
+
+
+def cleanup(db_path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        try:
+            os.unlink(db_path + suffix)
+        except OSError:
+            pass
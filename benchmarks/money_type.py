@@ -0,0 +1,168 @@
+"""Summing and distributing balances stored as NUMERIC versus integer paisa.
+
+    python -m benchmarks.money_type --accounts 1000000
+
+Builds two copies of the same ledger in a throwaway SQLite database: one
+with amounts in NUMERIC(15, 2) columns, as they were stored before, and
+one with the Money type's BIGINT paisa. For each copy it times SUM() in
+SQL, loading every balance into Python and summing it there, and a
+profit distribution that reads the balances, splits an amount to the
+paisa and writes the increments and ledger rows in bulk. The NUMERIC
+copy goes through Decimals on every row; the paisa copy reads and
+writes raw integers.
+"""
+import argparse
+import json
+import random
+import time
+import warnings
+from decimal import Decimal
+
+from benchmarks.common import make_app, cleanup
+
+BATCH_SIZE = 50000
+
+
+def make_tables(metadata, prefix, money_type):
+    import sqlalchemy as sa
+
+    accounts = sa.Table(
+        f'{prefix}_account', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('balance', money_type, nullable=False),
+    )
+    transactions = sa.Table(
+        f'{prefix}_transaction', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, nullable=False),
+        sa.Column('amount', money_type, nullable=False),
+    )
+    return accounts, transactions
+
+
+def seed(connection, accounts, balances):
+    for start in range(0, len(balances), BATCH_SIZE):
+        connection.execute(accounts.insert(), [
+            dict(id=start + i + 1, balance=balance)
+            for i, balance in enumerate(balances[start:start + BATCH_SIZE])
+        ])
+
+
+def timed(function, repeat=1):
+    """(best seconds, result) over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def distribute(connection, accounts, transactions, amount_paisa, raw):
+    """Split amount_paisa over every balance by weight and write it; the copy's own conversions apply"""
+    from sqlalchemy import select, update, bindparam, BigInteger
+    from app.models.money import paisa, to_paisa, from_paisa
+
+    if raw:
+        rows = connection.execute(select(accounts.c.id, paisa(accounts.c.balance))).all()
+    else:
+        rows = [(user_id, to_paisa(balance)) for user_id, balance in
+                connection.execute(select(accounts.c.id, accounts.c.balance))]
+    total = sum(balance for _, balance in rows)
+    shares = [(user_id, balance * amount_paisa // total) for user_id, balance in rows]
+
+    if raw:
+        increment = paisa(accounts.c.balance) + bindparam('share', type_=BigInteger)
+        amount = bindparam('share', type_=BigInteger)
+    else:
+        increment = accounts.c.balance + bindparam('share')
+        amount = bindparam('share')
+        shares = [(user_id, from_paisa(share)) for user_id, share in shares]
+    for start in range(0, len(shares), BATCH_SIZE):
+        chunk = [dict(account_id=user_id, user_id=user_id, share=share)
+                 for user_id, share in shares[start:start + BATCH_SIZE]]
+        connection.execute(
+            update(accounts).where(accounts.c.id == bindparam('account_id')).values(balance=increment), chunk)
+        connection.execute(transactions.insert().values(amount=amount), chunk)
+    return len(shares)
+
+
+def measure(connection, accounts, transactions, expected_total, repeat, raw):
+    from sqlalchemy import select, func
+    from app.models.money import paisa, from_paisa
+
+    sql_seconds, sql_total = timed(
+        lambda: connection.execute(select(func.sum(accounts.c.balance))).scalar(), repeat)
+    if raw:
+        python_seconds, python_total = timed(
+            lambda: from_paisa(sum(connection.execute(select(paisa(accounts.c.balance))).scalars())), repeat)
+    else:
+        python_seconds, python_total = timed(
+            lambda: sum(connection.execute(select(accounts.c.balance)).scalars()), repeat)
+    distribute_seconds, credited = timed(
+        lambda: distribute(connection, accounts, transactions, 100000000, raw))
+    return {
+        'sum_sql_seconds': sql_seconds,
+        'sum_sql_exact': Decimal(sql_total) == expected_total,
+        'sum_python_seconds': python_seconds,
+        'sum_python_exact': python_total == expected_total,
+        'distribute_seconds': distribute_seconds,
+        'distribute_accounts_per_second': credited / distribute_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each sum; the best is reported')
+    parser.add_argument('--seed', type=int, default=21)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    import sqlalchemy as sa
+    from app import db
+    from app.models.money import Money
+
+    # NUMERIC on SQLite stores floats; the dialect warns about it once per process
+    warnings.filterwarnings('ignore', message='Dialect sqlite\\+pysqlite does \\*not\\* support Decimal')
+
+    rng = random.Random(args.seed)
+    balances = [Decimal(rng.randrange(1, 10000000)) / 100 for _ in range(args.accounts)]
+    expected_total = sum(balances)
+
+    app, db_path = make_app(METRICS_ENABLED=False)
+    try:
+        metadata = sa.MetaData()
+        copies = {
+            'numeric': make_tables(metadata, 'bench_numeric', sa.Numeric(15, 2)),
+            'paisa': make_tables(metadata, 'bench_paisa', Money()),
+        }
+        results = {}
+        with app.app_context():
+            metadata.create_all(db.engine)
+            with db.engine.begin() as connection:
+                for accounts, _ in copies.values():
+                    seed(connection, accounts, balances)
+            for name, (accounts, transactions) in copies.items():
+                with db.engine.begin() as connection:
+                    results[name] = measure(connection, accounts, transactions, expected_total,
+                                            args.repeat, raw=name == 'paisa')
+    finally:
+        cleanup(db_path)
+
+    result = {'accounts': args.accounts, **results}
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{args.accounts} accounts, total {expected_total}")
+    print(f"{'':<12} {'SUM() in SQL':>14} {'sum in Python':>14} {'distribute':>12}")
+    for name in copies:
+        row = results[name]
+        print(f"{name:<12} {row['sum_sql_seconds']:>13.3f}s {row['sum_python_seconds']:>13.3f}s "
+              f"{row['distribute_seconds']:>11.2f}s"
+              f"{'' if row['sum_sql_exact'] else '  (SQL sum inexact)'}")
+
+
+if __name__ == '__main__':
+    main()
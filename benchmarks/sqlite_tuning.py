@@ -0,0 +1,129 @@
+"""Concurrent read/write throughput under the default and tuned engine profiles.
+
+    python -m benchmarks.sqlite_tuning --readers 6 --writers 2 --seconds 10
+
+For each profile a fresh SQLite database is seeded, then reader processes
+page through the ledger and dashboard while writer processes post batches
+of credits through the batch posting endpoint. Separate processes stand
+in for gunicorn workers, so locking happens in SQLite rather than on the
+GIL. The script reports completed
+requests per second and failed requests for each side.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from benchmarks.common import make_app, logged_in_client, cleanup
+
+PROFILES = ['default', 'tuned']
+
+
+def seed(app, users, transactions_per_user):
+    from app import db
+    from app.models import User, Transaction
+    from app.services import system_totals
+    from sqlalchemy import insert
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'cnic': f'TUNE-{i:06d}', 'name': f'Tuning User {i}', 'balance': Decimal('1000.00')}
+            for i in range(users)
+        ])
+        user_ids = [row[0] for row in db.session.execute(db.select(User.id)).all()]
+        db.session.execute(insert(Transaction), [
+            {'user_id': user_id, 'transaction_type': 'credit', 'amount': Decimal('1000.00') / transactions_per_user,
+             'description': 'Seed'}
+            for user_id in user_ids for _ in range(transactions_per_user)
+        ])
+        system_totals.adjust_total_balance(Decimal('1000.00') * users)
+        db.session.commit()
+
+
+def worker(kind, worker_id, db_path, profile, users, batch_size, seconds, start_barrier):
+    """One reader or writer process, standing in for a gunicorn worker"""
+    app, _ = make_app(db_path, DB_ENGINE_PROFILE=profile)
+    client = logged_in_client(app)
+    # Measure only once every worker is up, so process start-up is excluded
+    start_barrier.wait()
+    deadline = time.time() + seconds
+    ok = failed = 0
+    n = 0
+    while time.time() < deadline:
+        try:
+            if kind == 'reader':
+                paths = ['/admin/transactions', '/admin/dashboard', f'/admin/transactions?cnic=TUNE-{worker_id:06d}']
+                response = client.get(paths[n % len(paths)])
+                n += 1
+            else:
+                batch = [
+                    {'operation_type': 'credit', 'user_cnic': f'TUNE-{(worker_id * 7919 + n + i) % users:06d}', 'amount': '1.00'}
+                    for i in range(batch_size)
+                ]
+                n += batch_size
+                response = client.post('/admin/api/operations/batch', json={'operations': batch})
+            if response.status_code == 200:
+                ok += 1
+            else:
+                failed += 1
+        except Exception:
+            failed += 1
+    return kind, ok, failed
+
+
+def run_profile(profile, args):
+    app, db_path = make_app(DB_ENGINE_PROFILE=profile)
+    try:
+        seed(app, args.users, args.transactions_per_user)
+        context = multiprocessing.get_context('spawn')
+        workers = args.readers + args.writers
+        with context.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            start_barrier = manager.Barrier(workers)
+            futures = [
+                pool.submit(worker, kind, i, db_path, profile, args.users, args.batch_size, args.seconds, start_barrier)
+                for kind, count in (('reader', args.readers), ('writer', args.writers))
+                for i in range(count)
+            ]
+            totals = {'reader': [0, 0], 'writer': [0, 0]}
+            for future in futures:
+                kind, ok, failed = future.result()
+                totals[kind][0] += ok
+                totals[kind][1] += failed
+
+        return {
+            'profile': profile,
+            'reads_per_second': round(totals['reader'][0] / args.seconds, 1),
+            'read_failures': totals['reader'][1],
+            'write_batches_per_second': round(totals['writer'][0] / args.seconds, 1),
+            'write_failures': totals['writer'][1],
+        }
+    finally:
+        cleanup(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=PROFILES)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--transactions-per-user', type=int, default=10)
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = [run_profile(profile, args) for profile in args.profiles]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['profile']:<8} reads {r['reads_per_second']:>8.1f}/s ({r['read_failures']} failed)   "
+              f"write batches {r['write_batches_per_second']:>7.1f}/s ({r['write_failures']} failed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Worker boot latency: importing the app package and running create_app().
+
+    python -m benchmarks.startup --runs 10
+
+Each run happens in a fresh interpreter, as a newly forked gunicorn worker
+would see it, against an empty temporary SQLite database. The script
+reports the median, min and max of each phase and flags heavy modules,
+such as reportlab, that were imported during boot without being needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import ROOT, cleanup
+
+# Modules that should only be imported when a feature is first used
+LAZY_MODULES = ['reportlab']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+created = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - started,
+    'create_app_seconds': created - imported,
+    'total_seconds': created - started,
+    'loaded_modules': [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+}))
+"""
+
+PHASES = ['import_seconds', 'create_app_seconds', 'total_seconds']
+
+
+def probe(db_path):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, 'sqlite:///' + db_path, json.dumps(LAZY_MODULES)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs):
+    fd, db_path = tempfile.mkstemp(prefix='samad-bench-', suffix='.sqlite')
+    os.close(fd)
+    try:
+        samples = [probe(db_path) for _ in range(runs)]
+    finally:
+        cleanup(db_path)
+
+    result = {'runs': runs, 'eagerly_loaded': sorted({name for s in samples for name in s['loaded_modules']})}
+    for phase in PHASES:
+        values = [s[phase] for s in samples]
+        result[phase] = {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    result = run(args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for phase in PHASES:
+        stats = result[phase]
+        print(f"{phase:<20} median {stats['median'] * 1000:>7.1f} ms   "
+              f"min {stats['min'] * 1000:>7.1f} ms   max {stats['max'] * 1000:>7.1f} ms")
+    if result['eagerly_loaded']:
+        print(f"Imported during boot but only needed later: {', '.join(result['eagerly_loaded'])}")
+
+
+if __name__ == '__main__':
+    main()
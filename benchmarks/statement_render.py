@@ -0,0 +1,93 @@
+"""Compare the standard and fast PDF statement renderers.
+
+    python -m benchmarks.statement_render --rows 1000 10000 100000
+
+For each size the script renders the same synthetic statement with both
+renderers and reports wall time, rows/sec and the resulting page count.
+--memory adds a second, traced run per renderer to report peak Python
+memory (tracing slows rendering down, so it is kept out of the timed
+run). Use --skip-standard-above to leave out the standard renderer for
+sizes where it would take too long.
+"""
+import argparse
+import json
+import re
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks import common  # noqa: F401  (puts the project on sys.path)
+from app.services.statement_data import StatementUser, StatementLine
+from app.services.statement_pdf import generate_user_statement_pdf, generate_user_statement_pdf_fast
+
+TYPES = ['credit', 'debit', 'transfer_out', 'transfer_in', 'profit_distribution']
+
+
+def synthetic_lines(rows):
+    start = datetime(2026, 1, 1)
+    for i in range(rows):
+        yield StatementLine(
+            start + timedelta(minutes=i),
+            TYPES[i % len(TYPES)],
+            Decimal(i % 100000) / 100,
+            f'Synthetic transaction {i}',
+        )
+
+
+def measure(renderer, user, make_lines, trace_memory=False):
+    started = time.perf_counter()
+    pdf = renderer(user, make_lines()).getvalue()
+    elapsed = time.perf_counter() - started
+    result = {
+        'seconds': round(elapsed, 3),
+        'pages': len(re.findall(rb'/Type /Page\b', pdf)),
+        'bytes': len(pdf),
+    }
+    if trace_memory:
+        lines = make_lines()
+        tracemalloc.start()
+        renderer(user, lines)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_mib'] = round(peak / 2**20, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--skip-standard-above', type=int, default=None,
+                        help='Only run the fast renderer for sizes larger than this')
+    parser.add_argument('--memory', action='store_true', help='Also report peak traced memory')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    user = StatementUser(1, 'Benchmark Customer', '00000-0000000-0', Decimal('123456.78'))
+    results = []
+    for rows in args.rows:
+        result = {'rows': rows}
+        if args.skip_standard_above is None or rows <= args.skip_standard_above:
+            # The standard renderer needs a fully materialised list
+            result['standard'] = measure(generate_user_statement_pdf, user,
+                                         lambda: list(synthetic_lines(rows)), args.memory)
+        result['fast'] = measure(generate_user_statement_pdf_fast, user,
+                                 lambda: synthetic_lines(rows), args.memory)
+        results.append(result)
+
+        if not args.json:
+            for name in ('standard', 'fast'):
+                if name in result:
+                    r = result[name]
+                    memory = f'  peak {r["peak_mib"]:>7.1f} MiB' if 'peak_mib' in r else ''
+                    print(f'{rows:>8} rows  {name:<8} {r["seconds"]:>8.2f}s  {rows / r["seconds"]:>9.0f} rows/sec  '
+                          f'{r["pages"]:>6} pages{memory}')
+            if 'standard' in result:
+                print(f'{"":>8}       speedup  {result["standard"]["seconds"] / result["fast"]["seconds"]:.1f}x')
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Latency and throughput of the admin banking flows, as JSON for CI.
+
+    python -m benchmarks.suite --users 2000 --transactions 20000 --output results.json
+    python -m benchmarks.suite --baseline baseline.json --tolerance 0.25
+
+Seeds a synthetic bank into a throwaway SQLite database: accounts are
+inserted directly and their transaction history is posted through the
+batch operations endpoint. Every scenario is then driven through the
+Flask test client as a logged-in admin, so timings include routing,
+SQL and template rendering. Each scenario reports the number of
+requests, errors, mean and percentile latency and requests per second.
+
+With --baseline the run is compared against an earlier --output file;
+any scenario whose median latency grew by more than --tolerance is
+reported and the script exits non-zero.
+"""
+import argparse
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from benchmarks.common import make_app, logged_in_client, cleanup
+
+SEED_BATCH_SIZE = 5000
+
+# Statements render in worker processes; the benchmark polls for them this often
+STATEMENT_POLL_SECONDS = 0.01
+
+
+def seed(app, client, users, transactions, seed_value=19):
+    """Create users with an opening deposit, then post a random history of operations"""
+    from app import db
+    from app.models import User, Transaction
+    from app.services import system_totals
+    from sqlalchemy import insert, select
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            dict(cnic=cnic(i), name=f'Bench User {i}', balance=Decimal('1000.00'), last_sequence=1)
+            for i in range(users)
+        ])
+        user_ids = db.session.execute(select(User.id)).scalars().all()
+        db.session.execute(insert(Transaction), [
+            dict(user_id=user_id, transaction_type='credit', amount=Decimal('1000.00'),
+                 description='Initial deposit', timestamp=datetime.utcnow(),
+                 sequence=1, balance_after=Decimal('1000.00'))
+            for user_id in user_ids
+        ])
+        db.session.commit()
+        system_totals.reconcile(fix=True)
+
+    rng = random.Random(seed_value)
+    posted = 0
+    while posted < transactions:
+        batch = [random_operation(rng, users) for _ in range(min(SEED_BATCH_SIZE, transactions - posted))]
+        response = client.post('/admin/api/operations/batch', json={'operations': batch})
+        if response.status_code != 200 or not response.get_json().get('applied'):
+            raise RuntimeError(f'Seeding batch failed with status {response.status_code}')
+        posted += len(batch)
+
+
+def cnic(index):
+    return f'BENCH-{index:07d}'
+
+
+def random_operation(rng, users, kind=None):
+    """A small credit, debit or transfer; amounts stay well below the opening balance"""
+    kind = kind or rng.choice(['credit', 'credit', 'debit', 'transfer'])
+    sender = rng.randrange(users)
+    item = {'operation_type': kind, 'user_cnic': cnic(sender), 'amount': f'{rng.randint(1, 500) / 100:.2f}'}
+    if kind == 'transfer':
+        item['to_user_cnic'] = cnic((sender + rng.randrange(1, users)) % users)
+    return item
+
+
+def download_statement(client, rng, context):
+    """Ask for a statement until the background job has it ready, as the preparing page does"""
+    url = f"/admin/download-statement/{context['user_ids'][rng.randrange(len(context['user_ids']))]}"
+    response = client.get(url)
+    while response.status_code == 202:
+        time.sleep(STATEMENT_POLL_SECONDS)
+        response = client.get(url)
+    return response
+
+
+# Each scenario is (name, share of --requests it runs, request function).
+# Request functions take (client, rng, context) and return a response.
+SCENARIOS = [
+    ('dashboard', 1.0,
+     lambda client, rng, context: client.get('/admin/dashboard')),
+    ('view_transactions', 1.0,
+     lambda client, rng, context: client.get('/admin/transactions')),
+    ('view_transactions_by_cnic', 1.0,
+     lambda client, rng, context: client.get(f"/admin/transactions?cnic={cnic(rng.randrange(context['users']))}")),
+    ('account_operations_credit', 1.0,
+     lambda client, rng, context: client.post('/admin/account-operations',
+                                              data=random_operation(rng, context['users'], 'credit'))),
+    ('account_operations_debit', 1.0,
+     lambda client, rng, context: client.post('/admin/account-operations',
+                                              data=random_operation(rng, context['users'], 'debit'))),
+    ('account_operations_transfer', 1.0,
+     lambda client, rng, context: client.post('/admin/account-operations',
+                                              data=random_operation(rng, context['users'], 'transfer'))),
+    # Credits every account, so it runs far fewer times than the page loads
+    ('distribute_profit', 0.05,
+     lambda client, rng, context: client.post('/admin/profit-distribution',
+                                              data={'total_profit': '1000.00', 'distribution_percentage': '10'})),
+    # A different account each time, so most statements are rendered rather than served from the cache
+    ('download_statement', 0.2, download_statement),
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(client, name, count, request, context, warmup, seed_value):
+    rng = random.Random(f'{seed_value}-{name}')
+    for _ in range(warmup):
+        request(client, rng, context)
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        request_started = time.perf_counter()
+        response = request(client, rng, context)
+        latencies.append(time.perf_counter() - request_started)
+        # Form posts answer with a redirect back to their page, never to the login form
+        if response.status_code >= 400 or '/auth/login' in response.headers.get('Location', ''):
+            errors += 1
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': count,
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'requests_per_second': round(count / elapsed, 2) if elapsed > 0 else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)),
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1]),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose median latency regressed by more than tolerance, as printable lines"""
+    regressions = []
+    for name, result in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not before.get('p50_ms'):
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1
+        if change > tolerance:
+            regressions.append(f"{name}: median {before['p50_ms']:.1f} ms -> {result['p50_ms']:.1f} ms (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=20000, help='Operations posted while seeding')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per page-load scenario; heavier ones run fewer')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests before each scenario')
+    parser.add_argument('--scenario', action='append', choices=[name for name, _, _ in SCENARIOS],
+                        help='Run only this scenario; can be repeated')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed fractional growth of median latency over the baseline')
+    parser.add_argument('--seed', type=int, default=19)
+    args = parser.parse_args()
+
+    statement_dir = tempfile.mkdtemp(prefix='samad-bench-statements-')
+    app, db_path = make_app(STATEMENT_CACHE_DIR=statement_dir)
+    try:
+        client = logged_in_client(app)
+        seed_started = time.perf_counter()
+        seed(app, client, args.users, args.transactions, args.seed)
+        seed_seconds = time.perf_counter() - seed_started
+
+        from app.models import User
+        with app.app_context():
+            user_ids = [user_id for (user_id,) in User.query.with_entities(User.id).all()]
+        context = {'users': args.users, 'user_ids': user_ids}
+
+        scenarios = {}
+        for name, share, request in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+            count = max(1, int(args.requests * share))
+            scenarios[name] = run_scenario(client, name, count, request, context, args.warmup, args.seed)
+            print(f"{name:<28} {scenarios[name]['p50_ms']:>9.1f} ms p50 "
+                  f"{scenarios[name]['p95_ms']:>9.1f} ms p95 "
+                  f"{scenarios[name]['requests_per_second']:>8.1f} req/s", file=sys.stderr)
+    finally:
+        cleanup(db_path)
+        shutil.rmtree(statement_dir, ignore_errors=True)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'users': args.users,
+            'transactions': args.transactions,
+            'requests': args.requests,
+            'seed': args.seed,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'scenarios': scenarios,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+        print(f'No scenario regressed by more than {args.tolerance:.0%}.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Posting throughput and SQL round-trips with the CNIC user cache on and off.
+
+    python -m benchmarks.user_cache --users 10000 --operations 5000
+
+Single operations are posted back to back through the posting service,
+as the account operations form does, over a fixed random mix of credits,
+debits and transfers. Both runs replay the same sequence against a fresh
+database. The script reports operations per second, SQL statements per
+operation and the cache hit rate.
+"""
+import argparse
+import json
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.common import make_app, cleanup
+
+SETTINGS = {'off': 0, 'on': 100000}
+
+
+def seed(app, users):
+    from app import db
+    from app.models import User
+    from app.services import system_totals
+    from sqlalchemy import insert
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            dict(cnic=f'CACHE-{i:07d}', name=f'Cache User {i}', balance=Decimal('1000.00'))
+            for i in range(users)
+        ])
+        db.session.commit()
+        system_totals.reconcile(fix=True)
+
+
+def operations(users, count, hot_users, seed_value=7):
+    """A repeatable mix that mostly touches a hot set of accounts, as real traffic does"""
+    rng = random.Random(seed_value)
+    pick = lambda: f'CACHE-{rng.randrange(hot_users if rng.random() < 0.9 else users):07d}'
+    items = []
+    for _ in range(count):
+        kind = rng.choice(['credit', 'credit', 'debit', 'transfer'])
+        item = {'operation_type': kind, 'user_cnic': pick(), 'amount': '1.00'}
+        if kind == 'transfer':
+            item['to_user_cnic'] = pick()
+        items.append(item)
+    return items
+
+
+def run(setting, args):
+    from app import db
+    from app.services import posting, user_cache
+    from sqlalchemy import event
+
+    app, db_path = make_app(USER_CACHE_SIZE=SETTINGS[setting], METRICS_ENABLED=False)
+    try:
+        seed(app, args.users)
+        items = operations(args.users, args.operations, args.hot_users)
+        statements = 0
+
+        def count(*_):
+            nonlocal statements
+            statements += 1
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            started = time.perf_counter()
+            for item in items:
+                posting.post_operations([item])
+            elapsed = time.perf_counter() - started
+            event.remove(db.engine, 'before_cursor_execute', count)
+            stats = user_cache.stats()
+    finally:
+        cleanup(db_path)
+
+    lookups = stats.hits + stats.misses
+    return {
+        'cache': setting,
+        'operations': len(items),
+        'seconds': elapsed,
+        'operations_per_second': len(items) / elapsed,
+        'statements_per_operation': statements / len(items),
+        'hit_rate': stats.hits / lookups if lookups else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--hot-users', type=int, default=500, help='Accounts receiving 90%% of the operations')
+    parser.add_argument('--operations', type=int, default=5000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = [run(setting, args) for setting in SETTINGS]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"cache {r['cache']:<3}  {r['operations_per_second']:>7.1f} ops/s   "
+              f"{r['statements_per_operation']:.2f} statements/op   hit rate {r['hit_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,4 +6,68 @@ class Config:
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'bank.sqlite')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # 'tuned' enables WAL and related PRAGMAs on SQLite, and pool sizing with
+    # pre-ping on server databases; 'default' leaves the driver defaults
+    DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'tuned')
+    SQLITE_PRAGMAS = {}  # Overrides for app.database.TUNED_SQLITE_PRAGMAS
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+    # Request metrics served at /admin/metrics. SQL statements slower than
+    # SLOW_QUERY_THRESHOLD_MS are logged; unset disables the slow-query log.
+    # Scrapers can authenticate with 'Authorization: Bearer <METRICS_TOKEN>'.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ['SLOW_QUERY_THRESHOLD_MS']) if os.environ.get('SLOW_QUERY_THRESHOLD_MS') else None
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # CNIC -> user id/name cache used by posting and the CNIC uniqueness
+    # checks. Other workers may serve a renamed or deleted CNIC for up to
+    # USER_CACHE_TTL seconds; USER_CACHE_SIZE=0 disables the cache.
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 100000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+
+    # Signed-in admin cache consulted on every request. Other workers may keep
+    # a renamed or deleted admin signed in for up to PRINCIPAL_CACHE_TTL
+    # seconds; PRINCIPAL_CACHE_TTL=0 disables the cache.
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 1024))
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 300))
+
+    # Werkzeug hash method and cost for admin passwords, e.g. 'scrypt:16384:8:1'
+    # or 'pbkdf2:sha256:600000'. Lower costs raise login throughput at the price
+    # of weaker hashes. Existing hashes are redone on the admin's next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+
+    # The dashboard and balance pages carry ETags derived from the ledger
+    # high-water mark and their rendered HTML is kept, per process, in a
+    # cache of at most RESPONSE_CACHE_MAX_BYTES; 0 keeps only the ETags
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+    # flask ledger verify leaves transactions younger than this many seconds for
+    # its next run, so postings still being committed are not checked half-done
+    LEDGER_CHECK_SETTLE_SECONDS = int(os.environ.get('LEDGER_CHECK_SETTLE_SECONDS', 60))
+
+    # Largest number of operations accepted by the batch posting endpoint
+    POSTING_MAX_BATCH_SIZE = int(os.environ.get('POSTING_MAX_BATCH_SIZE', 10000))
+
+    # Seconds a posting's idempotency key is honoured; expired keys are
+    # removed by `flask idempotency sweep`
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+    # Background PDF statement rendering. The cache directory defaults to
+    # instance/statement_cache and is trimmed least-recently-used first.
+    STATEMENT_WORKERS = int(os.environ.get('STATEMENT_WORKERS', 2))
+    STATEMENT_CACHE_DIR = os.environ.get('STATEMENT_CACHE_DIR')
+    STATEMENT_CACHE_MAX_BYTES = int(os.environ.get('STATEMENT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # A statement job whose pending marker is older than this many seconds is
+    # taken to have died with its worker and is queued again on the next request
+    STATEMENT_JOB_TIMEOUT = int(os.environ.get('STATEMENT_JOB_TIMEOUT', 300))
+
+    # Deleting a user archives their transactions on a background thread,
+    # ARCHIVE_CHUNK_SIZE rows per commit with a pause of ARCHIVE_CHUNK_PAUSE
+    # seconds between commits so other writers are not starved
+    ARCHIVE_CHUNK_SIZE = int(os.environ.get('ARCHIVE_CHUNK_SIZE', 1000))
+    ARCHIVE_CHUNK_PAUSE = float(os.environ.get('ARCHIVE_CHUNK_PAUSE', 0.05))
+
     # You can add other configurations here, e.g., for mail, etc. 
\ No newline at end of file
@@ -1,6 +1,10 @@
-from app import create_app, db
+from app import create_app
+from app.services import bootstrap
 
 app = create_app()
 with app.app_context():
-    db.create_all()
-    print("Database initialized successfully!") 
\ No newline at end of file
+    bootstrap.create_schema()
+    if bootstrap.seed_default_admin():
+        print(f"Default admin user created with username '{bootstrap.DEFAULT_ADMIN_USERNAME}' "
+              f"and password '{bootstrap.DEFAULT_ADMIN_PASSWORD}'")
+    print("Database initialized successfully!")
@@ -0,0 +1,30 @@
+"""add user version to system totals
+
+Revision ID: 02695689f506
+Revises: 143dc22341df
+Create Date: 2026-10-17 13:38:56.554738
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '02695689f506'
+down_revision = '143dc22341df'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases set up with `flask schema init` already have the column
+    if any(column['name'] == 'user_version' for column in inspector.get_columns('system_totals')):
+        return
+    with op.batch_alter_table('system_totals', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('system_totals', schema=None) as batch_op:
+        batch_op.drop_column('user_version')
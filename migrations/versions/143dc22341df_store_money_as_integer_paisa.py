@@ -0,0 +1,64 @@
+"""store money as integer paisa
+
+Revision ID: 143dc22341df
+Revises: b8f3c5075b84
+Create Date: 2026-10-17 13:32:28.094783
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '143dc22341df'
+down_revision = 'b8f3c5075b84'
+branch_labels = None
+depends_on = None
+
+# (table, column, nullable) of every amount in rupees
+MONEY_COLUMNS = [
+    ('user', 'balance', True),
+    ('transaction', 'amount', False),
+    ('system_totals', 'total_balance', False),
+    ('balance_snapshot', 'balance', False),
+    ('archival_job', 'final_balance', False),
+]
+
+DECIMAL = sa.Numeric(precision=15, scale=2)
+
+
+def _column_type(inspector, table, column):
+    return next(c['type'] for c in inspector.get_columns(table) if c['name'] == column)
+
+
+def _convert(table, column, nullable, type_, existing_type, expression):
+    """Change the column's type, rewriting every value with the SQL expression"""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column(table, column, type_=type_, existing_type=existing_type,
+                        existing_nullable=nullable, postgresql_using=expression)
+        return
+    # SQLite rebuilds the table, casting the rewritten values to the new type
+    op.execute(f'UPDATE "{table}" SET {column} = {expression}')
+    with op.batch_alter_table(table, schema=None) as batch_op:
+        batch_op.alter_column(column, type_=type_, existing_type=existing_type, existing_nullable=nullable)
+
+
+def _recreate_name_index():
+    # The table rebuild drops expression indexes, which SQLite cannot reflect
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_name_lower ON "user" (lower(name))')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, column, nullable in MONEY_COLUMNS:
+        # Databases set up with `flask schema init` already store paisa
+        if isinstance(_column_type(inspector, table, column), sa.Integer):
+            continue
+        _convert(table, column, nullable, sa.BigInteger(), DECIMAL, f'CAST(ROUND({column} * 100) AS BIGINT)')
+    _recreate_name_index()
+
+
+def downgrade():
+    for table, column, nullable in reversed(MONEY_COLUMNS):
+        _convert(table, column, nullable, DECIMAL, sa.BigInteger(), f'{column} / 100.0')
+    _recreate_name_index()
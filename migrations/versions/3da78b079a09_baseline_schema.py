@@ -0,0 +1,62 @@
+"""baseline schema
+
+Revision ID: 3da78b079a09
+Revises: 
+Create Date: 2026-10-17 12:58:04.370323
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3da78b079a09'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() before migrations existed already
+    # have these tables, so only create what is missing
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'admin' not in existing:
+        op.create_table(
+            'admin',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('password_hash', sa.String(length=256), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username'),
+        )
+    if 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('cnic', sa.String(length=15), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('balance', sa.Numeric(precision=15, scale=2), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('cnic'),
+        )
+    if 'transaction' not in existing:
+        op.create_table(
+            'transaction',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('transaction_type', sa.String(length=50), nullable=False),
+            sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.Column('description', sa.String(length=255), nullable=True),
+            sa.Column('related_user_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['related_user_id'], ['user.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('transaction')
+    op.drop_table('user')
+    op.drop_table('admin')
@@ -0,0 +1,41 @@
+"""add balance snapshots
+
+Revision ID: 5489b54bbab5
+Revises: f4810780700a
+Create Date: 2026-10-17 13:12:45.792097
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5489b54bbab5'
+down_revision = 'f4810780700a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases set up with `flask schema init` already have the table
+    if inspector.has_table('balance_snapshot'):
+        return
+    op.create_table(
+        'balance_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('balance', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_balance_snapshot_user_date', 'balance_snapshot', ['user_id', 'snapshot_date'], unique=True)
+    op.create_index('ix_balance_snapshot_date', 'balance_snapshot', ['snapshot_date'])
+
+
+def downgrade():
+    op.drop_index('ix_balance_snapshot_date', table_name='balance_snapshot')
+    op.drop_index('ix_balance_snapshot_user_date', table_name='balance_snapshot')
+    op.drop_table('balance_snapshot')
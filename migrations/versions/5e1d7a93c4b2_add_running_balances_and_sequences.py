@@ -0,0 +1,83 @@
+"""add running balances and per-account sequence numbers
+
+Revision ID: 5e1d7a93c4b2
+Revises: 02695689f506
+Create Date: 2026-10-17 14:05:12.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1d7a93c4b2'
+down_revision = '02695689f506'
+branch_labels = None
+depends_on = None
+
+# Numbers each account's transactions in id order and winds the current
+# balance back through the later ones to get every row's running balance
+BACKFILL_TRANSACTIONS = '''
+UPDATE "transaction" SET sequence = numbered.sequence, balance_after = numbered.balance_after
+FROM (
+    SELECT t.id,
+           ROW_NUMBER() OVER (PARTITION BY t.user_id ORDER BY t.id) AS sequence,
+           COALESCE(u.balance, 0) - COALESCE(SUM(
+               CASE WHEN t.transaction_type IN ('debit', 'transfer_out') THEN -t.amount ELSE t.amount END
+           ) OVER (PARTITION BY t.user_id ORDER BY t.id ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING), 0)
+               AS balance_after
+    FROM "transaction" t JOIN "user" u ON u.id = t.user_id
+) AS numbered
+WHERE "transaction".id = numbered.id
+'''
+
+BACKFILL_USERS = '''
+UPDATE "user" SET last_sequence = COALESCE(
+    (SELECT MAX(sequence) FROM "transaction" WHERE "transaction".user_id = "user".id), 0)
+'''
+
+
+def _columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def _recreate_name_index():
+    # The table rebuild drops expression indexes, which SQLite cannot reflect
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_name_lower ON "user" (lower(name))')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases set up with `flask schema init` already have the columns and table
+    if 'last_sequence' not in _columns(inspector, 'user'):
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('last_sequence', sa.Integer(), server_default='0', nullable=False))
+        _recreate_name_index()
+    if 'sequence' not in _columns(inspector, 'transaction'):
+        with op.batch_alter_table('transaction', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('sequence', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('balance_after', sa.BigInteger(), nullable=True))
+        op.execute(BACKFILL_TRANSACTIONS)
+        op.execute(BACKFILL_USERS)
+        op.create_index('ix_transaction_user_id_sequence', 'transaction', ['user_id', 'sequence'], unique=True)
+    if not inspector.has_table('ledger_checkpoint'):
+        op.create_table(
+            'ledger_checkpoint',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+            sa.Column('rows_checked', sa.Integer(), nullable=False),
+            sa.Column('problems', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('ledger_checkpoint')
+    op.drop_index('ix_transaction_user_id_sequence', table_name='transaction')
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_column('balance_after')
+        batch_op.drop_column('sequence')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('last_sequence')
+    _recreate_name_index()
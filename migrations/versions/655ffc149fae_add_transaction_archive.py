@@ -0,0 +1,65 @@
+"""add transaction archive
+
+Revision ID: 655ffc149fae
+Revises: 5489b54bbab5
+Create Date: 2026-10-17 13:25:49.914558
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '655ffc149fae'
+down_revision = '5489b54bbab5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases set up with `flask schema init` already have the tables
+    if not inspector.has_table('archival_job'):
+        op.create_table(
+            'archival_job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('cnic', sa.String(length=15), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('final_balance', sa.Numeric(precision=15, scale=2), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total_rows', sa.Integer(), nullable=False),
+            sa.Column('archived_rows', sa.Integer(), nullable=False),
+            sa.Column('error', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_archival_job_user_id', 'archival_job', ['user_id'])
+        op.create_index('ix_archival_job_status', 'archival_job', ['status'])
+    if not inspector.has_table('transaction_archive'):
+        op.create_table(
+            'transaction_archive',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('job_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('first_transaction_id', sa.Integer(), nullable=False),
+            sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+            sa.Column('first_timestamp', sa.DateTime(), nullable=True),
+            sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+            sa.Column('row_count', sa.Integer(), nullable=False),
+            sa.Column('payload', sa.LargeBinary(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['job_id'], ['archival_job.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_transaction_archive_user_first', 'transaction_archive', ['user_id', 'first_transaction_id'])
+
+
+def downgrade():
+    op.drop_index('ix_transaction_archive_user_first', table_name='transaction_archive')
+    op.drop_table('transaction_archive')
+    op.drop_index('ix_archival_job_status', table_name='archival_job')
+    op.drop_index('ix_archival_job_user_id', table_name='archival_job')
+    op.drop_table('archival_job')
@@ -0,0 +1,42 @@
+"""add idempotency keys
+
+Revision ID: b8f3c5075b84
+Revises: 655ffc149fae
+Create Date: 2026-10-17 13:29:24.273521
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8f3c5075b84'
+down_revision = '655ffc149fae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Databases set up with `flask schema init` already have the table
+    if inspector.has_table('idempotency_key'):
+        return
+    op.create_table(
+        'idempotency_key',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('applied', sa.Boolean(), nullable=False),
+        sa.Column('results', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_idempotency_key_key', 'idempotency_key', ['key'], unique=True)
+    op.create_index('ix_idempotency_key_expires_at', 'idempotency_key', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_idempotency_key_expires_at', table_name='idempotency_key')
+    op.drop_index('ix_idempotency_key_key', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
@@ -0,0 +1,48 @@
+"""add system totals and hot path indexes
+
+Revision ID: c737a4ba0019
+Revises: 3da78b079a09
+Create Date: 2026-10-17 12:58:06.689582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c737a4ba0019'
+down_revision = '3da78b079a09'
+branch_labels = None
+depends_on = None
+
+
+TRANSACTION_INDEXES = [
+    ('ix_transaction_timestamp_id', ['timestamp', 'id']),
+    ('ix_transaction_user_id_timestamp', ['user_id', 'timestamp']),
+    ('ix_transaction_related_user_id', ['related_user_id']),
+    ('ix_transaction_type_timestamp', ['transaction_type', 'timestamp', 'id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('system_totals'):
+        op.create_table(
+            'system_totals',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('total_balance', sa.Numeric(precision=15, scale=2), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    existing = {index['name'] for index in inspector.get_indexes('transaction')}
+    for name, columns in TRANSACTION_INDEXES:
+        if name not in existing:
+            op.create_index(name, 'transaction', columns)
+
+
+def downgrade():
+    for name, _ in reversed(TRANSACTION_INDEXES):
+        op.drop_index(name, table_name='transaction')
+    op.drop_table('system_totals')
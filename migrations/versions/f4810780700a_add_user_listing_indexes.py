@@ -0,0 +1,38 @@
+"""add user listing indexes
+
+Revision ID: f4810780700a
+Revises: c737a4ba0019
+Create Date: 2026-10-17 13:07:53.366480
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4810780700a'
+down_revision = 'c737a4ba0019'
+branch_labels = None
+depends_on = None
+
+
+USER_INDEXES = [
+    ('ix_user_name_id', ['name', 'id']),
+    ('ix_user_balance_id', ['balance', 'id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {index['name'] for index in inspector.get_indexes('user')}
+    for name, columns in USER_INDEXES:
+        if name not in existing:
+            op.create_index(name, 'user', columns)
+    # Expression indexes are not reflected on every backend, so let the database skip it
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_name_lower ON "user" (lower(name))')
+
+
+def downgrade():
+    op.drop_index('ix_user_name_lower', table_name='user')
+    for name, _ in reversed(USER_INDEXES):
+        op.drop_index(name, table_name='user')
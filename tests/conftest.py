@@ -0,0 +1,58 @@
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import create_app, db
+from app.models import User
+from app.services import bootstrap, posting, statement_jobs
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app bound to a fresh SQLite file, with the default admin seeded"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'bank.sqlite'),
+        'METRICS_ENABLED': False,
+        'STATEMENT_CACHE_DIR': str(tmp_path / 'statements'),
+        'ARCHIVE_CHUNK_PAUSE': 0,
+    })
+    with app.app_context():
+        bootstrap.create_schema()
+        bootstrap.seed_default_admin()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    # Rendering processes are bound to the database of the app that started them
+    if statement_jobs._executor is not None:
+        statement_jobs._executor.shutdown()
+        statement_jobs._executor = None
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/auth/login', data={
+        'username': bootstrap.DEFAULT_ADMIN_USERNAME,
+        'password': bootstrap.DEFAULT_ADMIN_PASSWORD,
+    })
+    return client
+
+
+@pytest.fixture
+def make_user(app):
+    """Create an account, crediting its opening balance through the posting service; returns its id"""
+    def make_user(cnic, balance='0.00', name=None):
+        user = User(cnic=cnic, name=name or f'User {cnic}', balance=0)
+        db.session.add(user)
+        db.session.commit()
+        if Decimal(balance) > 0:
+            posting.post_operations([{'operation_type': 'credit', 'user_cnic': cnic, 'amount': str(balance)}])
+        return user.id
+    return make_user
@@ -0,0 +1,93 @@
+import os
+import time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, func
+
+from app import db
+from app.models import User, Transaction, TransactionArchive
+from app.services import archival, posting, statement_jobs, system_totals
+
+
+def _download(client, job_id, timeout=30):
+    """GET the archived statement, following 202s until the background render finishes"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f'/admin/archives/{job_id}/statement')
+        if response.status_code != 202 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.1)
+
+
+def _archived_account(make_user, cnic='1', name='Alice'):
+    """An account with some history, emptied and archived; returns its finished job"""
+    user_id = make_user(cnic, '10.00', name=name)
+    make_user('2')
+    posting.post_operations([
+        {'operation_type': 'transfer', 'user_cnic': cnic, 'to_user_cnic': '2', 'amount': '4.00'},
+        {'operation_type': 'debit', 'user_cnic': cnic, 'amount': '6.00'},
+    ])
+    job = archival.start_deletion(db.session.get(User, user_id))
+    return archival.run_job(job.id, chunk_size=2, pause=0)
+
+
+def test_accounts_with_funds_are_not_deleted(app, make_user):
+    user_id = make_user('1', '10.00')
+    with pytest.raises(archival.ArchivalError):
+        archival.start_deletion(db.session.get(User, user_id))
+
+
+def test_run_job_archives_history_and_removes_the_account(app, make_user):
+    job = _archived_account(make_user)
+    assert job.status == 'done'
+    assert db.session.get(User, job.user_id) is None
+    assert db.session.execute(
+        select(func.count(Transaction.id)).where(Transaction.user_id == job.user_id)
+    ).scalar() == 0
+    # The recipient keeps its side of the transfer, without the link to the deleted account
+    assert db.session.execute(
+        select(func.count(Transaction.id)).where(Transaction.related_user_id == job.user_id)
+    ).scalar() == 0
+    assert db.session.execute(select(func.count(TransactionArchive.id))).scalar() == 2
+
+    rows = archival.archived_transactions(job.user_id)
+    assert [row.sequence for row in rows] == [1, 2, 3]
+    assert rows[-1].balance_after == Decimal('0.00')
+    assert system_totals.reconcile().difference == 0
+
+
+def test_postings_to_an_account_being_deleted_are_rejected(app, make_user):
+    user_id = make_user('1')
+    archival.start_deletion(db.session.get(User, user_id))
+    result = posting.post_operations([{'operation_type': 'credit', 'user_cnic': '1', 'amount': '5.00'}])
+    assert not result.applied
+    assert 'being deleted' in result.results[0].message
+
+
+def test_archived_statement_is_rendered_in_the_background(client, make_user):
+    job = _archived_account(make_user)
+    first = client.get(f'/admin/archives/{job.id}/statement')
+    assert first.status_code == 202
+    assert first.headers['Retry-After']
+    assert first.headers['Cache-Control'] == 'no-store'
+
+    response = _download(client, job.id)
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+    assert 'Alice' in response.headers['Content-Disposition']
+    # Keyed on the archival job, not on ids a new account may be given
+    path = statement_jobs.cached_statement(statement_jobs.archive_job_id(job.id))
+    assert os.path.basename(path) == f'statement_archive-{job.id}.pdf'
+
+
+def test_unfinished_archives_have_no_statement(client, make_user):
+    user_id = make_user('1')
+    job = archival.start_deletion(db.session.get(User, user_id))
+    assert client.get(f'/admin/archives/{job.id}/statement').status_code == 404
+
+
+def test_archive_job_ids_reject_garbage(app):
+    for bad in ('archive-', 'archive-x', 'archive-../1'):
+        with pytest.raises(statement_jobs.StatementJobError):
+            statement_jobs.cached_statement(bad)
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update, func
+
+from app import db
+from app.models import User, Transaction
+from app.models.money import to_paisa
+from app.services import balance_history, posting, profit_distribution, system_totals
+from app.services.profit_distribution import DistributionRequest
+
+TODAY = datetime.utcnow().date()
+START = TODAY - timedelta(days=10)
+END = TODAY - timedelta(days=1)
+
+
+def _at(day):
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=12)
+
+
+@pytest.fixture
+def accounts(make_user):
+    """Account 1 holds 100.00 all period and pays 30.00 out halfway; account 2 deposits 50.00 halfway"""
+    ids = [make_user('1', '100.00'), make_user('2'), make_user('3')]
+    posting.post_operations([{'operation_type': 'debit', 'user_cnic': '1', 'amount': '30.00'},
+                             {'operation_type': 'credit', 'user_cnic': '2', 'amount': '50.00'}])
+    # Activity after the period must not count towards it
+    posting.post_operations([{'operation_type': 'credit', 'user_cnic': '3', 'amount': '999.00'}])
+    timestamps = [START - timedelta(days=3), START + timedelta(days=5), START + timedelta(days=5), TODAY]
+    for transaction_id, day in zip(
+            db.session.execute(select(Transaction.id).order_by(Transaction.id)).scalars(), timestamps):
+        db.session.execute(update(Transaction).where(Transaction.id == transaction_id).values(timestamp=_at(day)))
+    db.session.commit()
+    return ids
+
+
+def _request(profit='100.00', percentage='10'):
+    return DistributionRequest(Decimal(profit), Decimal(percentage), 'average_balance', START, END)
+
+
+def test_weights_are_the_sum_of_daily_closing_balances(accounts):
+    ids, weights = profit_distribution.average_balance_weights(START, END)
+    days = (END - START).days + 1
+    assert list(ids) == accounts[:2]
+    for user_id, weight in zip(ids, weights):
+        assert weight == to_paisa(balance_history.average_daily_balance(user_id, START, END) * days)
+    assert list(weights) == [5 * 10000 + 5 * 7000, 5 * 5000]
+
+
+def test_distribution_credits_the_weighted_shares(accounts):
+    before = dict(db.session.execute(select(User.id, User.balance)).all())
+    result = profit_distribution.distribute_profit_by_average_balance(_request())
+    after = dict(db.session.execute(select(User.id, User.balance)).all())
+
+    assert result.amount_distributed == Decimal('10.00')
+    assert result.accounts == 2
+    # Weights 85,000 and 25,000 split 1,000 paisa into 772.7 and 227.3; the leftover paisa goes to the larger
+    assert [after[i] - before[i] for i in accounts] == [Decimal('7.73'), Decimal('2.27'), Decimal('0.00')]
+    assert system_totals.reconcile().difference == 0
+
+
+def test_preview_writes_nothing(accounts):
+    count = db.session.execute(select(func.count(Transaction.id))).scalar()
+    preview = profit_distribution.preview_distribution(_request(), top=1)
+    assert preview.amount == Decimal('10.00')
+    assert preview.accounts == 2
+    assert [(share['cnic'], share['share']) for share in preview.top_shares] == [('1', Decimal('7.73'))]
+    assert db.session.execute(select(func.count(Transaction.id))).scalar() == count
+
+
+@pytest.mark.parametrize('start, end, message', [
+    (END, START, 'must not be before'),
+    (START, TODAY, 'must have ended'),
+    ('2026-1-x', END, 'Invalid period start'),
+])
+def test_period_is_validated(start, end, message):
+    with pytest.raises(profit_distribution.ProfitDistributionError, match=message):
+        profit_distribution.parse_distribution_request({
+            'total_profit': '100', 'distribution_percentage': '10', 'mode': 'average_balance',
+            'period_start': str(start), 'period_end': str(end),
+        })
+
+
+def test_preview_endpoint(client, accounts):
+    response = client.post('/admin/api/profit-distribution/preview', json={
+        'total_profit': '100', 'distribution_percentage': '10', 'mode': 'average_balance',
+        'period_start': START.isoformat(), 'period_end': END.isoformat(),
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['amount'], body['accounts']) == ('10.00', 2)
+    assert client.post('/admin/api/profit-distribution/preview', json={'total_profit': '1'}).status_code == 400
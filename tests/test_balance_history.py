@@ -0,0 +1,104 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update
+
+from app import db
+from app.models import Transaction, BalanceSnapshot
+from app.services import balance_history, posting
+
+TODAY = datetime.utcnow().date()
+DAYS = [TODAY - timedelta(days=n) for n in (6, 4, 2)]
+
+
+def _at(day, hour=12):
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+
+
+@pytest.fixture
+def history(make_user):
+    """Account 1 gets 100.00, then -30.00 and +5.50 on three days; account 2 only the transfer"""
+    first = make_user('1', '100.00')
+    second = make_user('2')
+    posting.post_operations([{'operation_type': 'debit', 'user_cnic': '1', 'amount': '30.00'}])
+    posting.post_operations([{'operation_type': 'transfer', 'user_cnic': '1', 'amount': '4.50', 'to_user_cnic': '2'},
+                             {'operation_type': 'credit', 'user_cnic': '1', 'amount': '10.00'}])
+    ids = db.session.execute(select(Transaction.id).order_by(Transaction.id)).scalars().all()
+    for transaction_id, day in zip(ids, [DAYS[0], DAYS[1], DAYS[2], DAYS[2], DAYS[2]]):
+        db.session.execute(update(Transaction).where(Transaction.id == transaction_id).values(timestamp=_at(day)))
+    db.session.commit()
+    return first, second
+
+
+EXPECTED = [
+    (DAYS[0] - timedelta(days=1), Decimal('0.00')),
+    (DAYS[0], Decimal('100.00')),
+    (DAYS[0] + timedelta(days=1), Decimal('100.00')),
+    (DAYS[1], Decimal('70.00')),
+    (DAYS[2], Decimal('75.50')),
+    (TODAY, Decimal('75.50')),
+]
+
+
+def test_balance_at_reads_running_balances(history):
+    user_id, _ = history
+    assert [balance_history.balance_at(user_id, day) for day, _ in EXPECTED] == [balance for _, balance in EXPECTED]
+
+
+def test_balance_at_without_running_balances(history):
+    user_id, _ = history
+    db.session.execute(update(Transaction).values(balance_after=None))
+    db.session.commit()
+    # No snapshots: the current balance is wound back
+    assert [balance_history.balance_at(user_id, day) for day, _ in EXPECTED] == [balance for _, balance in EXPECTED]
+
+    # From a snapshot before the day and, for earlier days, the one after it
+    balance_history.take_snapshots(DAYS[1])
+    assert [balance_history.balance_at(user_id, day) for day, _ in EXPECTED] == [balance for _, balance in EXPECTED]
+
+
+def test_snapshots_match_balance_at(history):
+    first, second = history
+    for day in (DAYS[0], DAYS[1], DAYS[2]):
+        result = balance_history.take_snapshots(day)
+        assert result.accounts == 2
+    # Repeating a day replaces its rows
+    balance_history.take_snapshots(DAYS[1])
+    snapshots = db.session.execute(
+        select(BalanceSnapshot.snapshot_date, BalanceSnapshot.user_id, BalanceSnapshot.balance)
+        .order_by(BalanceSnapshot.snapshot_date, BalanceSnapshot.user_id)
+    ).all()
+    assert [(row.snapshot_date, row.user_id) for row in snapshots] == [
+        (day, user_id) for day in DAYS for user_id in (first, second)
+    ]
+    for row in snapshots:
+        assert row.balance == balance_history.balance_at(row.user_id, row.snapshot_date)
+    assert list(balance_history.iter_closing_balances(DAYS[1] + timedelta(days=1), chunk_size=1)) == [
+        (first, Decimal('70.00')), (second, Decimal('0.00')),
+    ]
+
+
+def test_today_cannot_be_snapshotted(app):
+    with pytest.raises(balance_history.BalanceHistoryError):
+        balance_history.take_snapshots(TODAY)
+
+
+def test_average_daily_balance(history):
+    user_id, _ = history
+    # 100.00 on DAYS[0] and the day after, then 70.00 for two days, then 75.50
+    assert balance_history.average_daily_balance(user_id, DAYS[0], DAYS[2]) == \
+        ((2 * Decimal('100.00') + 2 * Decimal('70.00') + Decimal('75.50')) / 5).quantize(Decimal('0.01'))
+    with pytest.raises(balance_history.BalanceHistoryError):
+        balance_history.average_daily_balance(user_id, DAYS[2], DAYS[0])
+
+
+def test_prune_keeps_month_end_snapshots(history):
+    user_id, _ = history
+    for day in (date(2026, 1, 30), date(2026, 1, 31), date(2026, 2, 1)):
+        db.session.add(BalanceSnapshot(user_id=user_id, snapshot_date=day, balance=0, created_at=datetime.utcnow()))
+    db.session.commit()
+    removed = balance_history.prune_snapshots(keep_days=30, today=date(2026, 6, 1))
+    assert sorted(removed) == [date(2026, 1, 30), date(2026, 2, 1)]
+    remaining = db.session.execute(select(BalanceSnapshot.snapshot_date)).scalars().all()
+    assert remaining == [date(2026, 1, 31)]
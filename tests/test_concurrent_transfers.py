@@ -0,0 +1,101 @@
+"""Concurrent transfers through both posting endpoints must conserve money.
+
+Half of the workers post single transfers through the account operations
+form, the other half post small JSON batches. Balances start small so
+many transfers race for the same funds.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import select, func, case
+
+from app import db
+from app.models import User, Transaction
+from app.services import bootstrap, ledger_integrity, system_totals
+
+USERS = 20
+WORKERS = 6
+OPERATIONS = 60
+BATCH_SIZE = 5
+OPENING_BALANCE = Decimal('100.00')
+
+
+def seed(users, opening_balance):
+    for i in range(users):
+        user = User(cnic=f'STRESS-{i:05d}', name=f'Stress User {i}', balance=opening_balance, last_sequence=1)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Transaction(user_id=user.id, transaction_type='credit', amount=opening_balance,
+                                   description='Initial deposit', sequence=1, balance_after=opening_balance))
+    system_totals.adjust_total_balance(opening_balance * users)
+    db.session.commit()
+
+
+def random_transfer(rng, users):
+    sender, recipient = rng.sample(range(users), 2)
+    return {
+        'operation_type': 'transfer',
+        'user_cnic': f'STRESS-{sender:05d}',
+        'to_user_cnic': f'STRESS-{recipient:05d}',
+        'amount': f'{rng.randint(1, 4000) / 100:.2f}',
+    }
+
+
+def worker(app, worker_id, operations, users, batch_size):
+    rng = random.Random(worker_id)
+    client = app.test_client()
+    client.post('/auth/login', data={'username': bootstrap.DEFAULT_ADMIN_USERNAME,
+                                     'password': bootstrap.DEFAULT_ADMIN_PASSWORD})
+    statuses = {}
+    posted = 0
+    while posted < operations:
+        if worker_id % 2:
+            response = client.post('/admin/account-operations', data=random_transfer(rng, users))
+            posted += 1
+        else:
+            batch = [random_transfer(rng, users) for _ in range(min(batch_size, operations - posted))]
+            response = client.post('/admin/api/operations/batch', json={'operations': batch})
+            posted += len(batch)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses
+
+
+def check_invariants(expected_total):
+    """Assert money is conserved, nothing is negative and every derived balance agrees"""
+    db.session.rollback()
+    actual_total = db.session.execute(select(func.sum(User.balance))).scalar()
+    negative = db.session.execute(select(func.count()).where(User.balance < 0)).scalar()
+    signed = case(
+        (Transaction.transaction_type.in_(['debit', 'transfer_out']), -Transaction.amount),
+        else_=Transaction.amount,
+    )
+    history = dict(db.session.execute(
+        select(Transaction.user_id, func.sum(signed)).group_by(Transaction.user_id)
+    ).all())
+    mismatched = [
+        user_id for user_id, balance in db.session.execute(select(User.id, User.balance)).all()
+        if Decimal(str(history.get(user_id, 0))).quantize(Decimal('0.01')) != balance
+    ]
+    reconcile = system_totals.reconcile()
+    ledger = ledger_integrity.verify(full=True, settle_seconds=0)
+
+    assert actual_total == expected_total, f'money not conserved: {actual_total} != {expected_total}'
+    assert negative == 0, f'{negative} balances went negative'
+    assert not mismatched, f'balances disagree with history for users {mismatched[:10]}'
+    assert reconcile.difference == 0, f'system total off by {reconcile.difference}'
+    assert not ledger.problem_count, f'running balances or sequences broken: {ledger.problems[:10]}'
+
+
+def test_concurrent_transfers_conserve_money(app):
+    seed(USERS, OPENING_BALANCE)
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        futures = [pool.submit(worker, app, worker_id, OPERATIONS, USERS, BATCH_SIZE) for worker_id in range(WORKERS)]
+        statuses = {}
+        for future in futures:
+            for status, count in future.result().items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    # The form redirects after every post; the batch endpoint answers 200 or, short of funds, 422
+    assert set(statuses) <= {200, 302, 422}, statuses
+    check_invariants(OPENING_BALANCE * USERS)
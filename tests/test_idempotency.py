@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select, func, update
+
+from app import db
+from app.models import User, Transaction, IdempotencyKey
+from app.services import idempotency
+
+BATCH_URL = '/admin/api/operations/batch'
+
+
+def _add_user(cnic, balance):
+    db.session.add(User(cnic=cnic, name=f'User {cnic}', balance=Decimal(balance)))
+    db.session.commit()
+
+
+def _balance(cnic):
+    return db.session.execute(select(User.balance).where(User.cnic == cnic)).scalar()
+
+
+def _transaction_count():
+    return db.session.execute(select(func.count(Transaction.id))).scalar()
+
+
+def _credit(amount):
+    return {'operations': [{'operation_type': 'credit', 'user_cnic': '11111', 'amount': amount}]}
+
+
+def test_same_key_and_body_replays_without_posting_again(client):
+    _add_user('11111', '10.00')
+    first = client.post(BATCH_URL, json=_credit('5.00'), headers={'Idempotency-Key': 'k-1'})
+    assert first.status_code == 200
+    assert first.get_json()['replayed'] is False
+
+    second = client.post(BATCH_URL, json=_credit('5.00'), headers={'Idempotency-Key': 'k-1'})
+    assert second.status_code == 200
+    assert second.get_json()['replayed'] is True
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json()['results'] == first.get_json()['results']
+    assert _balance('11111') == Decimal('15.00')
+    assert _transaction_count() == 1
+
+
+def test_rejected_batch_replays_its_rejection(client):
+    _add_user('11111', '1.00')
+    debit = {'operations': [{'operation_type': 'debit', 'user_cnic': '11111', 'amount': '5.00'}]}
+    first = client.post(BATCH_URL, json=debit, headers={'Idempotency-Key': 'k-2'})
+    assert first.status_code == 422
+    # Funds arriving later do not turn the stored rejection into a posting
+    client.post(BATCH_URL, json=_credit('10.00'))
+
+    second = client.post(BATCH_URL, json=debit, headers={'Idempotency-Key': 'k-2'})
+    assert second.status_code == 422
+    assert second.get_json()['replayed'] is True
+    assert _balance('11111') == Decimal('11.00')
+
+
+def test_same_key_with_a_different_body_is_rejected(client):
+    _add_user('11111', '10.00')
+    client.post(BATCH_URL, json=_credit('5.00'), headers={'Idempotency-Key': 'k-3'})
+
+    response = client.post(BATCH_URL, json=_credit('6.00'), headers={'Idempotency-Key': 'k-3'})
+    assert response.status_code == 422
+    assert 'different request' in response.get_json()['error']
+    assert _balance('11111') == Decimal('15.00')
+    assert _transaction_count() == 1
+
+
+def test_expired_key_is_posted_afresh(client):
+    _add_user('11111', '10.00')
+    client.post(BATCH_URL, json=_credit('5.00'), headers={'Idempotency-Key': 'k-4'})
+    db.session.execute(update(IdempotencyKey).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+    # A different body is accepted too, since the old outcome no longer counts
+    response = client.post(BATCH_URL, json=_credit('6.00'), headers={'Idempotency-Key': 'k-4'})
+    assert response.status_code == 200
+    assert response.get_json()['replayed'] is False
+    assert _balance('11111') == Decimal('21.00')
+    assert db.session.execute(select(func.count(IdempotencyKey.id))).scalar() == 1
+
+
+def test_sweep_deletes_only_expired_keys(app):
+    now = datetime.utcnow()
+    for index in range(7):
+        expires_at = now - timedelta(minutes=1) if index < 5 else now + timedelta(hours=1)
+        db.session.add(IdempotencyKey(key=f'k-{index}', request_hash='x', applied=True, results='[]',
+                                      created_at=now, expires_at=expires_at))
+    db.session.commit()
+
+    assert idempotency.sweep(chunk_size=2, now=now) == 5
+    remaining = db.session.execute(select(IdempotencyKey.key).order_by(IdempotencyKey.key)).scalars().all()
+    assert remaining == ['k-5', 'k-6']
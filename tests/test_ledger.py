@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import db
+from app.models import Transaction
+from app.services import ledger, posting
+
+
+def _post(*operations):
+    return posting.post_operations([dict(zip(('operation_type', 'user_cnic', 'amount', 'to_user_cnic'), op))
+                                    for op in operations])
+
+
+def _walk(filters, per_page):
+    seen = []
+    cursor = None
+    while True:
+        page = ledger.ledger_page(filters, cursor, per_page=per_page)
+        seen.extend(page.transactions)
+        if page.next_cursor is None:
+            return seen
+        cursor = ledger.decode_cursor(page.next_cursor)
+
+
+NO_FILTERS = ledger.LedgerFilters(None, None, None, None)
+
+
+def test_pages_cover_the_ledger_once_newest_first(app, make_user):
+    make_user('1', '100.00')
+    make_user('2', '100.00')
+    # Each batch shares one timestamp, so the id breaks ties between pages
+    for _ in range(4):
+        _post(('credit', '1', '1.00'), ('debit', '2', '1.00'), ('transfer', '1', '2.00', '2'))
+
+    seen = _walk(NO_FILTERS, per_page=3)
+    assert len(seen) == 2 + 4 * 4
+    assert len({t.id for t in seen}) == len(seen)
+    keys = [(t.timestamp, t.id) for t in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_by_cnic_type_and_date(app, make_user):
+    make_user('1', '100.00')
+    make_user('2', '100.00')
+    _post(('credit', '1', '1.00'), ('transfer', '1', '2.00', '2'))
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    db.session.execute(update(Transaction).where(Transaction.transaction_type == 'transfer_in')
+                       .values(timestamp=yesterday))
+    db.session.commit()
+
+    by_cnic = _walk(ledger.LedgerFilters('1', None, None, None), per_page=2)
+    assert {t.user.cnic for t in by_cnic} == {'1'}
+    assert len(by_cnic) == 3
+
+    by_type = _walk(ledger.LedgerFilters(None, 'transfer_out', None, None), per_page=2)
+    assert [t.related_user.cnic for t in by_type] == ['2']
+
+    by_date = _walk(ledger.LedgerFilters(None, None, yesterday.date(), yesterday.date()), per_page=2)
+    assert [t.transaction_type for t in by_date] == ['transfer_in']
+
+
+def test_parse_filters_rejects_bad_input():
+    assert ledger.parse_filters({'cnic': ' 1 ', 'date_to': '2026-01-31'}) == \
+        ledger.LedgerFilters('1', None, None, date(2026, 1, 31))
+    with pytest.raises(ledger.LedgerFilterError):
+        ledger.parse_filters({'type': 'refund'})
+    with pytest.raises(ledger.LedgerFilterError):
+        ledger.parse_filters({'date_from': '31/01/2026'})
+    with pytest.raises(ledger.LedgerFilterError):
+        ledger.decode_cursor('not-a-cursor')
+
+
+def test_ledger_page_renders(client, make_user):
+    make_user('1', '100.00')
+    response = client.get('/admin/transactions?per_page=1&cnic=1')
+    assert response.status_code == 200
+    assert b'Credit operation of 100.00' in response.data
+    assert client.get('/admin/transactions?cursor=bad').status_code == 302
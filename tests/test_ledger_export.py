@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+
+from app.services import ledger, ledger_export, posting
+
+NO_FILTERS = ledger.LedgerFilters(None, None, None, None)
+
+
+def _seed(make_user):
+    make_user('1', '100.00', name='Alice')
+    make_user('2', '50.00', name='Bob')
+    posting.post_operations([
+        {'operation_type': 'transfer', 'user_cnic': '1', 'amount': '12.5', 'to_user_cnic': '2'},
+        {'operation_type': 'debit', 'user_cnic': '2', 'amount': '0.01'},
+    ])
+
+
+def test_csv_export_streams_every_row_in_batches(app, make_user):
+    _seed(make_user)
+    chunks = list(ledger_export.iter_csv(NO_FILTERS, batch_size=2))
+    # Five rows in batches of two: three full or partial chunks after the header
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [row['transaction_type'] for row in rows] == ['debit', 'transfer_in', 'transfer_out', 'credit', 'credit']
+    transfer_out = rows[2]
+    assert transfer_out['user_name'] == 'Alice'
+    assert transfer_out['related_user_cnic'] == '2'
+    assert transfer_out['amount'] == '12.50'
+    assert rows[0]['related_user_cnic'] == ''
+
+
+def test_ndjson_export_applies_filters(app, make_user):
+    _seed(make_user)
+    filters = ledger.LedgerFilters('2', None, None, None)
+    lines = ''.join(ledger_export.iter_ndjson(filters, batch_size=2)).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record['transaction_type'] for record in records] == ['debit', 'transfer_in', 'credit']
+    assert set(records[0]) == set(ledger_export.EXPORT_COLUMNS)
+    assert records[0]['amount'] == '0.01'
+
+
+def test_export_route(client, make_user):
+    _seed(make_user)
+    response = client.get('/admin/transactions/export?format=ndjson&type=credit')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+    assert client.get('/admin/transactions/export?format=xml').status_code == 400
+    assert client.get('/admin/transactions/export?date_from=bad').status_code == 400
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.models import User
+from app.models.money import to_paisa, from_paisa
+from app.services import posting
+
+
+@pytest.mark.parametrize('amount, expected', [
+    (Decimal('0'), 0),
+    (Decimal('0.01'), 1),
+    (Decimal('12.50'), 1250),
+    (Decimal('-3.07'), -307),
+    ('1000000000.99', 100000000099),
+    (7, 700),
+])
+def test_to_paisa_converts_whole_paisa(amount, expected):
+    assert to_paisa(amount) == expected
+
+
+@pytest.mark.parametrize('amount', [Decimal('0.001'), Decimal('12.505'), '-0.009', Decimal('1E-10')])
+def test_to_paisa_rejects_fractional_paisa(amount):
+    with pytest.raises(ValueError):
+        to_paisa(amount)
+
+
+@pytest.mark.parametrize('amount', ['NaN', 'Infinity', '-Infinity'])
+def test_to_paisa_rejects_non_finite_amounts(amount):
+    with pytest.raises(ValueError):
+        to_paisa(Decimal(amount))
+
+
+def test_from_paisa_round_trips():
+    for amount in (Decimal('0.00'), Decimal('0.01'), Decimal('99.99'), Decimal('-42.10')):
+        assert from_paisa(to_paisa(amount)) == amount
+
+
+@pytest.mark.parametrize('value, message', [
+    ('abc', 'Invalid amount'),
+    ('NaN', 'Invalid amount'),
+    ('Infinity', 'Invalid amount'),
+    ('1.001', 'more than two decimal places'),
+    ('1e20', 'cannot exceed'),
+    ('1e30', 'cannot exceed'),
+    ('10000000000000.00', 'cannot exceed'),
+])
+def test_parse_amount_rejects_unstorable_input(value, message):
+    with pytest.raises(posting.PostingError, match=message):
+        posting.parse_amount(value)
+
+
+def test_parse_amount_accepts_up_to_the_maximum():
+    assert posting.parse_amount(str(posting.MAX_AMOUNT)) == posting.MAX_AMOUNT
+    assert to_paisa(posting.MAX_AMOUNT) < 2 ** 63
+
+
+def test_oversized_amounts_are_rejected_not_a_server_error(client, make_user):
+    user_id = make_user('1', '10.00')
+    response = client.post('/admin/api/operations/batch', json={'operations': [
+        {'operation_type': 'credit', 'user_cnic': '1', 'amount': '1e20'},
+    ]})
+    assert response.status_code == 422
+    assert 'cannot exceed' in response.get_json()['results'][0]['message']
+
+    response = client.post('/admin/users', data={'cnic': '2', 'name': 'Bob', 'initial_amount': '1e20'},
+                           follow_redirects=True)
+    assert response.status_code == 200
+    assert b'cannot exceed' in response.data
+    assert db.session.query(User).filter_by(cnic='2').first() is None
+
+    response = client.post(f'/admin/user/{user_id}/edit', data={'cnic': '1', 'name': 'Alice', 'balance': '1e20'},
+                           follow_redirects=True)
+    assert response.status_code == 200
+    assert b'cannot exceed' in response.data
+    assert db.session.get(User, user_id).balance == Decimal('10.00')
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, func
+
+from app import db
+from app.models import User, Transaction
+from app.services import posting
+
+BATCH_URL = '/admin/api/operations/batch'
+
+
+def _balances():
+    return dict(db.session.execute(select(User.cnic, User.balance)).all())
+
+
+def _transaction_count():
+    return db.session.execute(select(func.count(Transaction.id))).scalar()
+
+
+def test_batch_applies_in_order_against_running_balances(app, make_user):
+    make_user('1', '10.00')
+    make_user('2')
+    # The debit only fits because the credit before it in the same batch is counted
+    result = posting.post_operations([
+        {'operation_type': 'credit', 'user_cnic': '1', 'amount': '5.00'},
+        {'operation_type': 'debit', 'user_cnic': '1', 'amount': '12.00'},
+        {'operation_type': 'transfer', 'user_cnic': '1', 'amount': '3.00', 'to_user_cnic': '2'},
+    ])
+    assert result.applied
+    assert [r.status for r in result.results] == ['applied'] * 3
+    assert _balances() == {'1': Decimal('0.00'), '2': Decimal('3.00')}
+
+
+def test_one_rejection_skips_the_whole_batch(app, make_user):
+    make_user('1', '10.00')
+    make_user('2')
+    result = posting.post_operations([
+        {'operation_type': 'transfer', 'user_cnic': '1', 'amount': '4.00', 'to_user_cnic': '2'},
+        {'operation_type': 'debit', 'user_cnic': '1', 'amount': '7.00'},
+    ])
+    assert not result.applied
+    assert [r.status for r in result.results] == ['skipped', 'rejected']
+    assert 'Insufficient balance' in result.results[1].message
+    assert _balances() == {'1': Decimal('10.00'), '2': Decimal('0.00')}
+    assert _transaction_count() == 1
+
+
+@pytest.mark.parametrize('item, message', [
+    ({'operation_type': 'credit', 'user_cnic': '1'}, 'Missing required fields'),
+    ({'operation_type': 'refund', 'user_cnic': '1', 'amount': '1'}, 'Invalid operation type'),
+    ({'operation_type': 'credit', 'user_cnic': '9', 'amount': '1'}, 'not found'),
+    ({'operation_type': 'credit', 'user_cnic': '1', 'amount': '0'}, 'must be positive'),
+    ({'operation_type': 'transfer', 'user_cnic': '1', 'amount': '1'}, 'Recipient CNIC is required'),
+    ({'operation_type': 'transfer', 'user_cnic': '1', 'amount': '1', 'to_user_cnic': '1'}, 'same account'),
+    ({'operation_type': 'credit', 'user_cnic': ['1'], 'amount': '1'}, 'must be given as strings'),
+    ({'operation_type': 'debit', 'user_cnic': {'cnic': '1'}, 'amount': '1'}, 'must be given as strings'),
+    ({'operation_type': 'transfer', 'user_cnic': '1', 'amount': '1', 'to_user_cnic': ['2']}, 'must be given as strings'),
+])
+def test_invalid_items_are_rejected(app, make_user, item, message):
+    make_user('1', '10.00')
+    make_user('2')
+    result = posting.post_operations([item])
+    assert not result.applied
+    assert result.results[0].status == 'rejected'
+    assert message in result.results[0].message
+
+
+def test_batch_endpoint_reports_each_item(client, make_user):
+    make_user('1', '10.00')
+    response = client.post(BATCH_URL, json={'operations': [
+        {'operation_type': 'credit', 'user_cnic': '1', 'amount': '1.00'},
+        {'operation_type': 'transfer', 'user_cnic': '1', 'amount': '1.00', 'to_user_cnic': ['2', '3']},
+    ]})
+    assert response.status_code == 422
+    body = response.get_json()
+    assert body['applied'] is False
+    assert [r['status'] for r in body['results']] == ['skipped', 'rejected']
+
+
+def test_batch_endpoint_validates_the_payload(app, client):
+    assert client.post(BATCH_URL, json={'operations': []}).status_code == 400
+    assert client.post(BATCH_URL, json={'operations': ['credit']}).status_code == 400
+    too_many = [{'operation_type': 'credit', 'user_cnic': '1', 'amount': '1'}] * (app.config['POSTING_MAX_BATCH_SIZE'] + 1)
+    assert client.post(BATCH_URL, json={'operations': too_many}).status_code == 413
@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, func
+
+from app import db
+from app.models import User, Transaction
+from app.services import system_totals
+from app.services.profit_distribution import (
+    allocate, distribute_profit, distributable_paisa, parse_distribution_request, ProfitDistributionError,
+)
+
+
+def test_shares_add_up_to_the_amount_exactly():
+    ids = list(range(1, 8))
+    weights = [3, 7, 11, 13, 17, 19, 23]
+    allocation = allocate(ids, weights, 100001)
+    assert sum(allocation.shares) == 100001
+    assert allocation.total_weight == sum(weights)
+    for weight, share in zip(weights, allocation.shares):
+        floor = weight * 100001 // allocation.total_weight
+        assert share in (floor, floor + 1)
+
+
+def test_leftover_paisa_go_to_the_largest_weights():
+    # 10 paisa over weights 1, 2, 3, 4 floor to 1, 2, 3, 4; nothing is left
+    assert list(allocate([1, 2, 3, 4], [1, 2, 3, 4], 10).shares) == [1, 2, 3, 4]
+    # 12 paisa floor to 1, 2, 3, 4 and the two leftovers go to weights 4 and 3
+    assert list(allocate([1, 2, 3, 4], [1, 2, 3, 4], 12).shares) == [1, 2, 4, 5]
+
+
+def test_equal_weights_break_ties_by_lowest_id():
+    allocation = allocate([5, 9, 12], [1, 1, 1], 5)
+    assert list(allocation.shares) == [2, 2, 1]
+
+
+def test_amount_smaller_than_the_number_of_accounts():
+    # Floors are 0, 1, 0, 1; the one leftover goes to the first of the tied largest weights
+    allocation = allocate([1, 2, 3, 4], [10, 40, 10, 40], 3)
+    assert list(allocation.shares) == [0, 2, 0, 1]
+    assert sum(allocation.shares) == 3
+
+
+def test_zero_total_weight_is_rejected():
+    with pytest.raises(ProfitDistributionError):
+        allocate([], [], 100)
+
+
+def test_distributable_amount_is_rounded_down_to_whole_paisa():
+    assert distributable_paisa(Decimal('100.00'), Decimal('33.33')) == 3333
+    assert distributable_paisa(Decimal('0.99'), Decimal('50')) == 49
+    with pytest.raises(ProfitDistributionError):
+        distributable_paisa(Decimal('0.01'), Decimal('50'))
+
+
+@pytest.mark.parametrize('values, message', [
+    ({'total_profit': 'abc', 'distribution_percentage': '10'}, 'Invalid total profit.'),
+    ({'total_profit': '10.001', 'distribution_percentage': '10'}, 'more than two decimal places'),
+    ({'total_profit': '-5', 'distribution_percentage': '10'}, 'must be positive'),
+    ({'total_profit': '10', 'distribution_percentage': '101'}, 'between 0 and 100'),
+    ({'total_profit': '10', 'distribution_percentage': '10', 'mode': 'other'}, 'Unknown distribution mode'),
+])
+def test_invalid_requests_are_rejected(values, message):
+    with pytest.raises(ProfitDistributionError, match=message):
+        parse_distribution_request(values)
+
+
+def test_distribute_profit_credits_exactly_the_amount(app, make_user):
+    ids = [make_user(cnic, balance) for cnic, balance in
+           [('1', '100.00'), ('2', '200.00'), ('3', '300.00'), ('4', '0.00')]]
+    system_totals.get_total_balance()
+
+    result = distribute_profit(Decimal('100.01'), Decimal('100'))
+
+    assert result.amount_distributed == Decimal('100.01')
+    assert result.accounts == 3
+    assert result.total_balance == Decimal('600.00')
+    balances = dict(db.session.execute(select(User.id, User.balance)).all())
+    # 16.66, 33.33 and 50.00 leave two paisa over, which go to the two largest balances
+    assert [balances[i] for i in ids] == [Decimal('116.66'), Decimal('233.34'), Decimal('350.01'), Decimal('0.00')]
+    assert system_totals.reconcile().difference == 0
+    credited = db.session.execute(
+        select(func.sum(Transaction.amount)).where(Transaction.transaction_type == 'profit_distribution')
+    ).scalar()
+    assert credited == Decimal('100.01')
+
+
+def test_distribution_transactions_carry_running_balances(app, make_user):
+    user_id = make_user('1', '50.00')
+    distribute_profit(Decimal('10.00'), Decimal('50'))
+    row = db.session.execute(
+        select(Transaction.sequence, Transaction.balance_after)
+        .where(Transaction.user_id == user_id, Transaction.transaction_type == 'profit_distribution')
+    ).one()
+    assert row == (2, Decimal('55.00'))
+
+
+def test_nothing_to_distribute_to(app, make_user):
+    make_user('1')
+    with pytest.raises(ProfitDistributionError):
+        distribute_profit(Decimal('10.00'), Decimal('50'))
@@ -0,0 +1,28 @@
+import pytest
+
+from app.services import query_plans
+
+
+def test_every_hot_query_uses_an_index(app):
+    results = query_plans.check_query_plans()
+    assert results
+    assert [result.name for result in results if not result.uses_index] == []
+
+
+def test_unsupported_databases_are_a_usage_error(app, monkeypatch):
+    with pytest.raises(query_plans.QueryPlanError):
+        query_plans.plan_reader('mysql')
+
+    def unsupported():
+        raise query_plans.QueryPlanError('Query plans can only be checked on SQLite and PostgreSQL, not mysql.')
+    monkeypatch.setattr(query_plans, 'check_query_plans', unsupported)
+    result = app.test_cli_runner().invoke(args=['schema', 'check-plans'])
+    assert result.exit_code == 2
+    assert 'not mysql' in result.output
+    assert 'Traceback' not in result.output
+
+
+def test_check_plans_command(app):
+    result = app.test_cli_runner().invoke(args=['schema', 'check-plans'])
+    assert result.exit_code == 0
+    assert 'FAIL' not in result.output
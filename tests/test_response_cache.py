@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from app import db
+from app.models import User
+from app.services import posting
+
+HIGH_WATER_MARK_URL = '/admin/api/ledger/high-water-mark'
+
+
+def _revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def _credit(cnic, amount='1.00'):
+    posting.post_operations([{'operation_type': 'credit', 'user_cnic': cnic, 'amount': amount}])
+
+
+@pytest.mark.parametrize('url', ['/admin/dashboard', '/admin/balances'])
+def test_pages_answer_revalidation_until_the_ledger_moves(client, make_user, url):
+    make_user('1', '10.00', name='Alice')
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag'].strip('"')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    not_modified = _revalidate(client, url, etag)
+    assert not_modified.status_code == 304
+    assert not not_modified.data
+
+    _credit('1')
+    moved = _revalidate(client, url, etag)
+    assert moved.status_code == 200
+    assert moved.headers['ETag'].strip('"') != etag
+
+
+def test_renaming_a_user_changes_the_page_etag(client, make_user):
+    user_id = make_user('1', '10.00', name='Alice')
+    etag = client.get('/admin/balances').headers['ETag'].strip('"')
+
+    client.post(f'/admin/user/{user_id}/edit', data={'cnic': '1', 'name': 'Alicia', 'balance': '10.00'})
+    response = _revalidate(client, '/admin/balances', etag)
+    assert response.status_code == 200
+    assert b'Alicia' in response.data
+
+
+def test_high_water_mark_follows_postings_and_user_writes(client, make_user):
+    make_user('1')
+    before = client.get(HIGH_WATER_MARK_URL).get_json()
+    _credit('1')
+    after_posting = client.get(HIGH_WATER_MARK_URL).get_json()
+    assert after_posting['transaction_id'] > before['transaction_id']
+
+    client.post('/admin/users', data={'cnic': '2', 'name': 'Bob', 'initial_amount': '0'})
+    assert client.get(HIGH_WATER_MARK_URL).get_json()['user_version'] > after_posting['user_version']
+
+
+def _download(client, user_id, headers=None, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f'/admin/download-statement/{user_id}', headers=headers)
+        if response.status_code != 202 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.1)
+
+
+def test_statement_etag_follows_postings_and_renames(client, make_user):
+    user_id = make_user('1', '10.00', name='Alice')
+    etag = _download(client, user_id).headers['ETag'].strip('"')
+    assert _download(client, user_id, {'If-None-Match': etag}).status_code == 304
+
+    _credit('1')
+    after_posting = _download(client, user_id, {'If-None-Match': etag})
+    assert after_posting.status_code == 200
+    etag = after_posting.headers['ETag'].strip('"')
+
+    user = db.session.get(User, user_id)
+    user.name = 'Alicia'
+    db.session.commit()
+    assert _download(client, user_id, {'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import json
+import zlib
+
+from sqlalchemy import select, update
+
+from app import db
+from app.models import User, Transaction
+from app.services import archival, balance_history, ledger_integrity, posting
+
+
+def _rows(user_id):
+    return db.session.execute(
+        select(Transaction.sequence, Transaction.balance_after)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.id)
+    ).all()
+
+
+def test_apply_balance_delta_numbers_each_effect(app, make_user):
+    user_id = make_user('1', '10.00')
+    numbered = posting.apply_balance_delta(user_id, [Decimal('5.00'), Decimal('-3.00'), Decimal('1.50')])
+    db.session.commit()
+    assert numbered == [(2, Decimal('15.00')), (3, Decimal('12.00')), (4, Decimal('13.50'))]
+    user = db.session.get(User, user_id)
+    assert (user.last_sequence, user.balance) == (4, Decimal('13.50'))
+
+
+def test_postings_carry_sequence_and_balance_after(app, make_user):
+    user_id = make_user('1', '10.00')
+    make_user('2')
+    posting.post_operations([
+        {'operation_type': 'debit', 'user_cnic': '1', 'amount': '4.00'},
+        {'operation_type': 'transfer', 'user_cnic': '1', 'to_user_cnic': '2', 'amount': '1.00'},
+    ])
+    assert _rows(user_id) == [(1, Decimal('10.00')), (2, Decimal('6.00')), (3, Decimal('5.00'))]
+
+
+def test_verify_finds_a_broken_chain(app, make_user):
+    user_id = make_user('1', '10.00')
+    posting.post_operations([{'operation_type': 'credit', 'user_cnic': '1', 'amount': '5.00'}])
+    assert ledger_integrity.verify(full=True, settle_seconds=0).problem_count == 0
+
+    db.session.execute(update(Transaction).where(Transaction.sequence == 2).values(balance_after=Decimal('99.00')))
+    db.session.commit()
+    result = ledger_integrity.verify(full=True, settle_seconds=0)
+    assert result.problem_count > 0
+    assert {problem.user_id for problem in result.problems} == {user_id}
+
+
+def test_verify_finds_a_sequence_gap(app, make_user):
+    make_user('1', '10.00')
+    posting.post_operations([{'operation_type': 'credit', 'user_cnic': '1', 'amount': '5.00'}])
+    db.session.execute(update(Transaction).where(Transaction.sequence == 2).values(sequence=3))
+    db.session.commit()
+    assert ledger_integrity.verify(full=True, settle_seconds=0).problem_count > 0
+
+
+def test_balance_at_follows_sequence_not_timestamps(app, make_user):
+    user_id = make_user('1', '10.00')
+    posting.post_operations([{'operation_type': 'credit', 'user_cnic': '1', 'amount': '5.00'}])
+    # The later posting carries the earlier clock reading, as a skewed clock would leave it
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    db.session.execute(update(Transaction).where(Transaction.sequence == 1).values(timestamp=yesterday))
+    db.session.execute(update(Transaction).where(Transaction.sequence == 2)
+                       .values(timestamp=yesterday - timedelta(hours=1)))
+    db.session.commit()
+    assert balance_history.balance_at(user_id, yesterday.date()) == Decimal('15.00')
+
+
+def test_archive_payloads_round_trip(app, make_user):
+    user_id = make_user('1', '10.00')
+    posting.post_operations([{'operation_type': 'debit', 'user_cnic': '1', 'amount': '2.50'}])
+    rows = db.session.execute(select(Transaction).where(Transaction.user_id == user_id)
+                              .order_by(Transaction.id)).scalars().all()
+
+    decoded = archival.decode_chunk(archival.encode_chunk(rows))
+    assert [(row.id, row.transaction_type, row.amount, row.timestamp, row.sequence, row.balance_after)
+            for row in decoded] == \
+           [(row.id, row.transaction_type, row.amount, row.timestamp, row.sequence, row.balance_after)
+            for row in rows]
+
+
+def test_legacy_archive_payloads_decode_without_running_balances():
+    payload = zlib.compress(json.dumps([
+        [1, 7, 'credit', '10.00', '2026-01-02T03:04:05', 'Initial deposit', None],
+    ]).encode())
+    (row,) = archival.decode_chunk(payload)
+    assert (row.id, row.amount, row.timestamp) == (1, Decimal('10.00'), datetime(2026, 1, 2, 3, 4, 5))
+    assert row.sequence is None and row.balance_after is None
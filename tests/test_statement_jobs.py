@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import delete
+
+from app import db
+from app.models import User, Transaction
+from app.services import statement_jobs
+
+
+def _download(client, user_id, timeout=30):
+    """GET the statement, following 202s until the background render finishes"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f'/admin/download-statement/{user_id}')
+        if response.status_code != 202 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.1)
+
+
+def test_job_ids_round_trip_and_reject_garbage():
+    job_id = statement_jobs.job_id_for(7, '12345-1234567-1', 42)
+    assert statement_jobs.parse_job_id(job_id) == (7, 42, statement_jobs.account_tag('12345-1234567-1'))
+    for bad in ('7-42', '7-x-abc', '7-42-NOTHEX1234', '7-42-abc', '../7-42-0123456789'):
+        with pytest.raises(statement_jobs.StatementJobError):
+            statement_jobs.parse_job_id(bad)
+
+
+def test_statement_is_queued_then_served_from_the_cache(client, make_user):
+    user_id = make_user('1', '10.00', name='Alice')
+    first = client.get(f'/admin/download-statement/{user_id}')
+    assert first.status_code == 202
+    assert first.headers['Retry-After']
+
+    response = _download(client, user_id)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF')
+    # The rendered file answers revalidation without rendering again
+    assert client.get(f'/admin/download-statement/{user_id}',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_reused_ids_do_not_serve_another_accounts_statement(client, make_user):
+    user_id = make_user('1', '10.00')
+    assert _download(client, user_id).status_code == 200
+    old_job_id = statement_jobs.current_job_id(db.session.get(User, user_id))
+
+    # The account goes and a new one is given the same user and transaction ids
+    db.session.execute(delete(Transaction))
+    db.session.execute(delete(User))
+    db.session.commit()
+    assert make_user('2', '10.00') == user_id
+    new_user = db.session.get(User, user_id)
+    new_job_id = statement_jobs.current_job_id(new_user)
+
+    assert new_job_id != old_job_id
+    assert statement_jobs.cached_statement(old_job_id)
+    assert statement_jobs.cached_statement(new_job_id) is None
+    assert client.get(f'/admin/statements/jobs/{old_job_id}/download').status_code == 404
+
+
+def test_status_reads_the_markers_other_workers_leave(app, make_user):
+    user = db.session.get(User, make_user('1', '10.00'))
+    job_id = statement_jobs.current_job_id(user)
+    directory = statement_jobs.cache_dir()
+    assert statement_jobs.status(job_id) == ('unknown', None)
+
+    open(os.path.join(directory, f'statement_{job_id}.pending'), 'w').close()
+    assert statement_jobs.status(job_id) == ('pending', None)
+    # A second submit leaves the job to whoever holds the marker
+    assert statement_jobs.submit(user) == job_id
+    os.unlink(os.path.join(directory, f'statement_{job_id}.pending'))
+
+    with open(os.path.join(directory, f'statement_{job_id}.failed'), 'w') as f:
+        f.write('boom')
+    assert statement_jobs.status(job_id) == ('failed', 'boom')
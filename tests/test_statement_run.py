@@ -0,0 +1,72 @@
+import os
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import db
+from app.models import Transaction
+from app.services import posting, statement_run
+
+
+def _last_month():
+    start = datetime.utcnow().replace(day=1) - timedelta(days=1)
+    return start.strftime('%Y-%m'), start
+
+
+def _seed(make_user, count=3):
+    period, day = _last_month()
+    for i in range(count):
+        make_user(str(i), '100.00')
+        posting.post_operations([{'operation_type': 'debit', 'user_cnic': str(i), 'amount': f'{i + 1}.00'}])
+    db.session.execute(update(Transaction).values(timestamp=day))
+    db.session.commit()
+    return period
+
+
+def test_parse_period():
+    assert statement_run.parse_period('2026-12') == (datetime(2026, 12, 1), datetime(2027, 1, 1))
+    with pytest.raises(statement_run.StatementRunError):
+        statement_run.parse_period('2026-13')
+
+
+def test_balances_come_from_running_balances(app, make_user):
+    period = _seed(make_user)
+    statements = list(statement_run._iter_statements(*statement_run.parse_period(period)))
+    assert [(user.opening_balance, user.closing_balance, len(lines)) for user, lines in statements] == [
+        (0, 99, 2), (0, 98, 2), (0, 97, 2),
+    ]
+
+
+def test_directory_run_skips_what_is_already_there(app, make_user, tmp_path):
+    period = _seed(make_user)
+    output = str(tmp_path / 'out')
+    first = statement_run.generate_period_statements(period, output, workers=1)
+    assert (first.rendered, first.skipped, first.total) == (3, 0, 3)
+    os.unlink(os.path.join(output, f'statement_{period}_2.pdf'))
+
+    second = statement_run.generate_period_statements(period, output, workers=1)
+    assert (second.rendered, second.skipped) == (1, 2)
+
+
+def test_interrupted_zip_run_resumes_from_its_staging_directory(app, make_user, tmp_path):
+    period = _seed(make_user)
+    output = str(tmp_path / 'out.zip')
+    # A killed run leaves rendered statements in the staging directory and no zip
+    staging = statement_run.staging_dir(output)
+    statement_run.generate_period_statements(period, staging, workers=1)
+    os.unlink(os.path.join(staging, f'statement_{period}_3.pdf'))
+
+    result = statement_run.generate_period_statements(period, output, workers=1, as_zip=True)
+    assert (result.rendered, result.skipped) == (1, 2)
+    assert not os.path.exists(staging)
+    with zipfile.ZipFile(output) as archive:
+        assert sorted(archive.namelist()) == [f'statement_{period}_{i}.pdf' for i in (1, 2, 3)]
+        assert archive.testzip() is None
+
+    # A finished zip counts as already rendered
+    again = statement_run.generate_period_statements(period, output, workers=1, as_zip=True)
+    assert (again.rendered, again.skipped) == (0, 3)
+    with zipfile.ZipFile(output) as archive:
+        assert len(archive.namelist()) == 3
@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+import pytest
+
+from app.services import user_directory
+from app.services.user_directory import UserListing
+
+ACCOUNTS = [
+    ('35201-0000001-1', 'Ayesha Khan', '10.00'),
+    ('35201-0000002-1', 'ali raza', '10.00'),
+    ('35202-0000003-1', 'Ali Raza', '0.00'),
+    ('42101-0000004-1', 'Bilal_Ahmed', '25.50'),
+    ('42101-0000005-1', 'Zara', '10.00'),
+    ('61101-0000006-1', 'Ali Raza', '7.25'),
+]
+
+
+@pytest.fixture
+def accounts(make_user):
+    return {cnic: make_user(cnic, balance, name=name) for cnic, name, balance in ACCOUNTS}
+
+
+def _walk(listing, per_page):
+    users = []
+    cursor = None
+    while True:
+        page = user_directory.user_page(listing, cursor, per_page=per_page)
+        users.extend(page.users)
+        if page.next_cursor is None:
+            return users
+        # Cursors go through the query string, so they are decoded from text each time
+        cursor = user_directory.decode_cursor(page.next_cursor, listing.sort)
+
+
+@pytest.mark.parametrize('sort', ['name', 'cnic', 'balance'])
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_pages_follow_the_sort_order_without_repeats(accounts, sort, direction):
+    users = _walk(UserListing(None, sort, direction), per_page=2)
+    assert len(users) == len(ACCOUNTS)
+    keys = [(getattr(user, sort), user.id) for user in users]
+    assert keys == sorted(keys, reverse=direction == 'desc')
+
+
+def test_search_matches_cnic_or_name_prefix(accounts):
+    by_cnic = _walk(UserListing('42101', 'cnic', 'asc'), per_page=1)
+    assert [user.cnic for user in by_cnic] == ['42101-0000004-1', '42101-0000005-1']
+    # Name prefixes match case-insensitively
+    by_name = _walk(UserListing('ALI', 'balance', 'desc'), per_page=2)
+    assert [user.balance for user in by_name] == [Decimal('10.00'), Decimal('7.25'), Decimal('0.00')]
+    assert user_directory.search_users('bilal_')[0].name == 'Bilal_Ahmed'
+    assert user_directory.search_users('  ') == []
+    assert len(user_directory.search_users('a', limit=2)) == 2
+
+
+def test_prefix_upper_bound():
+    assert user_directory.prefix_upper_bound('ali') == 'alj'
+    assert user_directory.prefix_upper_bound('4210') == '4211'
+
+
+def test_bad_listing_arguments_are_rejected():
+    with pytest.raises(user_directory.UserDirectoryError):
+        user_directory.parse_listing({'sort': 'password_hash'})
+    with pytest.raises(user_directory.UserDirectoryError):
+        user_directory.parse_listing({'direction': 'sideways'})
+    with pytest.raises(user_directory.UserDirectoryError):
+        user_directory.decode_cursor('abc_1', 'balance')
+    with pytest.raises(user_directory.UserDirectoryError):
+        user_directory.decode_cursor('1.005_1', 'balance')
+    assert user_directory.decode_cursor('Bilal_Ahmed_4', 'name') == ('Bilal_Ahmed', 4)
+
+
+def test_pages_and_typeahead_endpoints(client, accounts):
+    response = client.get('/admin/balances?sort=balance&direction=desc&per_page=2')
+    assert response.status_code == 200
+    assert b'Bilal_Ahmed' in response.data
+    assert b'Zara' in response.data
+    assert b'Ayesha' not in response.data
+    assert client.get('/admin/balances?sort=nope').status_code == 302
+
+    results = client.get('/admin/api/users/search?q=ali&limit=5').get_json()['results']
+    assert [result['cnic'] for result in results] == ['35201-0000002-1', '35202-0000003-1', '61101-0000006-1']
+    assert results[0]['balance'] == '10.00'